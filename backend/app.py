@@ -1,19 +1,27 @@
-from flask import Flask, request, jsonify, session
+import time
+app_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, session, Response
 from flask_cors import CORS
 from flask_mail import Mail, Message
 from config import Config
-from models import db, User, ServiceProvider, Review, UserProviderInteraction, Admin, PasswordResetToken, Booking
-from ml_classifier import ReliabilityClassifier
-from recommender import HybridRecommender
-from sentiment_analyzer import SentimentAnalyzer
+from models import db, User, ServiceProvider, Review, UserProviderInteraction, Admin, PasswordResetToken, Booking, UserRecommendation
+from spatial_index import ProviderSpatialIndex
+from popularity import PopularityIndex
+from recommendation_cache import RecommendationCache
+from lazy_components import LazyComponent, timing_report
+from reliability_rescore import rescore_reliability
 from chatbot import chatbot_bp
 import os
+import click
 from utils.email_utils import send_booking_confirmation_email
 import json
 import random
+import threading
 from functools import wraps
 from datetime import datetime, timedelta
 from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy.exc import SQLAlchemyError
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -44,20 +52,296 @@ CORS(app, supports_credentials=True)
 db.init_app(app)
 mail = Mail(app)
 
-# Initialize ML models
-classifier = ReliabilityClassifier()
-recommender = HybridRecommender()
-sentiment_analyzer = SentimentAnalyzer()
+# ML components are imported and loaded on first use (or by /api/admin/warmup),
+# so worker boot and CLI commands don't pay for sklearn, pandas and NLTK
+
+def import_classifier():
+    from ml_classifier import ReliabilityClassifier
+    return ReliabilityClassifier
+
+
+def load_classifier(ReliabilityClassifier):
+    classifier = ReliabilityClassifier(cache_size=Config.CLASSIFIER_CACHE_SIZE)
+    if os.path.exists(Config.MODEL_DIR):
+        try:
+            classifier.load_models(Config.MODEL_DIR)
+        except Exception as e:
+            print(f"⚠ Could not load classifier models: {e}")
+            print("Run initialize script to train models first")
+    return classifier
+
+
+def import_recommender():
+    from recommender import HybridRecommender
+    return HybridRecommender
+
+
+def load_recommender(HybridRecommender):
+    recommender = HybridRecommender()
+    if os.path.exists(Config.MODEL_DIR):
+        try:
+            recommender.load_model(Config.MODEL_DIR)
+        except Exception as e:
+            print(f"⚠ Could not load recommender model: {e}")
+            print("Run initialize script to train models first")
+    return recommender
+
+
+def import_recommendation_pipeline():
+    from recommendation_pipeline import RecommendationPipeline
+    return RecommendationPipeline
+
+
+def load_recommendation_pipeline(RecommendationPipeline):
+    # Candidate generation + re-ranking for online requests, each stage time-boxed
+    return RecommendationPipeline(
+        get_recommender(),
+        candidates_per_source=Config.RECOMMENDATION_CANDIDATES,
+        budgets_ms={
+            'queue': Config.RECOMMENDATION_QUEUE_BUDGET_MS,
+            'candidates': Config.RECOMMENDATION_CANDIDATE_BUDGET_MS,
+            'rerank': Config.RECOMMENDATION_RERANK_BUDGET_MS
+        },
+        workers=Config.RECOMMENDATION_PIPELINE_WORKERS
+    )
+
+
+def import_sentiment_analyzer():
+    from sentiment_analyzer import SentimentAnalyzer
+    return SentimentAnalyzer
+
+
+ml_components = {
+    'classifier': LazyComponent('classifier', import_classifier, load_classifier),
+    'recommender': LazyComponent('recommender', import_recommender, load_recommender),
+    'recommendation_pipeline': LazyComponent(
+        'recommendation_pipeline', import_recommendation_pipeline, load_recommendation_pipeline
+    ),
+    'sentiment_analyzer': LazyComponent(
+        'sentiment_analyzer', import_sentiment_analyzer, lambda SentimentAnalyzer: SentimentAnalyzer()
+    )
+}
+
+
+def get_classifier():
+    return ml_components['classifier'].get()
+
+
+def get_recommender():
+    return ml_components['recommender'].get()
+
+
+def get_recommendation_pipeline():
+    return ml_components['recommendation_pipeline'].get()
 
-# Load models if they exist
-if os.path.exists(Config.MODEL_DIR):
+
+def get_sentiment_analyzer():
+    return ml_components['sentiment_analyzer'].get()
+
+
+# Provider arrays used by the recommender and the location index, loaded on first use
+provider_catalog = None
+provider_spatial_index = None
+provider_popularity = None
+
+# Recent recommendation results, invalidated as interactions, reviews and providers change
+recommendation_cache = RecommendationCache(
+    max_entries=Config.RECOMMENDATION_CACHE_SIZE,
+    ttl_seconds=Config.RECOMMENDATION_CACHE_TTL
+)
+
+# State of the reliability rescoring job started from the admin endpoint
+rescore_job = {'running': False, 'progress': None, 'error': None, 'finished_at': None}
+rescore_job_lock = threading.Lock()
+
+# One thread at a time (re)builds the popularity lists. Changes made while
+# a rebuild reads the database are queued in 'pending' and replayed onto
+# the new lists before they replace the old ones.
+popularity_build_lock = threading.Lock()
+popularity_lock = threading.Lock()
+popularity_rebuild = {'pending': None}
+
+
+def get_provider_catalog():
+    """Return the in-memory provider catalog, loading it from the database if needed"""
+    global provider_catalog
+    if provider_catalog is None:
+        rows = db.session.query(
+            ServiceProvider.id,
+            ServiceProvider.rating,
+            ServiceProvider.latitude,
+            ServiceProvider.longitude,
+            ServiceProvider.service_type
+        ).all()
+        from recommender import ProviderCatalog
+        provider_catalog = ProviderCatalog.from_rows(rows)
+    return provider_catalog
+
+
+def get_spatial_index():
+    """Return the provider location index, building it from the database if needed"""
+    global provider_spatial_index
+    if provider_spatial_index is None:
+        rows = db.session.query(
+            ServiceProvider.id,
+            ServiceProvider.latitude,
+            ServiceProvider.longitude,
+            ServiceProvider.service_type
+        ).all()
+        provider_spatial_index = ProviderSpatialIndex.from_rows(rows)
+    return provider_spatial_index
+
+
+def rebuild_popularity_index():
+    """Rank every provider from the database and swap the new lists in"""
+    global provider_popularity
+    from recommender import HIRE_INTERACTION_TYPES
+    with popularity_lock:
+        popularity_rebuild['pending'] = []
     try:
-        classifier.load_models(Config.MODEL_DIR)
-        recommender.load_model(Config.MODEL_DIR)
-        print("✓ ML models loaded successfully")
+        providers = db.session.query(
+            ServiceProvider.id,
+            ServiceProvider.service_type,
+            ServiceProvider.latitude,
+            ServiceProvider.longitude,
+            ServiceProvider.rating
+        ).all()
+        hires = db.session.query(
+            UserProviderInteraction.provider_id,
+            UserProviderInteraction.interaction_count,
+            UserProviderInteraction.last_interaction
+        ).filter(UserProviderInteraction.interaction_type.in_(HIRE_INTERACTION_TYPES)).yield_per(10000)
+        index = PopularityIndex.from_rows(
+            providers, hires,
+            cell_size_deg=Config.POPULARITY_CELL_SIZE_DEG,
+            half_life_days=Config.POPULARITY_HALF_LIFE_DAYS
+        )
+    except Exception:
+        with popularity_lock:
+            popularity_rebuild['pending'] = None
+        raise
+    
+    # Replay the changes made while the rows were read. A hire committed
+    # just before its row was read counts twice until the next rebuild.
+    with popularity_lock:
+        for method, args in popularity_rebuild['pending']:
+            getattr(index, method)(*args)
+        popularity_rebuild['pending'] = None
+        provider_popularity = index
+    return index
+
+
+def run_popularity_rebuild():
+    """Background thread body of the periodic popularity rebuild"""
+    try:
+        with app.app_context():
+            rebuild_popularity_index()
     except Exception as e:
-        print(f"⚠ Could not load models: {e}")
-        print("Run initialize script to train models first")
+        print(f"⚠ Popularity rebuild failed: {e}")
+    finally:
+        popularity_build_lock.release()
+
+
+def get_popularity_index():
+    """
+    Return the provider popularity rankings
+    
+    The first call builds them (concurrent callers wait for that one
+    build). Once they are older than POPULARITY_REBUILD_HOURS, one
+    background thread rebuilds them to re-decay providers without new hires
+    while requests keep using the current lists.
+    """
+    if provider_popularity is None:
+        with popularity_build_lock:
+            if provider_popularity is None:
+                rebuild_popularity_index()
+    elif (datetime.utcnow() - provider_popularity.built_at > timedelta(hours=Config.POPULARITY_REBUILD_HOURS)
+          and popularity_build_lock.acquire(blocking=False)):
+        threading.Thread(target=run_popularity_rebuild, daemon=True).start()
+    return provider_popularity
+
+
+def patch_popularity(method, *args):
+    """Apply a change to the popularity lists and to a rebuild in progress"""
+    with popularity_lock:
+        if provider_popularity is not None:
+            getattr(provider_popularity, method)(*args)
+        if popularity_rebuild['pending'] is not None:
+            popularity_rebuild['pending'].append((method, args))
+
+
+def providers_changed(provider=None, deleted_id=None):
+    """Refresh cached provider data after providers are created, updated or deleted"""
+    global provider_catalog
+    # Edits (and new reviews) patch the provider's row; new and deleted
+    # providers rebuild the catalog on next use
+    if provider_catalog is not None:
+        if deleted_id is not None or (provider is not None and not provider_catalog.update_provider(
+            provider.id, provider.rating, provider.latitude, provider.longitude, provider.service_type
+        )):
+            provider_catalog = None
+    
+    # Only cached recommendations that include the provider are affected
+    changed_id = deleted_id if deleted_id is not None else getattr(provider, 'id', None)
+    if changed_id is not None:
+        recommendation_cache.invalidate_provider(changed_id)
+    
+    # Patch the location index in place instead of rebuilding it
+    if provider_spatial_index is not None:
+        if deleted_id is not None:
+            provider_spatial_index.remove(deleted_id)
+        elif provider is not None:
+            provider_spatial_index.add(
+                provider.id, provider.latitude, provider.longitude, provider.service_type
+            )
+    
+    # Ratings (new reviews), types and locations move the provider's popularity
+    if deleted_id is not None:
+        patch_popularity('remove_provider', deleted_id)
+    elif provider is not None:
+        patch_popularity(
+            'set_provider', provider.id, provider.service_type, provider.latitude,
+            provider.longitude, provider.rating
+        )
+
+
+def user_activity_changed(user_id):
+    """Drop a user's cached and precomputed recommendations after new activity"""
+    recommendation_cache.invalidate_user(user_id)
+    try:
+        UserRecommendation.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # e.g. the user_recommendations migration has not been applied yet
+        db.session.rollback()
+        print(f"⚠ Could not clear precomputed recommendations: {e}")
+
+
+def get_materialized_recommendations(user_id, service_type, n_recommendations):
+    """Provider ids from the user_recommendations table, or None if there is no fresh row"""
+    if not user_id or n_recommendations > Config.MATERIALIZED_RECOMMENDATIONS:
+        return None
+    
+    try:
+        row = UserRecommendation.query.filter_by(
+            user_id=user_id, service_type=service_type or ''
+        ).first()
+    except SQLAlchemyError:
+        db.session.rollback()
+        return None
+    max_age = timedelta(hours=Config.MATERIALIZED_RECOMMENDATIONS_MAX_AGE_HOURS)
+    if row is None or row.generated_at < datetime.utcnow() - max_age:
+        return None
+    return row.provider_id_list()[:n_recommendations]
+
+
+def get_providers_in_order(provider_ids):
+    """Fetch providers by id, keeping the order of provider_ids"""
+    if not provider_ids:
+        return []
+    providers = ServiceProvider.query.filter(ServiceProvider.id.in_(provider_ids)).all()
+    provider_dict = {p.id: p for p in providers}
+    return [provider_dict[pid] for pid in provider_ids if pid in provider_dict]
 
 
 # Authentication decorator
@@ -100,10 +384,13 @@ def home():
                 'logout': '/api/logout'
             },
             'providers': '/api/providers',
+            'nearby_providers': '/api/providers/nearby',
             'users': '/api/users',
             'reviews': '/api/reviews',
             'classify': '/api/classify_provider',
+            'classify_batch': '/api/classify_providers',
             'recommend': '/api/recommend_providers',
+            'recommend_batch': '/api/recommend_providers/batch',
             'analyze': '/api/analyze_review'
         }
     })
@@ -171,6 +458,7 @@ def provider_register():
     
     db.session.add(provider)
     db.session.commit()
+    providers_changed(provider)
     
     return jsonify({
         'success': True,
@@ -398,6 +686,52 @@ def get_providers():
     })
 
 
+@app.route('/api/providers/nearby', methods=['GET'])
+def get_nearby_providers():
+    """Get providers within a radius of a point, closest first"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius_km = request.args.get('radius_km', 10.0, type=float)
+    service_type = request.args.get('service_type')
+    limit = request.args.get('limit', 20, type=int)
+    
+    if lat is None or lon is None:
+        return jsonify({
+            'success': False,
+            'error': 'lat and lon are required'
+        }), 400
+    
+    nearby = get_spatial_index().query(
+        lat, lon, radius_km, service_type=service_type, limit=limit
+    )
+    distances = dict(nearby)
+    providers = get_providers_in_order([provider_id for provider_id, _ in nearby])
+    
+    return jsonify({
+        'count': len(providers),
+        'providers': [
+            dict(p.to_dict(), distance_km=round(distances[p.id], 2)) for p in providers
+        ]
+    })
+
+
+@app.route('/api/providers/<int:provider_id>/also_hired', methods=['GET'])
+def get_also_hired_providers(provider_id):
+    """Providers hired by users who also interacted with this provider"""
+    limit = request.args.get('limit', 10, type=int)
+    
+    also_hired = get_recommender().also_hired(provider_id, n=limit)
+    counts = dict(also_hired)
+    providers = get_providers_in_order([pid for pid, _ in also_hired])
+    
+    return jsonify({
+        'count': len(providers),
+        'providers': [
+            dict(p.to_dict(), co_hires=counts[p.id]) for p in providers
+        ]
+    })
+
+
 @app.route('/api/providers/<int:provider_id>', methods=['GET'])
 def get_provider(provider_id):
     """Get single provider by ID"""
@@ -433,6 +767,7 @@ def create_provider():
     
     db.session.add(provider)
     db.session.commit()
+    providers_changed(provider)
     
     return jsonify({
         'message': 'Provider created successfully',
@@ -458,6 +793,7 @@ def update_provider(provider_id):
     provider.verified = data.get('verified', provider.verified)
     
     db.session.commit()
+    providers_changed(provider)
     
     return jsonify({
         'message': 'Provider updated successfully',
@@ -473,6 +809,7 @@ def delete_provider(provider_id):
     
     db.session.delete(provider)
     db.session.commit()
+    providers_changed(deleted_id=provider_id)
     
     return jsonify({
         'message': 'Provider deleted successfully'
@@ -559,8 +896,15 @@ def create_review():
     """Create new review with automatic sentiment analysis"""
     data = request.json
     
+    provider = ServiceProvider.query.get(data['provider_id'])
+    if not provider:
+        return jsonify({
+            'success': False,
+            'error': 'Provider not found'
+        }), 404
+    
     # Analyze sentiment
-    sentiment_result = sentiment_analyzer.analyze_sentiment(data.get('comment', ''))
+    sentiment_result = get_sentiment_analyzer().analyze_sentiment(data.get('comment', ''))
     
     review = Review(
         user_id=data['user_id'],
@@ -575,13 +919,13 @@ def create_review():
     db.session.add(review)
     
     # Update provider rating
-    provider = ServiceProvider.query.get(data['provider_id'])
-    if provider:
-        all_reviews = Review.query.filter_by(provider_id=provider.id).all()
-        avg_rating = sum(r.rating for r in all_reviews + [review]) / (len(all_reviews) + 1)
-        provider.rating = round(avg_rating, 2)
+    all_reviews = Review.query.filter_by(provider_id=provider.id).all()
+    avg_rating = sum(r.rating for r in all_reviews + [review]) / (len(all_reviews) + 1)
+    provider.rating = round(avg_rating, 2)
     
     db.session.commit()
+    providers_changed(provider)
+    user_activity_changed(review.user_id)
     
     return jsonify({
         'success': True,
@@ -601,7 +945,7 @@ def classify_provider():
     try:
         # Use Random Forest by default
         model_type = data.get('model_type', 'rf')
-        prediction = classifier.predict(data, model_type=model_type)
+        prediction = get_classifier().predict(data, model_type=model_type)
         
         return jsonify({
             'success': True,
@@ -614,6 +958,58 @@ def classify_provider():
         }), 500
 
 
+@app.route('/api/classify_providers', methods=['POST'])
+def classify_providers():
+    """
+    Classify many providers in one vectorized pass
+    
+    The body is a JSON array of provider feature objects (as sent to
+    /api/classify_provider), or {"providers": [...], "model_type": "lr"}.
+    Predictions are returned in the same order.
+    """
+    data = request.json
+    model_type = request.args.get('model_type', 'rf')
+    if isinstance(data, dict):
+        model_type = data.get('model_type', model_type)
+        data = data.get('providers')
+    
+    if not isinstance(data, list) or not all(isinstance(p, dict) for p in data):
+        return jsonify({
+            'success': False,
+            'error': 'Expected a JSON array of provider objects'
+        }), 400
+    if len(data) > Config.CLASSIFY_BATCH_MAX:
+        return jsonify({
+            'success': False,
+            'error': f'At most {Config.CLASSIFY_BATCH_MAX} providers per request'
+        }), 400
+    
+    classifier = get_classifier()
+    try:
+        features = classifier.features_from_dicts(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid provider features: {e}'
+        }), 400
+    
+    try:
+        labels, probabilities = classifier.predict_batch(features, model_type=model_type)
+        predictions = [classifier.format_prediction(label, probability)
+                       for label, probability in zip(labels, probabilities)]
+        
+        return jsonify({
+            'success': True,
+            'count': len(predictions),
+            'predictions': predictions
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/recommend_providers', methods=['POST'])
 def recommend_providers():
     """Get personalized provider recommendations"""
@@ -631,25 +1027,71 @@ def recommend_providers():
             if user and user.latitude and user.longitude:
                 user_location = (user.latitude, user.longitude)
         
-        # Get all providers
-        providers = ServiceProvider.query.all()
+        # Anonymous and cold-start users get the precomputed popularity lists
+        matrix = get_recommender().user_provider_matrix if user_id else None
+        if matrix is None or not matrix.has_user(user_id):
+            recommendations = get_providers_in_order(
+                get_popularity_index().top(service_type, user_location, n_recommendations)
+            )
+            return jsonify({
+                'success': True,
+                'count': len(recommendations),
+                'recommendations': [p.to_dict() for p in recommendations],
+                'note': 'Popular providers (no interaction history yet)'
+            })
+        
+        pipeline_result = None
         
-        # Get recommendations
-        recommendations = recommender.hybrid_recommend(
-            user_id=user_id,
-            providers=providers,
-            user_location=user_location,
-            service_type=service_type,
-            n_recommendations=n_recommendations
-        )
+        def compute():
+            nonlocal pipeline_result
+            # Precomputed rows from the offline refresh are one indexed query
+            materialized = get_materialized_recommendations(user_id, service_type, n_recommendations)
+            if materialized is not None:
+                return materialized
+            
+            # Otherwise generate candidates and re-rank only those
+            pipeline_result = get_recommendation_pipeline().recommend(
+                user_id=user_id,
+                catalog=get_provider_catalog(),
+                user_location=user_location,
+                service_type=service_type,
+                n_recommendations=n_recommendations,
+                spatial_index=get_spatial_index()
+            )
+            return pipeline_result.provider_ids
         
-        return jsonify({
+        def cacheable():
+            # Degraded results are served but not kept
+            return pipeline_result is None or not pipeline_result.degraded
+        
+        # Repeated requests are answered from the recommendation cache
+        cache_key = recommendation_cache.key(user_id, service_type, user_location, n_recommendations)
+        recommended_ids = recommendation_cache.get_or_compute(cache_key, compute, cacheable)
+        recommendations = get_providers_in_order(recommended_ids)
+        
+        response = {
             'success': True,
             'count': len(recommendations),
             'recommendations': [p.to_dict() for p in recommendations]
-        })
+        }
+        if pipeline_result is not None:
+            response['pipeline'] = pipeline_result.to_dict()
+        return jsonify(response)
     except Exception as e:
-        # Fallback to simple rating-based recommendation
+        # Fallback to the popularity lists, or a rating query if those fail too
+        try:
+            recommendations = get_providers_in_order(
+                get_popularity_index().top(service_type, None, n_recommendations)
+            )
+            return jsonify({
+                'success': True,
+                'count': len(recommendations),
+                'recommendations': [p.to_dict() for p in recommendations],
+                'note': 'Using fallback recommendation (popularity-based)'
+            })
+        except Exception:
+            db.session.rollback()
+        
         query = ServiceProvider.query
         if service_type:
             query = query.filter_by(service_type=service_type)
@@ -664,6 +1106,63 @@ def recommend_providers():
         })
 
 
+@app.route('/api/recommend_providers/batch', methods=['POST'])
+def recommend_providers_batch():
+    """Get recommendations for many users, streamed back as JSON lines"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({
+            'success': False,
+            'error': 'Expected a JSON object'
+        }), 400
+    
+    user_ids = data.get('user_ids') or []
+    service_type = data.get('service_type')
+    n_recommendations = data.get('n_recommendations', 5)
+    
+    # bool is an int subclass, but true/false are not ids or counts
+    if not isinstance(user_ids, list) or not all(
+            isinstance(uid, int) and not isinstance(uid, bool) for uid in user_ids):
+        return jsonify({
+            'success': False,
+            'error': 'user_ids must be a list of integers'
+        }), 400
+    if not isinstance(n_recommendations, int) or isinstance(n_recommendations, bool) or n_recommendations < 1:
+        return jsonify({
+            'success': False,
+            'error': 'n_recommendations must be a positive integer'
+        }), 400
+    if service_type is not None and not isinstance(service_type, str):
+        return jsonify({
+            'success': False,
+            'error': 'service_type must be a string'
+        }), 400
+    
+    # Load user locations and the provider catalog once for the whole batch
+    user_locations = {}
+    for start in range(0, len(user_ids), 500):
+        rows = db.session.query(User.id, User.latitude, User.longitude).filter(
+            User.id.in_(user_ids[start:start + 500])
+        ).all()
+        for uid, latitude, longitude in rows:
+            if latitude and longitude:
+                user_locations[uid] = (latitude, longitude)
+    catalog = get_provider_catalog()
+    
+    def generate():
+        results = get_recommender().recommend_many(
+            user_ids,
+            catalog,
+            user_locations=user_locations,
+            service_type=service_type,
+            n_recommendations=n_recommendations
+        )
+        for user_id, provider_ids in results:
+            yield json.dumps({'user_id': user_id, 'provider_ids': provider_ids}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
 @app.route('/api/analyze_review', methods=['POST'])
 def analyze_review():
     """Analyze sentiment of a review text"""
@@ -676,7 +1175,7 @@ def analyze_review():
             'error': 'No text provided'
         }), 400
     
-    result = sentiment_analyzer.analyze_sentiment(text)
+    result = get_sentiment_analyzer().analyze_sentiment(text)
     
     return jsonify({
         'success': True,
@@ -696,7 +1195,7 @@ def get_provider_sentiment_summary(provider_id):
         })
     
     comments = [r.comment for r in reviews if r.comment]
-    summary = sentiment_analyzer.get_sentiment_summary(comments)
+    summary = get_sentiment_analyzer().get_sentiment_summary(comments)
     
     return jsonify({
         'success': True,
@@ -760,6 +1259,111 @@ def get_statistics():
     })
 
 
+@app.route('/api/admin/recommendation_cache', methods=['GET'])
+@admin_required
+def get_recommendation_cache_stats():
+    """Hit/miss/eviction counters of the recommendation cache"""
+    return jsonify({
+        'success': True,
+        'cache': recommendation_cache.stats()
+    })
+
+
+@app.route('/api/admin/classifier_cache', methods=['GET'])
+@admin_required
+def get_classifier_cache_stats():
+    """Hit/miss/eviction counters of the reliability prediction cache"""
+    classifier = get_classifier()
+    return jsonify({
+        'success': True,
+        'model_version': classifier.model_version,
+        'cache': classifier.prediction_cache.stats()
+    })
+
+
+@app.route('/api/admin/warmup', methods=['GET', 'POST'])
+@admin_required
+def warmup():
+    """
+    Load every ML component now (POST) instead of on its first request,
+    and report import and load time per component (GET only reports)
+    """
+    if request.method == 'POST':
+        for component in ml_components.values():
+            component.get()
+        get_provider_catalog()
+        get_popularity_index()
+    
+    return jsonify({
+        'success': True,
+        'app_import_seconds': round(app_import_seconds, 3),
+        'components': timing_report(ml_components.values(), app_import_seconds)
+    })
+
+
+def run_rescore_job(model_type, chunk_size, restart):
+    """Background thread body of /api/admin/rescore_reliability"""
+    def progress(checkpoint):
+        rescore_job['progress'] = checkpoint
+    
+    try:
+        with app.app_context():
+            rescore_reliability(
+                get_classifier(),
+                model_type=model_type,
+                chunk_size=chunk_size,
+                checkpoint_path=Config.RELIABILITY_RESCORE_CHECKPOINT,
+                restart=restart,
+                progress=progress
+            )
+    except Exception as e:
+        print(f"⚠ Reliability rescoring failed: {e}")
+        rescore_job['error'] = str(e)
+    finally:
+        rescore_job['running'] = False
+        rescore_job['finished_at'] = datetime.utcnow().isoformat()
+
+
+@app.route('/api/admin/rescore_reliability', methods=['GET', 'POST'])
+@admin_required
+def rescore_reliability_job():
+    """
+    Start (POST) or check on (GET) rescoring every provider's reliability
+    
+    The job runs in a background thread and resumes from its checkpoint
+    unless {"restart": true} is posted.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        with rescore_job_lock:
+            if rescore_job['running']:
+                return jsonify({
+                    'success': False,
+                    'error': 'Rescoring is already running',
+                    'job': rescore_job
+                }), 409
+            rescore_job.update(running=True, progress=None, error=None, finished_at=None)
+        
+        threading.Thread(
+            target=run_rescore_job,
+            args=(
+                data.get('model_type', 'rf'),
+                int(data.get('chunk_size') or Config.RELIABILITY_RESCORE_CHUNK_SIZE),
+                bool(data.get('restart'))
+            ),
+            daemon=True
+        ).start()
+        return jsonify({
+            'success': True,
+            'job': rescore_job
+        }), 202
+    
+    return jsonify({
+        'success': True,
+        'job': rescore_job
+    })
+
+
 # ==================== Interaction Endpoints ====================
 
 @app.route('/api/interactions', methods=['POST'])
@@ -767,6 +1371,12 @@ def create_interaction():
     """Track user-provider interaction"""
     data = request.json
     
+    # The user's history before this event, for the co-visitation index
+    history = db.session.query(
+        UserProviderInteraction.provider_id,
+        UserProviderInteraction.interaction_type
+    ).filter_by(user_id=data['user_id']).all()
+    
     # Check if interaction exists
     interaction = UserProviderInteraction.query.filter_by(
         user_id=data['user_id'],
@@ -788,6 +1398,26 @@ def create_interaction():
     
     db.session.commit()
     
+    # Make the new behavior visible to recommendations right away
+    from recommender import HIRE_INTERACTION_TYPES
+    try:
+        recommender = get_recommender()
+        recommender.update_interaction(
+            interaction.user_id, interaction.provider_id, interaction.interaction_type,
+            when=interaction.last_interaction
+        )
+        recommender.record_covisitation(
+            interaction.provider_id, interaction.interaction_type,
+            touched_ids=[provider_id for provider_id, _ in history],
+            hired_ids=[provider_id for provider_id, interaction_type in history
+                       if interaction_type in HIRE_INTERACTION_TYPES]
+        )
+    except Exception as e:
+        print(f"⚠ Could not update recommender: {e}")
+    if interaction.interaction_type in HIRE_INTERACTION_TYPES:
+        patch_popularity('record_hire', interaction.provider_id, 1, interaction.last_interaction)
+    user_activity_changed(interaction.user_id)
+    
     return jsonify({
         'message': 'Interaction tracked successfully',
         'interaction': interaction.to_dict()
@@ -1285,26 +1915,93 @@ def populate_db():
 
 
 @app.cli.command()
-def train_models():
+@click.option('--workers', default=None, type=int, help='Recommender training processes (default: RECOMMENDER_TRAINING_WORKERS)')
+def train_models(workers):
     """Train ML models"""
     from data_generator import generate_training_data
     from ml_classifier import train_and_save_models
-    from recommender import train_recommender
+    from training_pipeline import TrainingPipeline
+    from training_data import count_interactions, iter_interaction_chunks, provider_rows
     
-    # Generate training data
-    providers = ServiceProvider.query.all()
-    interactions = UserProviderInteraction.query.all()
+    # Generate training data (plain column rows, no ORM objects)
+    providers = provider_rows()
     
     # Train classifier
     df = generate_training_data(providers)
     df.to_csv('training_data.csv', index=False)
     train_and_save_models('training_data.csv')
     
-    # Train recommender
-    train_recommender(interactions, providers)
+    # Train recommender, streaming the interactions table in chunks and
+    # computing neighbor blocks in parallel (resumes from checkpoints)
+    pipeline = TrainingPipeline(
+        workers=workers or Config.RECOMMENDER_TRAINING_WORKERS,
+        checkpoint_dir=Config.RECOMMENDER_CHECKPOINT_DIR
+    )
+    pipeline.train(
+        None, providers,
+        interaction_chunks=iter_interaction_chunks(),
+        n_interactions=count_interactions(),
+        n_neighbors=Config.RECOMMENDER_NEIGHBORS,
+        n_provider_neighbors=Config.RECOMMENDER_PROVIDER_NEIGHBORS,
+        engine=Config.RECOMMENDER_ENGINE,
+        n_factors=Config.RECOMMENDER_FACTORS,
+        provider_index=Config.RECOMMENDER_PROVIDER_INDEX,
+        lsh_probes=Config.RECOMMENDER_LSH_PROBES,
+        half_life_days=Config.RECOMMENDER_HALF_LIFE_DAYS,
+        n_covisited=Config.RECOMMENDER_COVISITED,
+        precision=Config.RECOMMENDER_PRECISION
+    )
     
     print("\n✓ All models trained and saved successfully")
 
 
+@app.cli.command()
+@click.option('--chunk-size', default=2000, help='Users scored per worker task')
+@click.option('--workers', default=None, type=int, help='Worker processes (default: CPU count)')
+def refresh_recommendations(chunk_size, workers):
+    """Precompute every user's recommendations into user_recommendations
+    
+    Running web workers keep answering from their own recommendation cache
+    until its entries expire (RECOMMENDATION_CACHE_TTL), so the new rows are
+    served within one TTL of the refresh.
+    """
+    from recommendation_refresh import refresh_user_recommendations
+    
+    db.create_all()
+    refresh_user_recommendations(
+        Config.MODEL_DIR,
+        n_recommendations=Config.MATERIALIZED_RECOMMENDATIONS,
+        chunk_size=chunk_size,
+        workers=workers
+    )
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=None, type=int, help='Providers per chunk (default: RELIABILITY_RESCORE_CHUNK_SIZE)')
+@click.option('--model-type', default='rf', type=click.Choice(['rf', 'lr']), help='Classifier to score with')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and rescore every provider')
+def rescore_reliability_scores(chunk_size, model_type, restart):
+    """Recompute every provider's reliability_score with the trained classifier"""
+    rescore_reliability(
+        get_classifier(),
+        model_type=model_type,
+        chunk_size=chunk_size or Config.RELIABILITY_RESCORE_CHUNK_SIZE,
+        checkpoint_path=Config.RELIABILITY_RESCORE_CHECKPOINT,
+        restart=restart
+    )
+
+
+@app.cli.command()
+def warmup_models():
+    """Load every ML component and print the startup timing report"""
+    for component in ml_components.values():
+        component.get()
+    timing_report(ml_components.values(), app_import_seconds)
+
+
+# Import time of this module itself; ML components are timed as they load
+app_import_seconds = time.perf_counter() - app_import_started
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
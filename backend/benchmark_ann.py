@@ -0,0 +1,67 @@
+"""
+Benchmark the LSH provider index against exact cosine search
+
+Usage: python benchmark_ann.py [n_providers ...]   (default: 10000 100000 1000000)
+
+For each catalog size, synthetic provider feature vectors (one-hot service
+type plus five numeric features, as built by build_provider_features) are
+indexed and a sample of providers is queried. Recall@10 is measured against
+the exact top-10 from a brute-force scan of the normalized feature matrix.
+"""
+import sys
+import time
+import numpy as np
+from recommender import RandomProjectionLSH, normalize_rows
+
+N_SERVICE_TYPES = 8
+N_QUERIES = 200
+K = 10
+PROBE_SETTINGS = (0, 2, 4)
+
+
+def synthetic_features(n_providers, seed=0):
+    """Feature matrix shaped like HybridRecommender.provider_features"""
+    rng = np.random.default_rng(seed)
+    features = np.zeros((n_providers, N_SERVICE_TYPES + 5))
+    features[np.arange(n_providers), rng.integers(0, N_SERVICE_TYPES, n_providers)] = 1
+    features[:, N_SERVICE_TYPES:] = rng.random((n_providers, 5))
+    return features
+
+
+def exact_top_k(vectors, item, k):
+    similarities = vectors @ vectors[item]
+    similarities[item] = -np.inf
+    top = np.argpartition(-similarities, k - 1)[:k]
+    return top[np.argsort(-similarities[top])]
+
+
+def benchmark(n_providers):
+    features = synthetic_features(n_providers)
+    queries = np.random.default_rng(1).choice(n_providers, N_QUERIES, replace=False)
+    
+    start = time.perf_counter()
+    index = RandomProjectionLSH(features.shape[1]).build(features)
+    build_seconds = time.perf_counter() - start
+    
+    vectors = normalize_rows(features)
+    start = time.perf_counter()
+    truth = [set(exact_top_k(vectors, q, K).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) / N_QUERIES * 1000
+    
+    print(f"\n{n_providers:,} providers (LSH build {build_seconds:.2f}s)")
+    print(f"  {'method':<16}{'recall@10':>10}{'ms/query':>10}")
+    print(f"  {'exact':<16}{1.0:>10.3f}{exact_ms:>10.3f}")
+    
+    for n_probes in PROBE_SETTINGS:
+        start = time.perf_counter()
+        results = [index.query(vectors[q], K, n_probes=n_probes, exclude=q)[0] for q in queries]
+        lsh_ms = (time.perf_counter() - start) / N_QUERIES * 1000
+        
+        recall = np.mean([len(truth[i] & set(found.tolist())) / K for i, found in enumerate(results)])
+        print(f"  {'lsh probes=' + str(n_probes):<16}{recall:>10.3f}{lsh_ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    for size in sizes:
+        benchmark(size)
@@ -2,7 +2,6 @@ from flask import Blueprint, request, jsonify, current_app
 import os
 import json
 import random
-from textblob import TextBlob
 import requests
 from dotenv import load_dotenv
 from functools import wraps
@@ -17,5 +17,34 @@ class Config:
     RELIABILITY_MODEL_PATH = os.path.join(MODEL_DIR, 'reliability_classifier.pkl')
     RECOMMENDATION_MODEL_PATH = os.path.join(MODEL_DIR, 'recommender.pkl')
     
+    # Recommender settings
+    RECOMMENDER_NEIGHBORS = int(os.environ.get('RECOMMENDER_NEIGHBORS') or 20)  # top-k similar users kept per user
+    RECOMMENDER_PROVIDER_NEIGHBORS = int(os.environ.get('RECOMMENDER_PROVIDER_NEIGHBORS') or 20)  # top-k similar providers kept per provider
+    RECOMMENDER_ENGINE = os.environ.get('RECOMMENDER_ENGINE') or 'neighborhood'  # 'neighborhood' or 'svd'
+    RECOMMENDER_FACTORS = int(os.environ.get('RECOMMENDER_FACTORS') or 32)  # latent factors for the svd engine
+    RECOMMENDER_PROVIDER_INDEX = os.environ.get('RECOMMENDER_PROVIDER_INDEX') or 'exact'  # 'exact' or 'lsh' provider neighbor build
+    RECOMMENDER_LSH_PROBES = int(os.environ.get('RECOMMENDER_LSH_PROBES') or 2)  # extra buckets probed per LSH table (recall vs latency)
+    RECOMMENDER_HALF_LIFE_DAYS = float(os.environ.get('RECOMMENDER_HALF_LIFE_DAYS') or 0)  # interaction weight halves every N days (0 = no decay, the default)
+    RECOMMENDER_PRECISION = os.environ.get('RECOMMENDER_PRECISION') or 'float64'  # 'float64', 'float32', 'float16' or 'int8' model storage
+    RECOMMENDER_COVISITED = int(os.environ.get('RECOMMENDER_COVISITED') or 20)  # "also hired" providers kept per provider
+    RECOMMENDER_TRAINING_WORKERS = int(os.environ.get('RECOMMENDER_TRAINING_WORKERS') or 0)  # processes for neighbor blocks (0 = one per CPU)
+    RECOMMENDER_CHECKPOINT_DIR = os.environ.get('RECOMMENDER_CHECKPOINT_DIR') or os.path.join(MODEL_DIR, 'checkpoints')  # finished blocks of an interrupted training run
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE') or 10000)  # cached recommendation lists
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL') or 300)  # seconds before a cached list is recomputed
+    POPULARITY_CELL_SIZE_DEG = float(os.environ.get('POPULARITY_CELL_SIZE_DEG') or 0.05)  # grid cell of the per-area popularity lists
+    POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS') or 30)  # hires count half as much after N days
+    POPULARITY_REBUILD_HOURS = float(os.environ.get('POPULARITY_REBUILD_HOURS') or 6)  # background rebuild to re-decay providers without new hires
+    RECOMMENDATION_CANDIDATES = int(os.environ.get('RECOMMENDATION_CANDIDATES') or 300)  # providers proposed per candidate generator
+    RECOMMENDATION_QUEUE_BUDGET_MS = float(os.environ.get('RECOMMENDATION_QUEUE_BUDGET_MS') or 50)  # pipeline tasks still waiting for a worker after this are skipped
+    RECOMMENDATION_CANDIDATE_BUDGET_MS = float(os.environ.get('RECOMMENDATION_CANDIDATE_BUDGET_MS') or 50)  # candidate generators running longer than this (from their start) stop and are skipped
+    RECOMMENDATION_RERANK_BUDGET_MS = float(os.environ.get('RECOMMENDATION_RERANK_BUDGET_MS') or 100)  # re-ranking slower than this returns candidates unscored
+    RECOMMENDATION_PIPELINE_WORKERS = int(os.environ.get('RECOMMENDATION_PIPELINE_WORKERS') or 8)  # threads shared by the pipeline stages
+    MATERIALIZED_RECOMMENDATIONS = int(os.environ.get('MATERIALIZED_RECOMMENDATIONS') or 20)  # providers stored per user_recommendations row
+    MATERIALIZED_RECOMMENDATIONS_MAX_AGE_HOURS = float(os.environ.get('MATERIALIZED_RECOMMENDATIONS_MAX_AGE_HOURS') or 24)  # older rows are ignored
+    CLASSIFIER_CACHE_SIZE = int(os.environ.get('CLASSIFIER_CACHE_SIZE') or 10000)  # memoized single-provider predictions (0 = off)
+    CLASSIFY_BATCH_MAX = int(os.environ.get('CLASSIFY_BATCH_MAX') or 10000)  # providers accepted per /api/classify_providers request
+    RELIABILITY_RESCORE_CHUNK_SIZE = int(os.environ.get('RELIABILITY_RESCORE_CHUNK_SIZE') or 5000)  # providers classified and updated per chunk
+    RELIABILITY_RESCORE_CHECKPOINT = os.environ.get('RELIABILITY_RESCORE_CHECKPOINT') or os.path.join(MODEL_DIR, 'checkpoints', 'reliability_rescore.json')  # last rescored provider id, for resuming
+    
     # CORS settings
     CORS_HEADERS = 'Content-Type'
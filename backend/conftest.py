@@ -0,0 +1,104 @@
+"""
+Shared pytest fixtures of the recommender tests
+
+Factories for synthetic providers, interaction events and a trained
+recommender on top of them, so each test module picks its own sizes.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from recommender import HybridRecommender, ProviderCatalog
+
+SERVICE_TYPES = ['Plumber', 'Electrician', 'Carpenter', 'Painter', 'Cleaner']
+INTERACTION_TYPES = ['view', 'contact', 'hire', 'favorite']
+
+
+def synthetic_providers(n, seed=0):
+    """Providers with every field the recommender reads, service types in turn"""
+    rng = np.random.default_rng(seed)
+    return [
+        SimpleNamespace(
+            id=i + 1,
+            service_type=SERVICE_TYPES[i % len(SERVICE_TYPES)],
+            rating=round(float(rng.uniform(2, 5)), 2),
+            experience_years=int(rng.integers(0, 25)),
+            completion_rate=float(rng.uniform(0.5, 1)),
+            response_time=float(rng.uniform(0.5, 48)),
+            verified=bool(rng.integers(0, 2)),
+            latitude=float(13 + rng.uniform(0, 0.3)),
+            longitude=float(80.1 + rng.uniform(0, 0.3))
+        )
+        for i in range(n)
+    ]
+
+
+def interaction_events(n, n_users, n_providers, seed=0, interaction_types=INTERACTION_TYPES,
+                       max_count=1, days=None):
+    """
+    UserProviderInteraction-like rows with random users, providers and types
+    
+    Counts are drawn from 1..max_count. With `days`, each row's
+    last_interaction falls within that many days from 2024-01-01.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        SimpleNamespace(user_id=int(u), provider_id=int(p), interaction_type=interaction_types[int(t)],
+                        interaction_count=int(c),
+                        last_interaction=start + timedelta(days=int(d)) if days else None)
+        for u, p, t, c, d in zip(rng.integers(1, n_users + 1, n),
+                                 rng.integers(1, n_providers + 1, n),
+                                 rng.integers(0, len(interaction_types), n),
+                                 rng.integers(1, max_count + 1, n),
+                                 rng.integers(0, days or 1, n))
+    ]
+
+
+def synthetic_model(engine='neighborhood', seed=0, n_providers=1500, n_users=2000,
+                    n_interactions=30000, n_sample_users=200):
+    """A trained float64 recommender, its catalog and a sample of its user ids"""
+    rng = np.random.default_rng(seed)
+    providers = synthetic_providers(n_providers, seed)
+    
+    # Users favour a few "taste" groups of providers so neighbors are meaningful
+    groups = rng.integers(0, 30, n_users)
+    user_ids = rng.integers(1, n_users + 1, n_interactions)
+    provider_ids = (groups[user_ids - 1] * 50 + rng.integers(0, 80, n_interactions)) % n_providers + 1
+    interactions = [
+        SimpleNamespace(user_id=int(u), provider_id=int(p),
+                        interaction_type=INTERACTION_TYPES[int(t)], interaction_count=int(c))
+        for u, p, t, c in zip(user_ids, provider_ids,
+                              rng.integers(0, len(INTERACTION_TYPES), n_interactions),
+                              rng.integers(1, 4, n_interactions))
+    ]
+    
+    recommender = HybridRecommender(engine=engine)
+    recommender.build_user_provider_matrix(interactions)
+    if engine == 'svd':
+        recommender.build_factors(n_factors=16)
+    else:
+        recommender.build_user_neighbors(k=20)
+    recommender.build_provider_features(providers, k=20)
+    
+    catalog = ProviderCatalog.from_providers(providers)
+    sample = rng.choice(recommender.user_provider_matrix.user_ids, n_sample_users, replace=False)
+    return recommender, catalog, sample.tolist()
+
+
+@pytest.fixture
+def make_providers():
+    """synthetic_providers(n, seed=0)"""
+    return synthetic_providers
+
+
+@pytest.fixture
+def make_interactions():
+    """interaction_events(n, n_users, n_providers, seed=0, ...)"""
+    return interaction_events
+
+
+@pytest.fixture
+def make_model():
+    """synthetic_model(engine='neighborhood', seed=0, ...)"""
+    return synthetic_model
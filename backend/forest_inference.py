@@ -0,0 +1,132 @@
+import numpy as np
+
+# sklearn marks leaves with this child index
+TREE_LEAF = -1
+
+
+def float32_split(threshold):
+    """
+    Threshold t64 such that `z <= t64` for float64 z matches sklearn's
+    `float32(z) <= threshold` (trees compare features cast to float32)
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    # Largest float32 <= threshold, and the float32 just above it
+    below = threshold.astype(np.float32)
+    below = np.where(below > threshold, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    # float64 values up to the midpoint round down to `below`; the midpoint
+    # itself rounds to whichever of the two has an even mantissa
+    midpoint = (below.astype(np.float64) + above.astype(np.float64)) / 2
+    even = (below.view(np.int32) & 1) == 0
+    return np.where(even, midpoint, np.nextafter(midpoint, -np.inf))
+
+
+def fold_scaler(threshold, mean, scale):
+    """
+    Largest raw x with `(x - mean) / scale <= threshold`, computed as
+    StandardScaler.transform does in float64, so the folded split sends
+    every raw value the same way as the scaled one
+    """
+    x = threshold * scale + mean
+    finite = np.isfinite(x)
+    # The affine map rounds, so settle the last few ulps against it directly
+    too_high = finite & ((x - mean) / scale > threshold)
+    while too_high.any():
+        x[too_high] = np.nextafter(x[too_high], -np.inf)
+        too_high &= (x - mean) / scale > threshold
+    while True:
+        step = np.nextafter(x, np.inf)
+        can_rise = finite & ((step - mean) / scale <= threshold)
+        if not can_rise.any():
+            return x
+        x = np.where(can_rise, step, x)
+
+
+class FlatForest:
+    """A trained RandomForestClassifier flattened into contiguous node arrays
+    
+    All trees' nodes are concatenated into `feature`, `threshold`, `left`,
+    `right` and `value` arrays, with each tree's root at `roots[t]`. The
+    StandardScaler the forest was trained behind is folded into the
+    thresholds: a split `(x - mean) / scale <= t` becomes `x <= t * scale +
+    mean`, so raw feature rows go in unscaled. Thresholds are first moved to
+    the exact float64 boundary of sklearn's float32 comparison. Leaves point to themselves
+    with an infinite threshold, which lets every tree be walked for a fixed
+    max_depth steps without branching on leaves.
+    
+    predict_proba walks all trees (and all rows of a small batch) together,
+    one NumPy step per tree level, instead of going through sklearn's
+    per-call validation and per-tree dispatch.
+    """
+    
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+    
+    @classmethod
+    def from_sklearn(cls, forest, scaler=None):
+        """Flatten a fitted RandomForestClassifier, folding in a fitted StandardScaler"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            leaf = tree.children_left == TREE_LEAF
+            nodes = np.arange(tree.node_count)
+            
+            feature = np.where(leaf, 0, tree.feature)
+            threshold = float32_split(tree.threshold)
+            if scaler is not None:
+                mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(forest.n_features_in_)
+                scale = scaler.scale_ if scaler.scale_ is not None else np.ones(forest.n_features_in_)
+                threshold = fold_scaler(threshold, mean[feature], scale[feature])
+            threshold = np.where(leaf, np.inf, threshold)
+            
+            # Leaf values are (weighted) class counts in older sklearn versions
+            value = tree.value[:, 0, :].astype(np.float64)
+            value /= value.sum(axis=1, keepdims=True)
+            
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            values.append(value)
+            roots.append(offset)
+            offset += tree.node_count
+        
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.intp),
+            max_depth=max(estimator.tree_.max_depth for estimator in forest.estimators_),
+            classes=forest.classes_
+        )
+    
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+    
+    def apply(self, X):
+        """Leaf node index of every (row, tree), shape (n_rows, n_trees)"""
+        X = np.asarray(X, dtype=np.float64)
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+    
+    def predict_proba(self, X):
+        """Mean of the trees' leaf class fractions, as RandomForestClassifier.predict_proba"""
+        return self.value[self.apply(X)].mean(axis=1)
+    
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
@@ -5,11 +5,12 @@ This script sets up the database and trains ML models
 """
 
 from app import app
+from config import Config
 from models import db, Admin
 from data_generator import populate_database
 from ml_classifier import train_and_save_models
-from recommender import train_recommender
-from models import ServiceProvider, UserProviderInteraction
+from training_pipeline import TrainingPipeline
+from training_data import count_interactions, iter_interaction_chunks, provider_rows
 import os
 
 
@@ -53,9 +54,24 @@ def main():
         
         # Step 3: Train recommender system
         print("\n[3/3] Training recommendation system...")
-        providers = ServiceProvider.query.all()
-        interactions = UserProviderInteraction.query.all()
-        train_recommender(interactions, providers)
+        pipeline = TrainingPipeline(
+            workers=Config.RECOMMENDER_TRAINING_WORKERS,
+            checkpoint_dir=Config.RECOMMENDER_CHECKPOINT_DIR
+        )
+        pipeline.train(
+            None, provider_rows(),
+            interaction_chunks=iter_interaction_chunks(),
+            n_interactions=count_interactions(),
+            n_neighbors=Config.RECOMMENDER_NEIGHBORS,
+            n_provider_neighbors=Config.RECOMMENDER_PROVIDER_NEIGHBORS,
+            engine=Config.RECOMMENDER_ENGINE,
+            n_factors=Config.RECOMMENDER_FACTORS,
+            provider_index=Config.RECOMMENDER_PROVIDER_INDEX,
+            lsh_probes=Config.RECOMMENDER_LSH_PROBES,
+            half_life_days=Config.RECOMMENDER_HALF_LIFE_DAYS,
+            n_covisited=Config.RECOMMENDER_COVISITED,
+            precision=Config.RECOMMENDER_PRECISION
+        )
         
     print("\n" + "="*70)
     print(" INITIALIZATION COMPLETE!")
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class LazyComponent:
+    """A heavy app component imported and loaded on first use
+    
+    `import_component()` does the module imports and returns whatever
+    `load(imported)` needs to build the component, so the two costs are
+    timed separately for the startup report. Concurrent first calls wait
+    for a single load.
+    """
+    
+    def __init__(self, name, import_component, load):
+        self.name = name
+        self._import = import_component
+        self._load = load
+        self._lock = threading.Lock()
+        self._value = None
+        self.import_seconds = None
+        self.load_seconds = None
+    
+    @property
+    def loaded(self):
+        return self._value is not None
+    
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    start = time.perf_counter()
+                    imported = self._import()
+                    self.import_seconds = time.perf_counter() - start
+                    
+                    start = time.perf_counter()
+                    value = self._load(imported)
+                    self.load_seconds = time.perf_counter() - start
+                    self._value = value
+                    print(f"✓ {self.name} ready (import {self.import_seconds:.2f}s, "
+                          f"load {self.load_seconds:.2f}s)")
+        return self._value
+    
+    def timing(self):
+        return {
+            'component': self.name,
+            'loaded': self.loaded,
+            'import_seconds': None if self.import_seconds is None else round(self.import_seconds, 3),
+            'load_seconds': None if self.load_seconds is None else round(self.load_seconds, 3)
+        }
+
+
+def timing_report(components, app_import_seconds=None):
+    """Print a table of import and load time per component and return its rows"""
+    rows = [component.timing() for component in components]
+    print(f"\n{'component':<24}{'import s':>10}{'load s':>10}")
+    if app_import_seconds is not None:
+        print(f"{'app (without ML)':<24}{app_import_seconds:>10.2f}{'-':>10}")
+    for row in rows:
+        if row['loaded']:
+            print(f"{row['component']:<24}{row['import_seconds']:>10.2f}{row['load_seconds']:>10.2f}")
+        else:
+            print(f"{row['component']:<24}{'not loaded':>20}")
+    return rows
@@ -0,0 +1,27 @@
+import sqlite3
+import os
+
+# Connect to the database
+db_path = os.path.join(os.path.dirname(__file__), '..', 'instance', 'community_service.db')
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+# Create the table holding precomputed recommendations (see `flask refresh-recommendations`)
+try:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            service_type VARCHAR(50) NOT NULL DEFAULT '',
+            provider_ids TEXT NOT NULL,
+            generated_at DATETIME,
+            CONSTRAINT uq_user_recommendations_user_service UNIQUE (user_id, service_type)
+        )
+    """)
+    print("Successfully created user_recommendations table")
+except sqlite3.OperationalError as e:
+    print(f"Error creating table: {e}")
+
+# Commit changes and close connection
+conn.commit()
+conn.close()
@@ -1,23 +1,97 @@
+import hashlib
 import os
+import threading
+from collections import OrderedDict
 import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-import matplotlib.pyplot as plt
-import seaborn as sns
 import joblib
+from forest_inference import FlatForest
+
+# sklearn, pandas and the plotting libraries are imported by the training and
+# evaluation methods that use them, so inference only needs numpy and joblib
+
+# Files written by save_models; their contents define the model version
+MODEL_FILES = ('rf_classifier.pkl', 'lr_classifier.pkl', 'scaler.pkl')
+
+# Random forest batches up to this size are scored by the flattened forest;
+# sklearn's own predict_proba is faster beyond it
+FLAT_FOREST_MAX_ROWS = 256
+
+# Decimals kept of each feature (feature_names order) before any prediction
+# path scores it; matches the precision the provider columns are stored with
+FEATURE_DECIMALS = (0, 2, 0, 3, 2, 0)
+
+
+def round_features(features):
+    """Copy of an (n, 6) feature array rounded to FEATURE_DECIMALS"""
+    features = np.array(features, dtype=float).reshape(-1, len(FEATURE_DECIMALS))
+    for column, decimals in enumerate(FEATURE_DECIMALS):
+        features[:, column] = np.round(features[:, column], decimals)
+    return features
+
+
+class PredictionCache:
+    """Bounded LRU cache of single-provider predictions
+    
+    Keys are (model_version, model_type, rounded feature tuple) and values
+    the (label, probabilities) pair, so a repeat lookup is one dict access.
+    """
+    
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (label, probabilities), oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every entry, e.g. after the models are reloaded"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
 
 
 class ReliabilityClassifier:
     """ML classifier for provider reliability prediction"""
     
-    def __init__(self):
+    def __init__(self, cache_size=10000):
+        self.prediction_cache = PredictionCache(cache_size)
         self.rf_model = None
+        self.rf_flat = None
         self.lr_model = None
-        self.scaler = StandardScaler()
+        self.scaler = None  # fitted by prepare_data or loaded by load_models
+        self.model_version = None
         self.feature_names = ['experience_years', 'rating', 'total_jobs', 
                              'completion_rate', 'response_time', 'verified']
         self.label_map = {
@@ -28,10 +102,14 @@ class ReliabilityClassifier:
         
     def prepare_data(self, df):
         """Prepare data for training"""
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import StandardScaler
+        
         X = df[self.feature_names].values
         y = df['reliability_label'].values
         
         # Scale features
+        self.scaler = StandardScaler()
         X_scaled = self.scaler.fit_transform(X)
         
         # Check if stratification is possible
@@ -46,6 +124,9 @@ class ReliabilityClassifier:
     
     def train_models(self, X_train, y_train):
         """Train Random Forest and Logistic Regression models"""
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.linear_model import LogisticRegression
+        
         print("Training Random Forest Classifier...")
         self.rf_model = RandomForestClassifier(
             n_estimators=100,
@@ -55,6 +136,7 @@ class ReliabilityClassifier:
             class_weight='balanced'
         )
         self.rf_model.fit(X_train, y_train)
+        self.rf_flat = FlatForest.from_sklearn(self.rf_model, self.scaler)
         
         print("Training Logistic Regression Classifier...")
         self.lr_model = LogisticRegression(
@@ -64,9 +146,12 @@ class ReliabilityClassifier:
             multi_class='multinomial'
         )
         self.lr_model.fit(X_train, y_train)
+        self.prediction_cache.clear()
         
     def evaluate_models(self, X_test, y_test):
         """Evaluate both models and generate reports"""
+        from sklearn.metrics import classification_report, accuracy_score
+        
         print("\n" + "="*60)
         print("RANDOM FOREST EVALUATION")
         print("="*60)
@@ -102,6 +187,10 @@ class ReliabilityClassifier:
     
     def _plot_confusion_matrices(self, y_test, rf_pred, lr_pred):
         """Plot confusion matrices for both models"""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from sklearn.metrics import confusion_matrix
+        
         fig, axes = plt.subplots(1, 2, figsize=(14, 5))
         
         # Random Forest
@@ -130,6 +219,8 @@ class ReliabilityClassifier:
         
     def _plot_feature_importance(self):
         """Plot feature importance from Random Forest"""
+        import matplotlib.pyplot as plt
+        
         importances = self.rf_model.feature_importances_
         indices = np.argsort(importances)[::-1]
         
@@ -144,35 +235,85 @@ class ReliabilityClassifier:
         plt.savefig('feature_importance.png', dpi=300, bbox_inches='tight')
         print("✓ Feature importance plot saved to feature_importance.png")
         
+    def _model(self, model_type):
+        return self.rf_model if model_type == 'rf' else self.lr_model
+    
+    def format_prediction(self, label, probability):
+        """Prediction dict for one provider, as returned by predict"""
+        return {
+            'reliability': self.label_map[label],
+            'confidence': float(max(probability)),
+            'probabilities': {
+                'Low Reliability': float(probability[0]),
+                'Moderately Reliable': float(probability[1]),
+                'Highly Reliable': float(probability[2])
+            }
+        }
+    
+    def features_from_dicts(self, providers):
+        """(n, 6) feature array from provider dicts (missing features are 0)"""
+        features = np.zeros((len(providers), len(self.feature_names)))
+        for i, provider in enumerate(providers):
+            for j, name in enumerate(self.feature_names):
+                features[i, j] = provider.get(name) or 0
+        return features
+    
+    def predict_batch(self, features, model_type='rf'):
+        """
+        Predict reliability for many providers at once
+        
+        `features` is an (n, 6) array in feature_names order, or a DataFrame
+        with those columns. The rows are rounded to FEATURE_DECIMALS, as
+        predict() rounds them, then scaled and scored in one vectorized
+        pass: labels are the argmax of predict_proba, which is how both
+        models' predict() decides. Returns (labels, probabilities) as an
+        (n,) array of label ids and an (n, 3) array.
+        """
+        if hasattr(features, 'columns'):  # pandas DataFrame
+            features = features[self.feature_names].to_numpy(dtype=float)
+        features = round_features(features)
+        
+        model = self._model(model_type)
+        if len(features) == 0:
+            return np.array([], dtype=model.classes_.dtype), np.empty((0, len(model.classes_)))
+        
+        if model_type == 'rf' and self.rf_flat is not None and len(features) <= FLAT_FOREST_MAX_ROWS:
+            # The scaler is folded into the flattened forest's thresholds
+            probabilities = self.rf_flat.predict_proba(features)
+        else:
+            probabilities = model.predict_proba(self.scaler.transform(features))
+        labels = model.classes_[np.argmax(probabilities, axis=1)]
+        return labels, probabilities
+    
     def predict(self, provider_features, model_type='rf'):
         """Predict reliability for new provider"""
-        features = np.array([[
+        features = (
             provider_features.get('experience_years', 0),
             provider_features.get('rating', 0),
             provider_features.get('total_jobs', 0),
             provider_features.get('completion_rate', 0),
             provider_features.get('response_time', 0),
             provider_features.get('verified', 0)
-        ]])
-        
-        features_scaled = self.scaler.transform(features)
-        
-        if model_type == 'rf':
-            prediction = self.rf_model.predict(features_scaled)[0]
-            probability = self.rf_model.predict_proba(features_scaled)[0]
-        else:
-            prediction = self.lr_model.predict(features_scaled)[0]
-            probability = self.lr_model.predict_proba(features_scaled)[0]
+        )
+        # Keyed on the values predict_batch scores, so cached and fresh results agree
+        features = round_features([features])
+        key = (self.model_version, model_type, tuple(features[0].tolist()))
         
-        return {
-            'reliability': self.label_map[prediction],
-            'confidence': float(max(probability)),
-            'probabilities': {
-                'Low Reliability': float(probability[0]),
-                'Moderately Reliable': float(probability[1]),
-                'Highly Reliable': float(probability[2])
-            }
-        }
+        cached = self.prediction_cache.get(key)
+        if cached is None:
+            labels, probabilities = self.predict_batch(features, model_type)
+            cached = (labels[0], tuple(probabilities[0]))
+            self.prediction_cache.put(key, cached)
+        return self.format_prediction(*cached)
+    
+    @staticmethod
+    def _model_version(directory):
+        """Short content hash of the saved model files"""
+        digest = hashlib.sha1()
+        for name in MODEL_FILES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:12]
     
     def save_models(self, directory='models'):
         """Save trained models and scaler"""
@@ -181,6 +322,7 @@ class ReliabilityClassifier:
         joblib.dump(self.rf_model, os.path.join(directory, 'rf_classifier.pkl'))
         joblib.dump(self.lr_model, os.path.join(directory, 'lr_classifier.pkl'))
         joblib.dump(self.scaler, os.path.join(directory, 'scaler.pkl'))
+        self.model_version = self._model_version(directory)
         
         print(f"\n✓ Models saved to {directory}/")
         
@@ -189,12 +331,17 @@ class ReliabilityClassifier:
         self.rf_model = joblib.load(os.path.join(directory, 'rf_classifier.pkl'))
         self.lr_model = joblib.load(os.path.join(directory, 'lr_classifier.pkl'))
         self.scaler = joblib.load(os.path.join(directory, 'scaler.pkl'))
+        self.rf_flat = FlatForest.from_sklearn(self.rf_model, self.scaler)
+        self.model_version = self._model_version(directory)
+        self.prediction_cache.clear()
         
         print(f"✓ Models loaded from {directory}/")
 
 
 def train_and_save_models(data_file='training_data.csv'):
     """Main function to train and save models"""
+    import pandas as pd
+    
     print("Loading training data...")
     df = pd.read_csv(data_file)
     
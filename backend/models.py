@@ -258,3 +258,29 @@ class Booking(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+class UserRecommendation(db.Model):
+    """Precomputed top-N providers for a user, refreshed offline"""
+    __tablename__ = 'user_recommendations'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'service_type', name='uq_user_recommendations_user_service'),
+    )
+    
+    id = db.Column(Integer, primary_key=True)
+    user_id = db.Column(Integer, ForeignKey('users.id'), nullable=False)
+    service_type = db.Column(String(50), nullable=False, default='')  # '' = all service types
+    provider_ids = db.Column(Text, nullable=False)  # comma-separated, best first
+    generated_at = db.Column(DateTime, default=datetime.utcnow)
+    
+    def provider_id_list(self):
+        return [int(pid) for pid in self.provider_ids.split(',') if pid]
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'service_type': self.service_type or None,
+            'provider_ids': self.provider_id_list(),
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None
+        }
@@ -0,0 +1,191 @@
+import bisect
+import heapq
+import math
+import threading
+from datetime import datetime
+
+# Weights of the popularity blend: rating/5 plus log(1 + recent hires)
+RATING_WEIGHT = 1.0
+HIRE_WEIGHT = 0.5
+
+
+class PopularityIndex:
+    """Precomputed popularity rankings per (service_type, location cell)
+    
+    A provider's popularity blends its rating with the log of its recent
+    hire count, where every hire decays with a half-life of
+    `half_life_days`. Each provider is ranked in four lists: all providers,
+    its service type, its grid cell, and its service type within the cell.
+    Only the best `list_size` entries of a list are kept sorted, so a lookup
+    is a slice. New hires, rating changes and provider edits move just that
+    provider, in O(list_size) per list. The sorted lists are recomputed
+    from all members only when a listed provider's score drops.
+    
+    Hire decay is applied to a provider when it changes. Providers without
+    new activity keep the score from their last update until the index is
+    rebuilt, so callers should rebuild it periodically.
+    """
+    
+    def __init__(self, cell_size_deg=0.05, list_size=50, half_life_days=30):
+        self.cell_size_deg = cell_size_deg
+        self.list_size = list_size
+        self.half_life_days = half_life_days
+        self.built_at = datetime.utcnow()
+        self._lock = threading.Lock()
+        self._providers = {}    # id -> (service_type, cell, rating)
+        self._hires = {}        # id -> decayed hire count at built_at
+        self._scores = {}       # id -> current score
+        self._members = {}      # list key -> {id: score}
+        self._top = {}          # list key -> [(-score, id)], best first
+    
+    @classmethod
+    def from_rows(cls, providers, hires=(), **kwargs):
+        """
+        Build from (id, service_type, latitude, longitude, rating) provider
+        rows and (provider_id, interaction_count, last_interaction) hire rows
+        """
+        index = cls(**kwargs)
+        for provider_id, service_type, latitude, longitude, rating in providers:
+            index._providers[provider_id] = (
+                service_type, index._cell(latitude, longitude), rating or 0.0
+            )
+        for provider_id, count, when in hires:
+            if provider_id in index._providers:
+                index._hires[provider_id] = (
+                    index._hires.get(provider_id, 0.0) + (count or 1) * index._decay(when)
+                )
+        
+        for provider_id in index._providers:
+            score = index._score(provider_id)
+            index._scores[provider_id] = score
+            for key in index._keys(provider_id):
+                index._members.setdefault(key, {})[provider_id] = score
+        for key in index._members:
+            index._rerank(key)
+        return index
+    
+    def __len__(self):
+        return len(self._providers)
+    
+    def _cell(self, latitude, longitude):
+        if latitude is None or longitude is None:
+            return None
+        return (math.floor(latitude / self.cell_size_deg),
+                math.floor(longitude / self.cell_size_deg))
+    
+    def _keys(self, provider_id):
+        service_type, cell, _ = self._providers[provider_id]
+        keys = [(None, None), (service_type, None)]
+        if cell is not None:
+            keys += [(None, cell), (service_type, cell)]
+        return keys
+    
+    def _decay(self, when):
+        """Weight of a hire at `when` relative to one at built_at"""
+        if not self.half_life_days or when is None:
+            return 1.0
+        age_days = (when - self.built_at).total_seconds() / 86400
+        return 2.0 ** (age_days / self.half_life_days)
+    
+    def _score(self, provider_id):
+        rating = self._providers[provider_id][2]
+        hires = self._hires.get(provider_id, 0.0) / self._decay(datetime.utcnow())
+        return RATING_WEIGHT * min(max(rating, 0.0), 5.0) / 5.0 + HIRE_WEIGHT * math.log1p(hires)
+    
+    def _rerank(self, key):
+        members = self._members[key]
+        self._top[key] = sorted(
+            (-score, provider_id)
+            for provider_id, score in heapq.nlargest(self.list_size, members.items(), key=lambda m: m[1])
+        )
+    
+    def _move(self, key, provider_id, old_score, new_score):
+        """Update one provider's entry in one list"""
+        members = self._members.setdefault(key, {})
+        top = self._top.setdefault(key, [])
+        members[provider_id] = new_score
+        
+        listed = old_score is not None and (-old_score, provider_id) in top
+        if listed:
+            top.remove((-old_score, provider_id))
+            if new_score < old_score and len(members) > len(top) + 1:
+                # An unlisted provider may now outrank this one
+                self._rerank(key)
+                return
+        if len(top) < self.list_size:
+            bisect.insort(top, (-new_score, provider_id))
+        elif (-new_score, provider_id) < top[-1]:
+            bisect.insort(top, (-new_score, provider_id))
+            top.pop()
+    
+    def _rescore(self, provider_id, old_keys=()):
+        old_score = self._scores.get(provider_id)
+        new_score = self._score(provider_id)
+        self._scores[provider_id] = new_score
+        keys = self._keys(provider_id)
+        for key in old_keys:
+            if key not in keys:
+                self._drop(key, provider_id, old_score)
+        for key in keys:
+            self._move(key, provider_id, old_score if key in old_keys else None, new_score)
+    
+    def _drop(self, key, provider_id, score):
+        members = self._members.get(key, {})
+        members.pop(provider_id, None)
+        top = self._top.get(key, [])
+        if (-score, provider_id) in top:
+            top.remove((-score, provider_id))
+            if len(members) > len(top):
+                self._rerank(key)
+    
+    def set_provider(self, provider_id, service_type, latitude, longitude, rating):
+        """Add a provider or apply a change to its type, location or rating"""
+        with self._lock:
+            old_keys = self._keys(provider_id) if provider_id in self._providers else ()
+            self._providers[provider_id] = (
+                service_type, self._cell(latitude, longitude), rating or 0.0
+            )
+            self._rescore(provider_id, old_keys)
+    
+    def remove_provider(self, provider_id):
+        """Drop a provider from every list (no-op if absent)"""
+        with self._lock:
+            if provider_id not in self._providers:
+                return
+            score = self._scores.pop(provider_id)
+            for key in self._keys(provider_id):
+                self._drop(key, provider_id, score)
+            del self._providers[provider_id]
+            self._hires.pop(provider_id, None)
+    
+    def record_hire(self, provider_id, count=1, when=None):
+        """Count a new hire of a known provider"""
+        with self._lock:
+            if provider_id not in self._providers:
+                return
+            when = when or datetime.utcnow()
+            self._hires[provider_id] = self._hires.get(provider_id, 0.0) + count * self._decay(when)
+            self._rescore(provider_id, self._keys(provider_id))
+    
+    def top(self, service_type=None, location=None, n=10):
+        """
+        Most popular provider ids, best first
+        
+        With a (latitude, longitude) location, the user's cell comes first,
+        then the service type's overall ranking fills any remaining places.
+        """
+        service_type = service_type or None
+        with self._lock:
+            keys = [(service_type, None)]
+            if location:
+                keys.insert(0, (service_type, self._cell(*location)))
+            
+            provider_ids = []
+            for key in keys:
+                for _, provider_id in self._top.get(key, [])[:n]:
+                    if provider_id not in provider_ids:
+                        provider_ids.append(provider_id)
+                if len(provider_ids) >= n:
+                    break
+            return provider_ids[:n]
+
@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Bounded LRU + TTL cache for recommendation results
+    
+    Entries are keyed on (user_id, service_type, location cell,
+    n_recommendations) and hold the recommended provider ids. Reverse indexes
+    from users and providers to keys let a new interaction or review drop
+    only that user's entries, and a provider change drop only the entries
+    that contain the provider. Concurrent misses on the same key wait for a
+    single computation instead of each scoring the catalog.
+    """
+    
+    def __init__(self, max_entries=10000, ttl_seconds=300, cell_size_deg=0.01):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cell_size_deg = cell_size_deg
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, provider_ids), oldest first
+        self._user_keys = {}
+        self._provider_keys = {}
+        self._in_flight = {}            # key -> _PendingResult
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def key(self, user_id, service_type, user_location, n_recommendations):
+        """Cache key; locations are snapped to the same grid cells as the spatial index"""
+        cell = None
+        if user_location:
+            latitude, longitude = user_location
+            cell = (math.floor(latitude / self.cell_size_deg),
+                    math.floor(longitude / self.cell_size_deg))
+        return (user_id, service_type or None, cell, n_recommendations)
+    
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return the cached provider ids for key, calling compute() at most once per miss
+        
+        When given, cacheable() is called after compute() and a false result
+        keeps the ids out of the cache (e.g. a degraded result).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(entry[1])
+                self._discard(key)
+                self.expirations += 1
+            
+            pending = self._in_flight.get(key)
+            computing = pending is None
+            if computing:
+                self.misses += 1
+                pending = self._in_flight[key] = _PendingResult()
+            else:
+                self.coalesced += 1
+        
+        if not computing:
+            # Another request is already computing this key
+            return list(pending.wait())
+        
+        try:
+            provider_ids = list(compute())
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            pending.fail(e)
+            raise
+        
+        with self._lock:
+            del self._in_flight[key]
+            # An invalidation that raced with the computation makes the result suspect
+            if not pending.stale and (cacheable is None or cacheable()):
+                self._store(key, provider_ids)
+        pending.resolve(provider_ids)
+        return list(provider_ids)
+    
+    def _store(self, key, provider_ids):
+        self._discard(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, tuple(provider_ids))
+        self._user_keys.setdefault(key[0], set()).add(key)
+        for provider_id in provider_ids:
+            self._provider_keys.setdefault(provider_id, set()).add(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+        for provider_id in entry[1]:
+            keys = self._provider_keys.get(provider_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._provider_keys[provider_id]
+        return True
+    
+    def invalidate_user(self, user_id):
+        """Drop every entry computed for a user"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self.invalidations += self._discard(key)
+            for key, pending in self._in_flight.items():
+                if key[0] == user_id:
+                    pending.stale = True
+    
+    def invalidate_provider(self, provider_id):
+        """Drop every entry whose recommendations include a provider"""
+        with self._lock:
+            for key in list(self._provider_keys.get(provider_id, ())):
+                self.invalidations += self._discard(key)
+            # Results still being computed may or may not contain the provider
+            for pending in self._in_flight.values():
+                pending.stale = True
+    
+    def clear(self):
+        """Drop everything, e.g. after the recommender model is reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._provider_keys.clear()
+            for pending in self._in_flight.values():
+                pending.stale = True
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
+
+
+class _PendingResult:
+    """Result slot shared by the requests waiting on one in-flight computation"""
+    
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+        self.stale = False
+    
+    def resolve(self, value):
+        self._value = value
+        self._done.set()
+    
+    def fail(self, error):
+        self._error = error
+        self._done.set()
+    
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
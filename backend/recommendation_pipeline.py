@@ -0,0 +1,296 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+from recommender import MAX_SCORING_DISTANCE_KM
+
+# Per-request wall-clock budget of each stage, counted from when a task
+# starts running; candidate generators run concurrently, so the candidates
+# budget bounds the slowest of them. 'queue' is the longest a task may wait
+# for a free worker of the shared pool before it is skipped.
+DEFAULT_STAGE_BUDGETS_MS = {
+    'queue': 50,
+    'candidates': 50,
+    'rerank': 100
+}
+
+# Provider columns scored per deadline check by the factor-model generator
+FACTOR_BLOCK_SIZE = 4096
+
+
+class StageCancelled(Exception):
+    """A task ran past its budget, or its request stopped waiting for it"""
+
+
+class PipelineResult:
+    """Recommended ids plus what each stage of the pipeline did"""
+    
+    def __init__(self, provider_ids, timings_ms, skipped, n_candidates):
+        self.provider_ids = provider_ids
+        self.timings_ms = timings_ms
+        self.skipped = skipped
+        self.n_candidates = n_candidates
+    
+    @property
+    def degraded(self):
+        """True when a stage was skipped for running over its budget"""
+        return bool(self.skipped)
+    
+    def to_dict(self):
+        return {
+            'timings_ms': {name: round(ms, 2) for name, ms in self.timings_ms.items()},
+            'skipped': list(self.skipped),
+            'degraded': self.degraded,
+            'candidates': self.n_candidates
+        }
+
+
+class RecommendationPipeline:
+    """Two-stage recommendation: cheap candidate generators, then a hybrid re-ranker
+    
+    Each generator proposes up to `candidates_per_source` providers of the
+    requested service type; only the union of the candidates gets the full
+    hybrid score (collaborative, content, rating and distance). Generators
+    run concurrently on a shared thread pool. Each works from precomputed
+    neighbor lists or in blocks, and checks its deadline (the stage budget
+    from when it started) and the request's cancel flag as it goes, so a
+    slow generator stops instead of holding a worker. A generator that
+    stops, or does not get a worker within the queue budget, is skipped
+    and the result is marked degraded. If re-ranking runs over budget, the
+    candidates are returned in generator order instead.
+    """
+    
+    def __init__(self, recommender, candidates_per_source=300, budgets_ms=None, workers=8):
+        self.recommender = recommender
+        self.candidates_per_source = candidates_per_source
+        self.budgets_ms = dict(DEFAULT_STAGE_BUDGETS_MS, **(budgets_ms or {}))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommend')
+        
+        # Candidate sources in priority order (used when re-ranking is skipped)
+        self.generators = {
+            'neighbors': self._neighbor_candidates,
+            'co_visitation': self._covisitation_candidates,
+            'content': self._content_candidates,
+            'nearby': self._nearby_candidates,
+            'popular': self._popular_candidates
+        }
+    
+    @staticmethod
+    def _check(request, deadline):
+        if request['cancelled'].is_set() or time.perf_counter() > deadline:
+            raise StageCancelled()
+    
+    @staticmethod
+    def _top_positive(part, scores, n):
+        """Ids of the n highest positive scores of a catalog partition, best first"""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        return part.provider_ids[candidates[np.argsort(-scores[candidates], kind='stable')]]
+    
+    @staticmethod
+    def _top_entries(part, provider_ids, values, n):
+        """Ids of the n highest positive summed values among the partition's providers, best first"""
+        provider_ids, inverse = np.unique(provider_ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=values, minlength=len(provider_ids))
+        keep = (totals > 0) & (part.positions(provider_ids) >= 0)
+        provider_ids, totals = provider_ids[keep], totals[keep]
+        return provider_ids[np.argsort(-totals, kind='stable')[:n]]
+    
+    def _neighbor_candidates(self, request, n, deadline):
+        """Providers used by similar users (or the best factor scores for svd models)"""
+        if request['user_id'] is None:
+            return np.array([], dtype=np.int64)
+        if self.recommender.uses_factors:
+            return self._factor_candidates(request, n, deadline)
+        provider_ids, values = self.recommender.collaborative_entries(request['user_id'])
+        self._check(request, deadline)
+        return self._top_entries(request['part'], provider_ids, values, n)
+    
+    def _factor_candidates(self, request, n, deadline):
+        """Best factor-model scores of the partition, scored a block of providers at a time"""
+        recommender = self.recommender
+        matrix = recommender.user_provider_matrix
+        if matrix is None or not matrix.has_user(request['user_id']):
+            return np.array([], dtype=np.int64)
+        
+        row = matrix.user_index[request['user_id']]
+        n_factor_columns = len(recommender.factors.provider_factors)
+        part = request['part']
+        best_ids, best_scores = np.array([], dtype=np.int64), np.array([])
+        for start in range(0, len(part), FACTOR_BLOCK_SIZE):
+            self._check(request, deadline)
+            provider_ids = part.provider_ids[start:start + FACTOR_BLOCK_SIZE]
+            columns = matrix.columns_of(provider_ids)
+            known = (columns >= 0) & (columns < n_factor_columns)
+            scores = recommender.factors.user_scores(row, columns[known])
+            
+            # Keep a running top-n of the positive scores
+            best_ids = np.concatenate([best_ids, provider_ids[known][scores > 0]])
+            best_scores = np.concatenate([best_scores, scores[scores > 0]])
+            if len(best_scores) > n:
+                top = np.argpartition(-best_scores, n - 1)[:n]
+                best_ids, best_scores = best_ids[top], best_scores[top]
+        return best_ids[np.argsort(-best_scores, kind='stable')]
+    
+    def _covisitation_candidates(self, request, n, deadline, n_history=5):
+        """Providers hired by users who interacted with the user's top providers"""
+        recommender = self.recommender
+        matrix = recommender.user_provider_matrix
+        if (request['user_id'] is None or recommender.covisitation is None
+                or matrix is None or not matrix.has_user(request['user_id'])):
+            return np.array([], dtype=np.int64)
+        
+        provider_ids, counts = [], []
+        for provider_id in matrix.top_providers(request['user_id'], n_history):
+            self._check(request, deadline)
+            hired_ids, hired_counts = recommender.covisitation.lookup(provider_id)
+            provider_ids.append(hired_ids)
+            counts.append(hired_counts)
+        if not provider_ids:
+            return np.array([], dtype=np.int64)
+        
+        # Sum the counts of providers reached from several history entries
+        unique_ids, inverse = np.unique(np.concatenate(provider_ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(unique_ids))
+        in_part = request['part'].positions(unique_ids) >= 0
+        unique_ids, totals = unique_ids[in_part], totals[in_part]
+        return unique_ids[np.argsort(-totals, kind='stable')[:n]]
+    
+    def _content_candidates(self, request, n, deadline):
+        """Feature neighbors of the providers the user interacted with most"""
+        if request['user_id'] is None:
+            return np.array([], dtype=np.int64)
+        provider_ids, similarities = self.recommender.content_entries(request['user_id'])
+        self._check(request, deadline)
+        return self._top_entries(request['part'], provider_ids, similarities, n)
+    
+    def _nearby_candidates(self, request, n, deadline):
+        """Closest providers within MAX_SCORING_DISTANCE_KM of the user"""
+        user_location = request['user_location']
+        if not user_location:
+            return np.array([], dtype=np.int64)
+        
+        spatial_index = request['spatial_index']
+        if spatial_index is not None:
+            nearby = spatial_index.query(
+                user_location[0], user_location[1], MAX_SCORING_DISTANCE_KM,
+                request['service_type'], limit=n
+            )
+            return np.array([pid for pid, _ in nearby], dtype=np.int64)
+        
+        part = request['part']
+        closeness = MAX_SCORING_DISTANCE_KM - np.nan_to_num(
+            part.distances_km(*user_location), nan=np.inf
+        )
+        return self._top_positive(part, closeness, n)
+    
+    def _popular_candidates(self, request, n, deadline):
+        """Highest-rated providers of the service type"""
+        return request['part'].top_rated(n)
+    
+    def _run_generator(self, name, request, budget_ms):
+        # The budget starts now, not when the request queued the task
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        self._check(request, deadline)
+        provider_ids = self.generators[name](request, self.candidates_per_source, deadline)
+        return provider_ids, (time.perf_counter() - start) * 1000
+    
+    def _rerank(self, request, candidates, n_recommendations, weights, cancelled):
+        """Full hybrid score of the candidates only, top-N with recommend_ids' tie-break"""
+        if cancelled.is_set():
+            raise StageCancelled()
+        part = request['part']
+        positions = part.positions(candidates)
+        subset = part.subset(np.sort(positions[positions >= 0]))
+        scores = self.recommender.score_catalog(
+            request['user_id'], subset, request['user_location'],
+            request['service_type'], weights
+        )
+        
+        n = min(n_recommendations, len(subset))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.lexsort((subset.provider_ids[top], -scores[top]))]
+        return subset.provider_ids[top].tolist()
+    
+    def recommend(self, user_id, catalog, user_location=None, service_type=None,
+                  n_recommendations=5, weights=None, spatial_index=None, budgets_ms=None):
+        """
+        Top-N provider ids for a user as a PipelineResult
+        
+        `budgets_ms` overrides the stage budgets for this request. Timings
+        are reported per generator, per stage and in total, in milliseconds.
+        """
+        budgets = dict(self.budgets_ms, **(budgets_ms or {}))
+        start = time.perf_counter()
+        request = {
+            'user_id': user_id,
+            'part': catalog.partition(service_type),
+            'user_location': user_location,
+            'service_type': service_type,
+            'spatial_index': spatial_index,
+            'cancelled': threading.Event()
+        }
+        timings = {}
+        skipped = []
+        
+        # Stage 1: candidate generators, concurrently, each bounded by the
+        # budget from its own start; a task started at the end of the queue
+        # budget still gets its full budget
+        futures = {
+            self.executor.submit(self._run_generator, name, request, budgets['candidates']): name
+            for name in self.generators
+        }
+        done, _ = wait(futures, timeout=(budgets['queue'] + budgets['candidates']) / 1000)
+        # Generators still queued or running stop at their next check
+        request['cancelled'].set()
+        
+        generated = []
+        for future, name in futures.items():
+            if future not in done:
+                future.cancel()
+                skipped.append(name)
+                continue
+            try:
+                provider_ids, elapsed = future.result()
+            except StageCancelled:
+                skipped.append(name)
+                continue
+            except Exception as e:
+                print(f"⚠ Candidate generator '{name}' failed: {e}")
+                skipped.append(name)
+                continue
+            timings[name] = elapsed
+            generated.append(np.asarray(provider_ids, dtype=np.int64))
+        timings['candidates'] = (time.perf_counter() - start) * 1000
+        
+        # Union in generator priority order (first occurrence wins)
+        candidates = np.concatenate(generated) if generated else np.array([], dtype=np.int64)
+        _, first = np.unique(candidates, return_index=True)
+        candidates = candidates[np.sort(first)]
+        if len(candidates) == 0:
+            # Nothing came back in time; rating order is cheap once computed
+            candidates = request['part'].top_rated(n_recommendations)
+        
+        # Stage 2: hybrid re-ranking of the candidates
+        rerank_start = time.perf_counter()
+        rerank_cancelled = threading.Event()
+        future = self.executor.submit(
+            self._rerank, request, candidates, n_recommendations, weights, rerank_cancelled
+        )
+        done, _ = wait([future], timeout=(budgets['queue'] + budgets['rerank']) / 1000)
+        # A rerank that has not started yet does not start at all
+        rerank_cancelled.set()
+        if future in done:
+            provider_ids = future.result()
+        else:
+            future.cancel()
+            skipped.append('rerank')
+            provider_ids = candidates[:n_recommendations].tolist()
+        timings['rerank'] = (time.perf_counter() - rerank_start) * 1000
+        timings['total'] = (time.perf_counter() - start) * 1000
+        
+        return PipelineResult(provider_ids, timings, skipped, len(candidates))
@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from models import db, User, ServiceProvider, UserRecommendation
+from recommender import HybridRecommender, ProviderCatalog
+
+# Per-process state of the refresh workers, set up once by _init_worker
+_worker_recommender = None
+_worker_catalog = None
+
+
+def _init_worker(model_dir, catalog_rows):
+    """Load the model (memory-mapped when saved as artifacts) and catalog once per worker"""
+    global _worker_recommender, _worker_catalog
+    _worker_recommender = HybridRecommender()
+    _worker_recommender.load_model(model_dir)
+    _worker_catalog = ProviderCatalog.from_rows(catalog_rows)
+
+
+def _recommend_chunk(users, n_recommendations):
+    """Rows for one chunk of (user_id, latitude, longitude): all types plus each service type"""
+    user_ids = [user_id for user_id, _, _ in users]
+    user_locations = {
+        user_id: (latitude, longitude)
+        for user_id, latitude, longitude in users
+        if latitude and longitude
+    }
+    
+    rows = []
+    for service_type in [None] + list(_worker_catalog.service_types):
+        results = _worker_recommender.recommend_many(
+            user_ids,
+            _worker_catalog,
+            user_locations=user_locations,
+            service_type=service_type,
+            n_recommendations=n_recommendations
+        )
+        for user_id, provider_ids in results:
+            rows.append({
+                'user_id': user_id,
+                'service_type': service_type or '',
+                'provider_ids': ','.join(str(pid) for pid in provider_ids)
+            })
+    return user_ids, rows
+
+
+def _user_chunks(chunk_size):
+    """(user_id, latitude, longitude) chunks in id order, paged by keyset"""
+    last_id = 0
+    while True:
+        chunk = db.session.query(User.id, User.latitude, User.longitude).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield [tuple(row) for row in chunk]
+        last_id = chunk[-1][0]
+
+
+def _write_chunk(user_ids, rows, generated_at):
+    """Replace the chunk's users' rows with one bulk delete and one bulk insert"""
+    UserRecommendation.query.filter(
+        UserRecommendation.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    for row in rows:
+        row['generated_at'] = generated_at
+    if rows:
+        db.session.execute(UserRecommendation.__table__.insert(), rows)
+    db.session.commit()
+
+
+def refresh_user_recommendations(model_dir, n_recommendations=20, chunk_size=2000, workers=None):
+    """
+    Precompute the top-N providers of every user, overall and per service type
+    
+    Users are read in keyset-paged chunks and scored by a process pool; each
+    worker loads the model once, so chunks only carry user ids and
+    locations. Results are written back per chunk as they complete, with at
+    most two chunks per worker in flight to bound memory.
+    Must run inside an application context.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    generated_at = datetime.utcnow()
+    
+    catalog_rows = db.session.query(
+        ServiceProvider.id,
+        ServiceProvider.rating,
+        ServiceProvider.latitude,
+        ServiceProvider.longitude,
+        ServiceProvider.service_type
+    ).all()
+    catalog_rows = [tuple(row) for row in catalog_rows]
+    
+    n_users = 0
+    n_rows = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_dir, catalog_rows)) as executor:
+        in_flight = set()
+        
+        def drain():
+            nonlocal in_flight, n_users, n_rows
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                user_ids, rows = future.result()
+                _write_chunk(user_ids, rows, generated_at)
+                n_users += len(user_ids)
+                n_rows += len(rows)
+            print(f"  {n_users} users refreshed ({time.perf_counter() - start:.1f}s)")
+        
+        for users in _user_chunks(chunk_size):
+            in_flight.add(executor.submit(_recommend_chunk, users, n_recommendations))
+            if len(in_flight) >= 2 * workers:
+                drain()
+        while in_flight:
+            drain()
+    
+    # Users deleted since the last refresh
+    UserRecommendation.query.filter(
+        UserRecommendation.generated_at < generated_at
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    
+    print(f"✓ {n_rows} recommendation rows for {n_users} users written in {time.perf_counter() - start:.1f}s")
+    return n_users
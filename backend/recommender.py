@@ -1,19 +1,1163 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from scipy.sparse.linalg import svds
 from math import radians, sin, cos, sqrt, atan2
+import copy
 import joblib
+import json
 import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from utils.geo_utils import haversine_km_radians
+
+
+# Interaction type weights used to score user-provider interactions
+INTERACTION_WEIGHTS = {
+    'view': 1,
+    'contact': 2,
+    'hire': 4,
+    'favorite': 3
+}
+
+# Interaction types that count as a hire for the co-visitation index
+HIRE_INTERACTION_TYPES = ('hire',)
+
+# Default weights of the hybrid score components
+DEFAULT_SCORE_WEIGHTS = {
+    'collaborative': 0.4,
+    'content': 0.3,
+    'rating': 0.2,
+    'distance': 0.1
+}
+
+# Interaction scores are stored relative to a reference epoch; once new
+# events are this many half-lives past it, stored scores are rebased
+DECAY_REBASE_HALF_LIVES = 64
+
+# Providers further than this (km) get no location score
+MAX_SCORING_DISTANCE_KM = 10
+
+# Collaborative engines: user-neighborhood ('neighborhood') or latent factors ('svd')
+RECOMMENDER_ENGINES = ('neighborhood', 'svd')
+PROVIDER_INDEXES = ('exact', 'lsh')
+
+# Storage precision of a model: (dtype of the interaction matrix, features
+# and factors, dtype of the neighbor similarity scores)
+RECOMMENDER_PRECISIONS = {
+    'float64': (np.float64, np.float64),
+    'float32': (np.float32, np.float32),
+    'float16': (np.float32, np.float16),
+    'int8': (np.float32, np.int8)
+}
+
+# int8 neighbor scores hold round(similarity * 127)
+INT8_SCORE_SCALE = 1 / 127
+
+# Bumped whenever the layout of saved model artifacts changes
+ARTIFACT_FORMAT_VERSION = 1
+
+
+class SparseInteractionMatrix:
+    """User-provider interaction scores stored as a scipy CSR matrix
+    
+    Rows are users and columns are providers. The id->row and id->column
+    maps translate database ids into matrix positions, so memory grows with
+    the number of interactions instead of users x providers.
+    
+    Column reads go through a CSC copy of the same cells, built on first use
+    or passed in (e.g. memory-mapped from a saved model).
+    
+    The matrix accepts online updates through add(). Updates to existing
+    cells are written in place (in both layouts); new cells, users and
+    providers go to a small pending overlay that is merged into the CSR and
+    CSC arrays once it grows past a fraction of the matrix, keeping the
+    amortized cost per update low. Every method that reads or changes the
+    overlay holds the matrix's lock.
+    """
+    
+    def __init__(self, matrix, user_ids, provider_ids, csc=None):
+        self.matrix = sparse.csr_matrix(matrix)
+        if self.matrix.dtype not in (np.float32, np.float64):
+            self.matrix = self.matrix.astype(np.float64)
+        if not self.matrix.has_canonical_format:
+            # Canonical input (e.g. a memory-mapped artifact) is used without copying
+            self.matrix.sum_duplicates()
+            self.matrix.eliminate_zeros()
+            self.matrix.sort_indices()
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.provider_ids = np.asarray(provider_ids, dtype=np.int64)
+        self.user_index = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        self.provider_index = {pid: i for i, pid in enumerate(self.provider_ids.tolist())}
+        self._squared_norms = None
+        # Same cells as self.matrix, column-major; must be canonical when given
+        self._csc = csc if csc is None or csc.dtype == self.matrix.dtype else csc.astype(self.matrix.dtype)
+        self._column_order = None
+        self._pending_rows = {}  # row -> {col: score} for cells not yet in CSR
+        self._pending_cols = {}  # col -> {row: score}, same cells by column
+        self._n_pending = 0
+        # Guards the pending overlay and CSR/CSC swaps; readers take it too,
+        # so a request never sees a half-merged compact()
+        self._lock = threading.RLock()
+    
+    @classmethod
+    def from_triplets(cls, user_ids, provider_ids, scores):
+        """Build from parallel (user_id, provider_id, score) arrays, summing duplicates"""
+        user_ids = np.asarray(user_ids)
+        provider_ids = np.asarray(provider_ids)
+        scores = np.asarray(scores, dtype=np.float64)
+        
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_providers, cols = np.unique(provider_ids, return_inverse=True)
+        
+        matrix = sparse.coo_matrix(
+            (scores, (rows, cols)),
+            shape=(len(unique_users), len(unique_providers))
+        ).tocsr()
+        
+        return cls(matrix, unique_users, unique_providers)
+    
+    @classmethod
+    def from_dataframe(cls, df):
+        """Convert a dense user x provider DataFrame (legacy model format)"""
+        return cls(sparse.csr_matrix(df.values), df.index.values, df.columns.values)
+    
+    @property
+    def shape(self):
+        return (len(self.user_ids), len(self.provider_ids))
+    
+    @property
+    def nnz(self):
+        return self.matrix.nnz + self._n_pending
+    
+    def has_user(self, user_id):
+        return user_id in self.user_index
+    
+    def row_entries(self, row):
+        """Return (column indices, scores) of a matrix row's stored interactions"""
+        with self._lock:
+            cols = np.array([], dtype=np.int32)
+            scores = np.array([])
+            if row < self.matrix.shape[0]:
+                start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+                cols, scores = self.matrix.indices[start:end], self.matrix.data[start:end]
+            
+            pending = self._pending_rows.get(row)
+            if pending:
+                cols = np.concatenate([cols, np.fromiter(pending.keys(), dtype=np.int32)])
+                scores = np.concatenate([scores, np.fromiter(pending.values(), dtype=np.float64)])
+            return cols, scores
+    
+    def user_row(self, user_id):
+        """Return (column indices, scores) of a user's non-zero interactions"""
+        return self.row_entries(self.user_index[user_id])
+    
+    def rows(self, rows):
+        """CSR matrix of the given rows (all columns), including pending updates"""
+        with self._lock:
+            rows = np.asarray(rows)
+            if not self._n_pending and self.matrix.shape == self.shape:
+                return self.matrix[rows]
+            
+            entries = [self.row_entries(row) for row in rows]
+            indptr = np.concatenate([[0], np.cumsum([len(cols) for cols, _ in entries])])
+            indices = np.concatenate([cols for cols, _ in entries]) if entries else []
+            data = np.concatenate([scores for _, scores in entries]) if entries else []
+            return sparse.csr_matrix(
+                (data, indices, indptr), shape=(len(rows), self.shape[1])
+            )
+    
+    def full_matrix(self):
+        """The complete CSR matrix, merging any pending updates first"""
+        with self._lock:
+            self.compact()
+            return self.matrix
+    
+    def top_providers(self, user_id, n):
+        """Provider ids with the highest interaction scores for a user"""
+        cols, scores = self.user_row(user_id)
+        order = np.argsort(scores, kind='stable')[::-1][:n]
+        return self.provider_ids[cols[order]].tolist()
+    
+    def _squared_row_norms(self):
+        with self._lock:
+            if self._squared_norms is None:
+                self.compact()
+                self._squared_norms = np.asarray(
+                    self.matrix.multiply(self.matrix).sum(axis=1)
+                ).ravel()
+            return self._squared_norms
+    
+    def row_norms(self):
+        """L2 norm of every user row (maintained across updates)"""
+        return np.sqrt(self._squared_row_norms())
+    
+    def columns_of(self, provider_ids):
+        """Column positions of provider ids (-1 for providers without interactions)"""
+        provider_ids = np.asarray(provider_ids, dtype=np.int64)
+        if len(self.provider_ids) == 0:
+            return np.full(len(provider_ids), -1, dtype=np.int64)
+        if self._column_order is None:
+            self._column_order = np.argsort(self.provider_ids, kind='stable')
+        
+        sorted_ids = self.provider_ids[self._column_order]
+        found = np.minimum(np.searchsorted(sorted_ids, provider_ids), len(sorted_ids) - 1)
+        columns = self._column_order[found]
+        columns[sorted_ids[found] != provider_ids] = -1
+        return columns
+    
+    def column_major(self):
+        """CSC copy of the cells in the CSR arrays (pending cells excluded), built on first use"""
+        with self._lock:
+            if self._csc is None:
+                self._csc = self.matrix.tocsc()
+                self._csc.sort_indices()
+            return self._csc
+    
+    def column_block(self, columns):
+        """CSR (users x len(columns)) slice, reading only the selected columns' interactions"""
+        with self._lock:
+            columns = np.asarray(columns, dtype=np.int64)
+            csc = self.column_major()
+            if csc.shape != self.shape:
+                # Users and providers added since the last merge have no stored cells
+                indptr = np.concatenate([
+                    csc.indptr, np.full(self.shape[1] - csc.shape[1], csc.indptr[-1], dtype=csc.indptr.dtype)
+                ])
+                csc = sparse.csc_matrix((csc.data, csc.indices, indptr), shape=self.shape, copy=False)
+            block = csc[:, columns]
+            
+            pending = [
+                (row, j, score)
+                for j, col in enumerate(columns.tolist())
+                for row, score in self._pending_cols.get(col, {}).items()
+            ]
+            if pending:
+                rows, positions, scores = zip(*pending)
+                block = block + sparse.csc_matrix(
+                    (np.asarray(scores, dtype=block.dtype), (rows, positions)), shape=block.shape
+                )
+            return block.tocsr()
+    
+    def _column_entries(self, col):
+        """Rows and scores stored in one provider column"""
+        with self._lock:
+            rows = np.array([], dtype=np.int32)
+            scores = np.array([])
+            csc = self.column_major()
+            if col < csc.shape[1]:
+                start, end = csc.indptr[col], csc.indptr[col + 1]
+                rows, scores = csc.indices[start:end], csc.data[start:end]
+            
+            pending = self._pending_cols.get(col)
+            if pending:
+                rows = np.concatenate([rows, np.fromiter(pending.keys(), dtype=np.int32)])
+                scores = np.concatenate([scores, np.fromiter(pending.values(), dtype=np.float64)])
+            return rows, scores
+    
+    def user_similarities(self, user_id):
+        """
+        Cosine similarity of one user against every user sharing a provider
+        
+        Returns (rows, similarities) for those users only. The cost is the
+        number of interactions on the user's providers, not the matrix size.
+        The user's own row is included.
+        """
+        with self._lock:
+            row = self.user_index[user_id]
+            squared_norms = self._squared_row_norms()
+            cols, scores = self.row_entries(row)
+            if squared_norms[row] <= 0 or len(cols) == 0:
+                return np.array([], dtype=np.int64), np.array([])
+            
+            dots = {}
+            for col, score in zip(cols, scores):
+                other_rows, other_scores = self._column_entries(col)
+                for other, other_score in zip(other_rows.tolist(), (other_scores * score).tolist()):
+                    dots[other] = dots.get(other, 0.0) + other_score
+            
+            rows = np.fromiter(dots.keys(), dtype=np.int64, count=len(dots))
+            values = np.fromiter(dots.values(), dtype=np.float64, count=len(dots))
+            norms = np.sqrt(squared_norms[rows] * squared_norms[row])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                similarities = np.where(norms > 0, values / norms, 0.0)
+            return rows, similarities
+    
+    def add(self, user_id, provider_id, value):
+        """Add value to one (user, provider) cell; unseen users and providers are appended"""
+        with self._lock:
+            squared_norms = self._squared_row_norms()
+            
+            row = self.user_index.get(user_id)
+            if row is None:
+                row = len(self.user_ids)
+                self.user_index[user_id] = row
+                self.user_ids = np.append(self.user_ids, user_id)
+                squared_norms = self._squared_norms = np.append(squared_norms, 0.0)
+            col = self.provider_index.get(provider_id)
+            if col is None:
+                col = len(self.provider_ids)
+                self.provider_index[provider_id] = col
+                self.provider_ids = np.append(self.provider_ids, provider_id)
+                self._column_order = None
+            
+            old = self._update_stored(row, col, value)
+            if old is None:
+                old = self._pending_rows.get(row, {}).get(col)
+                if old is None:
+                    self._n_pending += 1
+                    old = 0.0
+                self._pending_rows.setdefault(row, {})[col] = old + value
+                self._pending_cols.setdefault(col, {})[row] = old + value
+            squared_norms[row] += (old + value) ** 2 - old ** 2
+            
+            if self._n_pending > max(1024, self.matrix.nnz // 20):
+                self.compact()
+    
+    def _update_stored(self, row, col, value):
+        """Add to a cell already present in the CSR arrays; returns its old value or None"""
+        if row >= self.matrix.shape[0] or col >= self.matrix.shape[1]:
+            return None
+        
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        offset = np.searchsorted(self.matrix.indices[start:end], col)
+        if offset >= end - start or self.matrix.indices[start + offset] != col:
+            return None
+        
+        old = float(self.matrix.data[start + offset])
+        self.matrix.data = writable(self.matrix.data)
+        self.matrix.data[start + offset] = old + value
+        if self._csc is not None:
+            col_start, col_end = self._csc.indptr[col], self._csc.indptr[col + 1]
+            col_offset = np.searchsorted(self._csc.indices[col_start:col_end], row)
+            self._csc.data = writable(self._csc.data)
+            self._csc.data[col_start + col_offset] = old + value
+        return old
+    
+    def scale(self, factor):
+        """Multiply every stored score by factor (used to rebase decayed scores)"""
+        with self._lock:
+            self.matrix.data = self.matrix.data * factor
+            if self._csc is not None:
+                self._csc.data = self._csc.data * factor
+            for pending in list(self._pending_rows.values()) + list(self._pending_cols.values()):
+                for key in pending:
+                    pending[key] *= factor
+            if self._squared_norms is not None:
+                self._squared_norms = self._squared_norms * factor ** 2
+    
+    def compact(self):
+        """Merge pending cells (and new users/providers) into the CSR and CSC arrays"""
+        with self._lock:
+            if not self._n_pending and self.matrix.shape == self.shape:
+                return
+            
+            rows, cols, scores = [], [], []
+            for row, pending in self._pending_rows.items():
+                for col, score in pending.items():
+                    rows.append(row)
+                    cols.append(col)
+                    scores.append(score)
+            
+            self.matrix = insert_cells(self.matrix, rows, cols, scores, self.shape)
+            if self._csc is not None:
+                self._csc = insert_cells(self._csc, cols, rows, scores, self.shape)
+            self._pending_rows = {}
+            self._pending_cols = {}
+            self._n_pending = 0
+    
+    def astype(self, dtype):
+        """Store the scores as dtype (float32 halves the matrix data)"""
+        with self._lock:
+            self.compact()
+            if self.matrix.dtype != dtype:
+                self.matrix = self.matrix.astype(dtype)
+                if self._csc is not None:
+                    self._csc = self._csc.astype(dtype)
+    
+    def to_dict(self):
+        """Plain components for serialization"""
+        return {
+            'user_provider_matrix': self.full_matrix(),
+            'user_ids': self.user_ids,
+            'provider_ids': self.provider_ids
+        }
+
+
+def float_array(array):
+    """The array as float32 if it already is, otherwise as float64"""
+    array = np.asarray(array)
+    return array if array.dtype in (np.float32, np.float64) else array.astype(np.float64)
+
+
+def insert_cells(matrix, major, minor, values, shape):
+    """
+    Copy of a canonical CSR (or CSC) matrix with new cells inserted in order
+    
+    `major` and `minor` are the rows and columns (columns and rows for CSC)
+    of cells the matrix does not store yet; `shape` may add rows and
+    columns. The stored arrays are copied once around the new cells,
+    without re-sorting them, in O(nnz + new cells).
+    """
+    n_major, n_minor = shape if matrix.format == 'csr' else shape[::-1]
+    major = np.asarray(major, dtype=np.int64)
+    minor = np.asarray(minor, dtype=np.int64)
+    order = np.lexsort((minor, major))
+    major, minor = major[order], minor[order]
+    values = np.asarray(values, dtype=matrix.dtype)[order]
+    
+    indptr = np.concatenate([
+        matrix.indptr, np.full(n_major + 1 - len(matrix.indptr), matrix.indptr[-1], dtype=matrix.indptr.dtype)
+    ])
+    stored_keys = np.repeat(np.arange(n_major, dtype=np.int64), np.diff(indptr)) * n_minor + matrix.indices
+    # Final position of each new cell: stored cells before it plus new cells before it
+    slots = np.searchsorted(stored_keys, major * n_minor + minor) + np.arange(len(major))
+    stored = np.ones(matrix.nnz + len(major), dtype=bool)
+    stored[slots] = False
+    
+    data = np.empty(len(stored), dtype=matrix.dtype)
+    data[slots], data[stored] = values, matrix.data
+    indices = np.empty(len(stored), dtype=matrix.indices.dtype)
+    indices[slots], indices[stored] = minor, matrix.indices
+    indptr = indptr + np.concatenate([[0], np.cumsum(np.bincount(major, minlength=n_major))]).astype(indptr.dtype)
+    
+    merged = (sparse.csr_matrix if matrix.format == 'csr' else sparse.csc_matrix)(
+        (data, indices, indptr), shape=shape
+    )
+    merged.has_sorted_indices = True
+    return merged
+
+
+def writable(array):
+    """The array itself, or a private copy if it is read-only (memory-mapped)"""
+    return array if array.flags.writeable else np.array(array)
+
+
+def normalize_rows(matrix):
+    """Scale every row of a sparse or dense matrix to unit L2 norm"""
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+    
+    matrix = np.asarray(matrix, dtype=np.float64)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NeighborIndex:
+    """Top-k most similar rows (cosine) for every row of a matrix
+    
+    Only the k best neighbor positions and their scores are kept, so a lookup
+    is O(k) and memory is O(rows x k). Unused slots hold -1. Scores may be
+    stored as float16 or int8 (see astype); score_values returns them as
+    floats.
+    """
+    
+    def __init__(self, neighbors, scores):
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        scores = np.asarray(scores)
+        if scores.dtype not in (np.float64, np.float32, np.float16, np.int8):
+            scores = scores.astype(np.float64)
+        self.scores = scores
+    
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+    
+    def __len__(self):
+        return self.neighbors.shape[0]
+    
+    @classmethod
+    def build(cls, matrix, k=20, block_size=1024, max_block_cells=2 ** 24):
+        """Compute neighbors block by block so the full similarity matrix is never held"""
+        normalized, transposed = cls.prepare(matrix)
+        n_rows = normalized.shape[0]
+        neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+        scores = np.zeros((n_rows, k))
+        
+        for start, end in cls.blocks(normalized, block_size, max_block_cells):
+            neighbors[start:end], scores[start:end] = cls.block_top_k(
+                normalized, transposed, start, end, k
+            )
+        
+        return cls(neighbors, scores)
+    
+    @staticmethod
+    def prepare(matrix):
+        """Row-normalized matrix and its transpose, both in row-sliceable form"""
+        normalized = normalize_rows(matrix)
+        if sparse.issparse(normalized):
+            # Converted once here rather than by every block product
+            return normalized, normalized.T.tocsr()
+        return normalized, normalized.T
+    
+    @staticmethod
+    def blocks(normalized, block_size=1024, max_block_cells=2 ** 24):
+        """(start, end) row ranges of the block-wise build"""
+        n_rows = normalized.shape[0]
+        # Dense blocks are rows x n_rows, keep them under max_block_cells
+        if not sparse.issparse(normalized):
+            block_size = max(1, min(block_size, max_block_cells // max(n_rows, 1)))
+        return [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+    
+    @classmethod
+    def block_top_k(cls, normalized, transposed, start, end, k):
+        """Neighbors and scores of rows start..end (arguments as returned by prepare)"""
+        similarities = normalized[start:end] @ transposed
+        if not sparse.issparse(similarities):
+            return cls._select_top_k_dense(similarities, start, k)
+        
+        similarities = similarities.tocsr()
+        neighbors = np.full((end - start, k), -1, dtype=np.int32)
+        scores = np.zeros((end - start, k))
+        for offset in range(end - start):
+            begin, finish = similarities.indptr[offset], similarities.indptr[offset + 1]
+            neighbors[offset], scores[offset] = cls._select_top_k(
+                similarities.indices[begin:finish], similarities.data[begin:finish],
+                start + offset, k
+            )
+        return neighbors, scores
+    
+    @classmethod
+    def build_partitioned(cls, matrix, partitions, k=20, builder=None):
+        """
+        Neighbors restricted to rows of the same partition
+        
+        `partitions` is a list of row-position arrays. Each one is indexed
+        separately (with `builder(submatrix, k)`, NeighborIndex.build by
+        default), so the cost is the sum of the squared partition sizes.
+        Rows outside every partition get no neighbors.
+        """
+        builder = builder or (lambda submatrix, k: cls.build(submatrix, k=k))
+        neighbors = np.full((matrix.shape[0], k), -1, dtype=np.int32)
+        scores = np.zeros((matrix.shape[0], k))
+        for rows in partitions:
+            rows = np.asarray(rows)
+            if len(rows) == 0:
+                continue
+            part = builder(matrix[rows], k)
+            valid = part.neighbors >= 0
+            neighbors[rows] = np.where(valid, rows[np.where(valid, part.neighbors, 0)], -1)
+            scores[rows] = part.scores
+        return cls(neighbors, scores)
+    
+    @staticmethod
+    def _select_top_k_dense(similarities, start, k):
+        """Vectorized top-k for a dense block whose first row is matrix row `start`"""
+        n_block, n_rows = similarities.shape
+        similarities = np.where(similarities > 0, similarities, -np.inf)
+        similarities[np.arange(n_block), start + np.arange(n_block)] = -np.inf
+        
+        width = min(k, n_rows)
+        top = np.argpartition(-similarities, width - 1, axis=1)[:, :width]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        neighbors = np.full((n_block, k), -1, dtype=np.int32)
+        scores = np.zeros((n_block, k))
+        valid = np.isfinite(top_scores)
+        neighbors[:, :width] = np.where(valid, top, -1)
+        scores[:, :width] = np.where(valid, top_scores, 0.0)
+        return neighbors, scores
+    
+    @staticmethod
+    def _select_top_k(candidates, values, row, k):
+        """Best k positive-similarity candidates excluding the row itself"""
+        keep = (values > 0) & (candidates != row)
+        candidates, values = candidates[keep], values[keep]
+        if len(values) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            candidates, values = candidates[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        
+        row_neighbors = np.full(k, -1, dtype=np.int32)
+        row_scores = np.zeros(k)
+        row_neighbors[:len(order)] = candidates[order]
+        row_scores[:len(order)] = values[order]
+        return row_neighbors, row_scores
+    
+    def astype(self, score_dtype):
+        """Copy whose scores are stored as score_dtype (int8 in steps of INT8_SCORE_SCALE)"""
+        values = self.score_values()
+        if np.dtype(score_dtype) == np.int8:
+            scores = np.clip(np.rint(values / INT8_SCORE_SCALE), -127, 127).astype(np.int8)
+        else:
+            scores = values.astype(score_dtype)
+        return NeighborIndex(self.neighbors, scores)
+    
+    def score_values(self, index=slice(None)):
+        """Scores at index as float32/float64, dequantizing reduced-precision storage"""
+        scores = self.scores[index]
+        if self.scores.dtype == np.int8:
+            return scores.astype(np.float32) * np.float32(INT8_SCORE_SCALE)
+        if self.scores.dtype == np.float16:
+            return scores.astype(np.float32)
+        return scores
+    
+    def _encode(self, values):
+        """Scores in the storage dtype"""
+        if self.scores.dtype == np.int8:
+            return np.clip(np.rint(np.asarray(values) / INT8_SCORE_SCALE), -127, 127).astype(np.int8)
+        return values
+    
+    def lookup(self, row, n=None):
+        """Neighbor positions and scores for one row, best first"""
+        neighbors = self.neighbors[row]
+        valid = neighbors >= 0
+        neighbors, scores = neighbors[valid], self.score_values(row)[valid]
+        if n is not None:
+            neighbors, scores = neighbors[:n], scores[:n]
+        return neighbors, scores
+    
+    def to_sparse(self):
+        """Neighbor scores as a sparse (rows x rows) matrix"""
+        valid = self.neighbors >= 0
+        rows = np.repeat(np.arange(len(self)), self.k).reshape(self.neighbors.shape)
+        return sparse.csr_matrix(
+            (self.score_values()[valid], (rows[valid], self.neighbors[valid])),
+            shape=(len(self), len(self))
+        )
+    
+    def resize(self, n_rows):
+        """Add empty neighbor lists for rows appended since the build"""
+        if n_rows > len(self):
+            extra = n_rows - len(self)
+            self.neighbors = np.vstack([self.neighbors, np.full((extra, self.k), -1, dtype=np.int32)])
+            self.scores = np.vstack([self.scores, np.zeros((extra, self.k), dtype=self.scores.dtype)])
+    
+    def refresh(self, row, candidate_rows, similarities):
+        """Replace one row's neighbors given its fresh similarities to candidate rows
+        
+        Rows not listed in candidate_rows are taken to have zero similarity.
+        Candidates that list this row as a neighbor (or should now) are
+        patched too, so the index stays symmetric without a full rebuild.
+        A row that drops out of another row's list is not replaced by that
+        row's next best candidate until the next full build.
+        """
+        candidate_rows = np.asarray(candidate_rows)
+        self.neighbors = writable(self.neighbors)
+        self.scores = writable(self.scores)
+        self.neighbors[row], row_scores = self._select_top_k(
+            candidate_rows, similarities, row, self.k
+        )
+        self.scores[row] = self._encode(row_scores)
+        
+        for other, similarity in zip(candidate_rows.tolist(), similarities.tolist()):
+            if other == row:
+                continue
+            slots = np.flatnonzero(self.neighbors[other] == row)
+            if len(slots):
+                # Already listed: update or drop the entry
+                if similarity > 0:
+                    self.scores[other, slots[0]] = self._encode(similarity)
+                else:
+                    self.neighbors[other, slots[0]] = -1
+                    self.scores[other, slots[0]] = 0.0
+                self._sort_row(other)
+            elif similarity > 0:
+                # Replace the weakest neighbor if this row now beats it
+                weakest = self.k - 1
+                if self.neighbors[other, weakest] < 0 or similarity > self.score_values((other, weakest)):
+                    self.neighbors[other, weakest] = row
+                    self.scores[other, weakest] = self._encode(similarity)
+                    self._sort_row(other)
+    
+    def _sort_row(self, row):
+        scores = np.where(self.neighbors[row] >= 0, self.scores[row], -np.inf)
+        order = np.argsort(-scores, kind='stable')
+        self.neighbors[row] = self.neighbors[row][order]
+        self.scores[row] = self.scores[row][order]
+
+
+class MatrixFactorization:
+    """Truncated SVD latent factors of the weighted interaction matrix
+    
+    The matrix is approximated as (U * s) @ Vt. User factors hold U * s and
+    provider factors hold Vt.T, so a user's scores over all providers are a
+    single dot product costing O(factors x providers). Rows and columns line
+    up with the SparseInteractionMatrix the model was fitted on.
+    """
+    
+    def __init__(self, user_factors, provider_factors):
+        self.user_factors = float_array(user_factors)
+        self.provider_factors = float_array(provider_factors)
+    
+    @property
+    def n_factors(self):
+        return self.provider_factors.shape[1]
+    
+    @classmethod
+    def fit(cls, matrix, n_factors=32):
+        """Factorize a sparse users x providers matrix"""
+        n_factors = min(n_factors, min(matrix.shape) - 1)
+        if n_factors < 1:
+            return cls(np.zeros((matrix.shape[0], 0)), np.zeros((matrix.shape[1], 0)))
+        
+        u, s, vt = svds(sparse.csr_matrix(matrix, dtype=np.float64), k=n_factors)
+        order = np.argsort(-s)
+        return cls(u[:, order] * s[order], vt[order].T)
+    
+    def fold_in(self, row, cols, scores):
+        """Recompute one user's factors from their interactions (U * s = x @ V)"""
+        if row >= len(self.user_factors):
+            extra = row + 1 - len(self.user_factors)
+            self.user_factors = np.vstack([
+                self.user_factors, np.zeros((extra, self.n_factors), dtype=self.user_factors.dtype)
+            ])
+        self.user_factors = writable(self.user_factors)
+        
+        known = cols < len(self.provider_factors)
+        self.user_factors[row] = scores[known] @ self.provider_factors[cols[known]]
+    
+    def user_scores(self, row, columns=None):
+        """Predicted affinity of one user for every provider column (or only `columns`)"""
+        provider_factors = self.provider_factors if columns is None else self.provider_factors[columns]
+        if row >= len(self.user_factors):
+            return np.zeros(len(provider_factors))
+        return provider_factors @ self.user_factors[row]
+
+
+class ProviderCatalog:
+    """Aligned NumPy arrays describing every provider for vectorized scoring
+    
+    Position i of every array refers to the same provider. Service types are
+    stored as integer codes into `service_types`; missing coordinates are NaN.
+    """
+    
+    def __init__(self, provider_ids, ratings, latitudes, longitudes, service_types):
+        self.provider_ids = np.asarray(provider_ids, dtype=np.int64)
+        self.ratings = np.nan_to_num(np.asarray(ratings, dtype=np.float64))
+        self.lat_rad = np.radians(np.asarray(latitudes, dtype=np.float64))
+        self.lon_rad = np.radians(np.asarray(longitudes, dtype=np.float64))
+        
+        self.service_types = sorted(set(service_types))
+        self.service_type_map = {st: i for i, st in enumerate(self.service_types)}
+        self.service_type_codes = np.array(
+            [self.service_type_map[st] for st in service_types], dtype=np.int32
+        )
+        
+        self._sort_order = np.argsort(self.provider_ids, kind='stable')
+        self._sorted_ids = self.provider_ids[self._sort_order]
+        self._partitions = {}
+        self._rating_order = None
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (id, rating, latitude, longitude, service_type) tuples"""
+        rows = list(rows)
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        provider_ids, ratings, latitudes, longitudes, service_types = columns
+        
+        return cls(
+            provider_ids,
+            [np.nan if r is None else r for r in ratings],
+            [np.nan if lat is None else lat for lat in latitudes],
+            [np.nan if lon is None else lon for lon in longitudes],
+            list(service_types)
+        )
+    
+    @classmethod
+    def from_providers(cls, providers):
+        """Build from ServiceProvider objects"""
+        return cls.from_rows(
+            (p.id, p.rating, p.latitude, p.longitude, p.service_type) for p in providers
+        )
+    
+    def __len__(self):
+        return len(self.provider_ids)
+    
+    def positions(self, provider_ids):
+        """Catalog positions of provider ids (-1 for ids not in the catalog)"""
+        provider_ids = np.asarray(provider_ids, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(provider_ids), -1, dtype=np.int64)
+        
+        found = np.searchsorted(self._sorted_ids, provider_ids)
+        found = np.minimum(found, len(self) - 1)
+        positions = self._sort_order[found]
+        positions[self._sorted_ids[found] != provider_ids] = -1
+        return positions
+    
+    def service_type_mask(self, service_type):
+        """Boolean mask of providers offering the service type (all if None)"""
+        if not service_type:
+            return np.ones(len(self), dtype=bool)
+        
+        code = self.service_type_map.get(service_type)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.service_type_codes == code
+    
+    def partition(self, service_type):
+        """
+        Catalog of one service type's providers (the whole catalog if None)
+        
+        Partitions are built once and cached, so filtered scoring works on
+        arrays the size of the service type instead of the whole catalog.
+        """
+        if not service_type:
+            return self
+        
+        part = self._partitions.get(service_type)
+        if part is None:
+            part = self.subset(np.flatnonzero(self.service_type_mask(service_type)))
+            self._partitions[service_type] = part
+        return part
+    
+    def subset(self, positions):
+        """Catalog of the providers at the given positions"""
+        part = copy.copy(self)
+        part.provider_ids = self.provider_ids[positions]
+        part.ratings = self.ratings[positions]
+        part.lat_rad = self.lat_rad[positions]
+        part.lon_rad = self.lon_rad[positions]
+        part.service_type_codes = self.service_type_codes[positions]
+        part._sort_order = np.argsort(part.provider_ids, kind='stable')
+        part._sorted_ids = part.provider_ids[part._sort_order]
+        part._partitions = {}
+        part._rating_order = None
+        return part
+    
+    def update_provider(self, provider_id, rating, latitude, longitude, service_type):
+        """
+        Apply an edit of one provider to its row in place
+        
+        The row of any cached partition holding the provider is patched too;
+        a change of service type drops the two partitions affected. Returns
+        False, leaving the catalog as it was, if the provider is not in the
+        catalog or its service type has no code yet, so the caller rebuilds.
+        """
+        position = self.positions([provider_id])[0]
+        code = self.service_type_map.get(service_type)
+        if position < 0 or code is None:
+            return False
+        
+        old_code = self.service_type_codes[position]
+        self._set_row(position, rating, latitude, longitude, code)
+        if code != old_code:
+            self._partitions.pop(self.service_types[old_code], None)
+            self._partitions.pop(service_type, None)
+        else:
+            part = self._partitions.get(service_type)
+            if part is not None:
+                part._set_row(part.positions([provider_id])[0], rating, latitude, longitude, code)
+        return True
+    
+    def _set_row(self, position, rating, latitude, longitude, code):
+        self.ratings[position] = 0.0 if rating is None else rating
+        self.lat_rad[position] = np.radians(np.nan if latitude is None else latitude)
+        self.lon_rad[position] = np.radians(np.nan if longitude is None else longitude)
+        self.service_type_codes[position] = code
+        self._rating_order = None
+    
+    def top_rated(self, n):
+        """Ids of the n highest-rated providers (ordering computed once per catalog)"""
+        if self._rating_order is None:
+            self._rating_order = np.lexsort((self.provider_ids, -self.ratings))
+        return self.provider_ids[self._rating_order[:n]]
+    
+    def distances_km(self, latitude, longitude):
+        """Distance from a point to every provider (NaN where unknown)"""
+        return haversine_km_radians(
+            np.radians(latitude), np.radians(longitude), self.lat_rad, self.lon_rad
+        )
+
+
+class RandomProjectionLSH:
+    """Approximate cosine nearest neighbors with random-projection LSH
+    
+    Every table hashes a vector to the sign pattern of `n_bits` random
+    hyperplanes through the centroid of the indexed data. A query probes its
+    own bucket in each table plus the `n_probes` buckets reached by flipping
+    its least certain bits, then ranks the union of candidates by exact
+    cosine. More tables or probes raise recall at the cost of latency; by
+    default `n_bits` grows with the number of items so buckets stay small.
+    """
+    
+    def __init__(self, dimension, n_tables=4, n_bits=None, n_probes=2, seed=42,
+                 planes=None, offset=None):
+        self.dimension = dimension
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = n_probes
+        self.seed = seed
+        self.planes = None if planes is None else np.asarray(planes, dtype=np.float64)
+        self.offset = np.zeros(dimension) if offset is None else np.asarray(offset, dtype=np.float64)
+        self.vectors = np.zeros((0, dimension))
+        self._tables = []   # per table: (sorted signatures, item order)
+        if self.planes is not None:
+            self.n_tables, self.n_bits = self.planes.shape[:2]
+            self._bit_values = 1 << np.arange(self.n_bits, dtype=np.int64)
+        self._overflow = [{} for _ in range(self.n_tables)]  # items added since the last build
+    
+    @classmethod
+    def from_arrays(cls, planes, offset, vectors, signatures, order, n_probes=2):
+        """An index saved through table_arrays(), used as is (e.g. memory-mapped)"""
+        index = cls(planes.shape[2], n_probes=n_probes, planes=planes, offset=offset)
+        index.vectors = vectors
+        index._tables = list(zip(signatures, order))
+        return index
+    
+    def __len__(self):
+        return len(self.vectors)
+    
+    def table_arrays(self):
+        """(vectors, signatures, order) of the sorted tables, one row per table, for saving"""
+        if any(self._overflow):
+            self.build(self.vectors)
+        if not self._tables:
+            empty = np.zeros((self.n_tables, 0), dtype=np.int64)
+            return self.vectors, empty, empty
+        signatures, order = zip(*self._tables)
+        return self.vectors, np.stack(signatures), np.stack(order)
+    
+    def _signatures(self, vectors):
+        """(n_vectors x n_tables) bucket ids and the raw projections"""
+        projections = np.einsum('tbd,nd->ntb', self.planes, vectors - self.offset)
+        return (projections > 0) @ self._bit_values, projections
+    
+    def build(self, vectors):
+        """Index a (n x dimension) matrix; item ids are row positions"""
+        self.vectors = normalize_rows(np.asarray(vectors, dtype=np.float64))
+        if self.planes is None:
+            # ~log2(n) + 4 bits: provider features are low-dimensional and
+            # clustered, so buckets are far less even than log2(n) suggests
+            n_bits = self.n_bits or int(np.clip(np.ceil(np.log2(max(len(self.vectors), 2))) + 4, 8, 24))
+            rng = np.random.default_rng(self.seed)
+            self.planes = rng.standard_normal((self.n_tables, n_bits, self.dimension))
+            self.n_bits = n_bits
+            self._bit_values = 1 << np.arange(n_bits, dtype=np.int64)
+            if len(self.vectors):
+                self.offset = self.vectors.mean(axis=0)
+        
+        signatures, _ = self._signatures(self.vectors)
+        self._tables = []
+        for table in range(self.n_tables):
+            order = np.argsort(signatures[:, table], kind='stable')
+            self._tables.append((signatures[order, table], order))
+        self._overflow = [{} for _ in range(self.n_tables)]
+        return self
+    
+    def add(self, vector):
+        """Append one vector and return its item id"""
+        vector = normalize_rows(np.asarray(vector, dtype=np.float64).reshape(1, -1))
+        item = len(self.vectors)
+        if self.planes is None:
+            self.build(vector)
+            return item
+        self.vectors = np.vstack([self.vectors, vector])
+        
+        signatures, _ = self._signatures(vector)
+        for table, signature in enumerate(signatures[0].tolist()):
+            self._overflow[table].setdefault(signature, []).append(item)
+        
+        # Fold overflow buckets into the sorted tables once they get large
+        if sum(len(v) for v in self._overflow[0].values()) > max(1024, len(self.vectors) // 10):
+            self.build(self.vectors)
+        return item
+    
+    def _bucket(self, table, signature):
+        if self._tables:
+            signatures, order = self._tables[table]
+            start = np.searchsorted(signatures, signature, side='left')
+            end = np.searchsorted(signatures, signature, side='right')
+            items = order[start:end]
+        else:
+            items = np.array([], dtype=np.int64)
+        
+        extra = self._overflow[table].get(signature)
+        if extra:
+            items = np.concatenate([items, extra])
+        return items
+    
+    def query(self, vector, k=10, n_probes=None, exclude=None, allowed=None):
+        """
+        Approximate top-k (item ids, cosine scores) for one vector
+        
+        `allowed`, a sorted array of item ids, restricts the answer to those items.
+        """
+        n_probes = self.n_probes if n_probes is None else n_probes
+        vector = normalize_rows(np.asarray(vector, dtype=np.float64).reshape(1, -1))
+        signatures, projections = self._signatures(vector)
+        
+        buckets = []
+        for table in range(self.n_tables):
+            signature = int(signatures[0, table])
+            buckets.append(self._bucket(table, signature))
+            # Multi-probe: flip the bits whose hyperplane is closest to the vector
+            for bit in np.argsort(np.abs(projections[0, table]))[:n_probes]:
+                buckets.append(self._bucket(table, signature ^ int(self._bit_values[bit])))
+        
+        candidates = np.unique(np.concatenate(buckets)).astype(np.int64)
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if allowed is not None:
+            candidates = candidates[np.isin(candidates, allowed, assume_unique=True)]
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+        
+        similarities = self.vectors[candidates] @ vector[0]
+        if len(candidates) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+            candidates, similarities = candidates[top], similarities[top]
+        order = np.argsort(-similarities, kind='stable')
+        return candidates[order], similarities[order]
+    
+    def neighbor_index(self, k=20):
+        """Approximate NeighborIndex over every indexed item"""
+        neighbors = np.full((len(self), k), -1, dtype=np.int32)
+        scores = np.zeros((len(self), k))
+        for item in range(len(self)):
+            candidates, similarities = self.query(self.vectors[item], k=k, exclude=item)
+            keep = similarities > 0
+            candidates, similarities = candidates[keep], similarities[keep]
+            neighbors[item, :len(candidates)] = candidates
+            scores[item, :len(candidates)] = similarities
+        return NeighborIndex(neighbors, scores)
+
+
+class CoVisitationIndex:
+    """"Users who interacted with X also hired Y" counts, top entries per provider
+    
+    Row X lists the providers most often hired by users who interacted with
+    X in any way, with the number of such users, best first. The counts are
+    the sparse product touched.T @ hired of two users x providers indicator
+    matrices; each row keeps only its `capacity` (2k) best entries, so a
+    lookup is O(k). Online events update the affected rows in place. A
+    provider that is new to a full row takes the weakest slot with that
+    slot's count plus one (Space-Saving), so emerging pairs can surface
+    between rebuilds at the cost of a bounded overestimate.
+    """
+    
+    def __init__(self, provider_ids=(), neighbors=None, counts=None, k=20):
+        self.k = k
+        self.provider_ids = np.asarray(provider_ids, dtype=np.int64)
+        if neighbors is None:
+            neighbors = np.full((len(self.provider_ids), 2 * k), -1, dtype=np.int64)
+            counts = np.zeros((len(self.provider_ids), 2 * k), dtype=np.int64)
+        self.neighbors = np.asarray(neighbors, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.provider_index = {pid: i for i, pid in enumerate(self.provider_ids.tolist())}
+    
+    @property
+    def capacity(self):
+        return self.neighbors.shape[1]
+    
+    def __len__(self):
+        return len(self.provider_ids)
+    
+    @classmethod
+    def build(cls, user_ids, provider_ids, hired, k=20, block_size=4096):
+        """Count matrix from interaction rows, hired[i] marking hire rows"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        hired = np.asarray(hired, dtype=bool)
+        if len(user_ids) == 0:
+            return cls(k=k)
+        
+        _, rows = np.unique(user_ids, return_inverse=True)
+        providers, cols = np.unique(np.asarray(provider_ids, dtype=np.int64), return_inverse=True)
+        shape = (rows.max() + 1, len(providers))
+        touched = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+        touched.data[:] = 1  # several interaction types of one pair count once
+        hires = sparse.csr_matrix((np.ones(hired.sum()), (rows[hired], cols[hired])), shape=shape)
+        hires.data[:] = 1
+        
+        index = cls(providers, k=k)
+        touched_by_provider = touched.T.tocsr()
+        for start in range(0, len(providers), block_size):
+            end = min(start + block_size, len(providers))
+            block = (touched_by_provider[start:end] @ hires).tocsr()
+            for offset in range(end - start):
+                begin, finish = block.indptr[offset], block.indptr[offset + 1]
+                top, counts = NeighborIndex._select_top_k(
+                    block.indices[begin:finish], block.data[begin:finish], start + offset, index.capacity
+                )
+                index.neighbors[start + offset] = np.where(top >= 0, providers[top], -1)
+                index.counts[start + offset] = counts
+        return index
+    
+    def lookup(self, provider_id, n=None):
+        """Provider ids and counts hired alongside provider_id, best first (at most k)"""
+        row = self.provider_index.get(provider_id)
+        if row is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        n = min(n or self.k, self.k)
+        neighbors = self.neighbors[row, :n]
+        valid = neighbors >= 0
+        return neighbors[valid], self.counts[row, :n][valid]
+    
+    def record(self, provider_id, interaction_type, touched_ids, hired_ids):
+        """
+        Apply one interaction event given the user's history before it
+        
+        `touched_ids` are the providers the user had interacted with and
+        `hired_ids` the ones they had hired. Cost is O(len(history) x k).
+        """
+        touched_ids = set(touched_ids)
+        hired_ids = set(hired_ids)
+        self.neighbors = writable(self.neighbors)
+        self.counts = writable(self.counts)
+        
+        if provider_id not in touched_ids:
+            # First contact with this provider: it co-occurs with every past hire
+            for other in hired_ids - {provider_id}:
+                self._increment(provider_id, other)
+        if interaction_type in HIRE_INTERACTION_TYPES and provider_id not in hired_ids:
+            # First hire: every provider the user touched gains this hire
+            for other in touched_ids - {provider_id}:
+                self._increment(other, provider_id)
+    
+    def _row(self, provider_id):
+        row = self.provider_index.get(provider_id)
+        if row is None:
+            row = len(self.provider_ids)
+            self.provider_ids = np.append(self.provider_ids, provider_id)
+            self.neighbors = np.vstack([self.neighbors, np.full((1, self.capacity), -1, dtype=np.int64)])
+            self.counts = np.vstack([self.counts, np.zeros((1, self.capacity), dtype=np.int64)])
+            self.provider_index[provider_id] = row
+        return row
+    
+    def _increment(self, provider_id, hired_id):
+        row = self._row(provider_id)
+        slots = np.flatnonzero(self.neighbors[row] == hired_id)
+        if len(slots):
+            self.counts[row, slots[0]] += 1
+        else:
+            # Rows are sorted, so the last slot is empty or the weakest entry
+            self.neighbors[row, -1] = hired_id
+            self.counts[row, -1] += 1
+        
+        order = np.argsort(-self.counts[row], kind='stable')
+        self.neighbors[row] = self.neighbors[row][order]
+        self.counts[row] = self.counts[row][order]
 
 
 class HybridRecommender:
     """Hybrid recommendation system combining collaborative and content-based filtering"""
     
-    def __init__(self):
+    def __init__(self, engine='neighborhood', half_life_days=None, precision='float64'):
+        self.engine = engine
+        self.half_life_days = half_life_days
+        self.precision = precision
+        self.decay_epoch = None
         self.user_provider_matrix = None
+        self.user_neighbors = None
+        self.factors = None
+        self.covisitation = None
+        self._update_lock = threading.Lock()
         self.provider_features = None
-        self.similarity_matrix = None
-        
+        self.provider_service_types = None
+        self.provider_neighbors = None
+        self.provider_ann = None
+        self._provider_partitions = None
+    
     def calculate_distance(self, lat1, lon1, lat2, lon2):
         """Calculate distance between two points using Haversine formula (in km)"""
         R = 6371  # Earth's radius in kilometers
@@ -28,42 +1172,242 @@ class HybridRecommender:
         
         return distance
     
-    def build_user_provider_matrix(self, interactions):
-        """Build user-provider interaction matrix for collaborative filtering"""
-        # Create interaction scores
-        interaction_weights = {
-            'view': 1,
-            'contact': 2,
-            'hire': 4,
-            'favorite': 3
-        }
+    def build_user_provider_matrix(self, interactions, now=None, covisitation_k=20):
+        """
+        Build sparse user-provider interaction matrix for collaborative filtering
+        
+        With a half-life set, each interaction is weighted by
+        2 ** ((last_interaction - epoch) / half_life) where the epoch is the
+        build time. That is the exponential decay up to one factor shared by
+        every score, which cosine similarities and the normalized score
+        components ignore, so scores never have to be rewritten as time
+        passes. All of a row's interaction_count is dated at its
+        last_interaction. The co-visitation index (top covisitation_k per
+        provider) is built from the same rows.
+        """
+        user_ids = []
+        provider_ids = []
+        types = []
+        counts = []
+        timestamps = []
         
-        data = []
         for interaction in interactions:
-            weight = interaction_weights.get(interaction.interaction_type, 1)
-            score = weight * interaction.interaction_count
-            
-            data.append({
-                'user_id': interaction.user_id,
-                'provider_id': interaction.provider_id,
-                'score': score
-            })
+            user_ids.append(interaction.user_id)
+            provider_ids.append(interaction.provider_id)
+            types.append(interaction.interaction_type)
+            counts.append(interaction.interaction_count)
+            timestamps.append(getattr(interaction, 'last_interaction', None))
         
-        df = pd.DataFrame(data)
+        if self.half_life_days:
+            self.decay_epoch = now or datetime.utcnow()
+        scores = self._interaction_scores(types, counts, timestamps)
         
-        # Pivot to create user-provider matrix
-        self.user_provider_matrix = df.pivot_table(
-            index='user_id',
-            columns='provider_id',
-            values='score',
-            fill_value=0
+        # Interactions of different types for the same pair are summed
+        self.user_provider_matrix = SparseInteractionMatrix.from_triplets(
+            user_ids, provider_ids, scores
+        )
+        self.covisitation = CoVisitationIndex.build(
+            user_ids, provider_ids, [t in HIRE_INTERACTION_TYPES for t in types], k=covisitation_k
         )
         
         return self.user_provider_matrix
     
-    def build_provider_features(self, providers):
-        """Build provider feature matrix for content-based filtering"""
-        service_types = list(set([p.service_type for p in providers]))
+    def build_user_provider_matrix_from_chunks(self, chunks, expected_rows=0, now=None, covisitation_k=20):
+        """
+        Build the interaction matrix from streamed row chunks
+        
+        `chunks` yields sequences of (user_id, provider_id, interaction_type,
+        interaction_count, last_interaction) tuples, e.g. database rows
+        fetched with yield_per. Each chunk is converted to arrays and copied
+        into preallocated id/score arrays (sized by `expected_rows`, grown if
+        needed), so no per-row objects outlive their chunk. The co-visitation
+        index is built from the same arrays.
+        """
+        capacity = max(int(expected_rows), 1024)
+        user_ids = np.empty(capacity, dtype=np.int64)
+        provider_ids = np.empty(capacity, dtype=np.int64)
+        scores = np.empty(capacity, dtype=np.float64)
+        hired = np.empty(capacity, dtype=bool)
+        if self.half_life_days:
+            self.decay_epoch = now or datetime.utcnow()
+        
+        n_rows = 0
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+            chunk_users, chunk_providers, types, counts, timestamps = zip(*chunk)
+            end = n_rows + len(chunk)
+            if end > capacity:
+                capacity = max(end, 2 * capacity)
+                user_ids = np.resize(user_ids, capacity)
+                provider_ids = np.resize(provider_ids, capacity)
+                scores = np.resize(scores, capacity)
+                hired = np.resize(hired, capacity)
+            
+            user_ids[n_rows:end] = chunk_users
+            provider_ids[n_rows:end] = chunk_providers
+            scores[n_rows:end] = self._interaction_scores(types, counts, timestamps)
+            hired[n_rows:end] = [t in HIRE_INTERACTION_TYPES for t in types]
+            n_rows = end
+        
+        self.user_provider_matrix = SparseInteractionMatrix.from_triplets(
+            user_ids[:n_rows], provider_ids[:n_rows], scores[:n_rows]
+        )
+        self.covisitation = CoVisitationIndex.build(
+            user_ids[:n_rows], provider_ids[:n_rows], hired[:n_rows], k=covisitation_k
+        )
+        return self.user_provider_matrix
+    
+    def _interaction_scores(self, types, counts, timestamps):
+        """Type-weighted (and, with a half-life, decayed) scores of interaction rows"""
+        weights = np.array([INTERACTION_WEIGHTS.get(t, 1) for t in types], dtype=np.float64)
+        scores = weights * np.array([c if c is not None else 1 for c in counts], dtype=np.float64)
+        if not self.half_life_days or len(scores) == 0:
+            return scores
+        
+        # Vectorized 2 ** ((t - epoch) / half_life); rows without a timestamp count as epoch
+        ages = (np.array(timestamps, dtype='datetime64[us]') - np.datetime64(self.decay_epoch, 'us'))
+        half_lives = ages / np.timedelta64(1, 's') / (self.half_life_days * 86400)
+        return scores * np.exp2(np.nan_to_num(half_lives))
+    
+    def build_user_neighbors(self, k=20, builder=None):
+        """Precompute the top-k most similar users of every user
+        
+        `builder(matrix, k)` replaces NeighborIndex.build, e.g. with the
+        parallel build of training_pipeline.TrainingPipeline.
+        """
+        if self.user_provider_matrix is None:
+            return None
+        
+        builder = builder or (lambda matrix, k: NeighborIndex.build(matrix, k=k))
+        self.user_neighbors = builder(self.user_provider_matrix.full_matrix(), k)
+        return self.user_neighbors
+    
+    def refresh_user_neighbors(self, user_ids):
+        """Recompute neighbor lists only for users whose interactions changed"""
+        if self.user_neighbors is None:
+            return
+        
+        matrix = self.user_provider_matrix
+        self.user_neighbors.resize(matrix.shape[0])
+        for user_id in user_ids:
+            if matrix.has_user(user_id):
+                self.user_neighbors.refresh(
+                    matrix.user_index[user_id], *matrix.user_similarities(user_id)
+                )
+    
+    def build_factors(self, n_factors=32):
+        """Fit the latent-factor engine on the interaction matrix"""
+        if self.user_provider_matrix is None:
+            return None
+        
+        self.factors = MatrixFactorization.fit(
+            self.user_provider_matrix.full_matrix(), n_factors=n_factors
+        )
+        return self.factors
+    
+    def _decay_multiplier(self, when):
+        """Weight of an event at `when` relative to one at the decay epoch"""
+        if not self.half_life_days or when is None:
+            return 1.0
+        half_lives = (when - self.decay_epoch).total_seconds() / (self.half_life_days * 86400)
+        return 2.0 ** half_lives
+    
+    def _rebase_decay(self, epoch):
+        """Move the decay epoch forward, rescaling the stored scores to match"""
+        factor = 1.0 / self._decay_multiplier(epoch)
+        if self.user_provider_matrix is not None:
+            self.user_provider_matrix.scale(factor)
+        if self.factors is not None:
+            self.factors.user_factors = self.factors.user_factors * factor
+        self.decay_epoch = epoch
+    
+    @property
+    def uses_factors(self):
+        return self.engine == 'svd' and self.factors is not None
+    
+    def update_interaction(self, user_id, provider_id, interaction_type, count_delta=1, when=None):
+        """
+        Apply one interaction event to the in-memory model without a rebuild
+        
+        The weighted count delta is added to the user's matrix cell and either
+        the neighbor lists touching that user are refreshed or, with the svd
+        engine, the user's factors are folded in again. Users and providers
+        the model has not seen yet are added on the fly. With time decay the
+        event is weighted relative to the decay epoch like the training build.
+        """
+        score = INTERACTION_WEIGHTS.get(interaction_type, 1) * count_delta
+        
+        with self._update_lock:
+            if self.half_life_days and self.decay_epoch is not None:
+                when = when or datetime.utcnow()
+                if (when - self.decay_epoch).total_seconds() > DECAY_REBASE_HALF_LIVES * self.half_life_days * 86400:
+                    self._rebase_decay(when)
+                score *= self._decay_multiplier(when)
+            
+            if self.user_provider_matrix is None:
+                self.user_provider_matrix = SparseInteractionMatrix.from_triplets([], [], [])
+            self.user_provider_matrix.add(user_id, provider_id, score)
+            if self.uses_factors:
+                row = self.user_provider_matrix.user_index[user_id]
+                self.factors.fold_in(row, *self.user_provider_matrix.row_entries(row))
+            else:
+                self.refresh_user_neighbors([user_id])
+    
+    def set_precision(self, precision):
+        """
+        Convert the model arrays to one of RECOMMENDER_PRECISIONS
+        
+        'float32' stores the interaction matrix, provider features, factors
+        and neighbor scores as float32; 'float16' and 'int8' additionally
+        store the neighbor scores as float16 or as int8 steps of 1/127.
+        Scoring reads reduced-precision scores through
+        NeighborIndex.score_values.
+        """
+        if precision not in RECOMMENDER_PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {tuple(RECOMMENDER_PRECISIONS)}")
+        float_dtype, score_dtype = RECOMMENDER_PRECISIONS[precision]
+        
+        with self._update_lock:
+            if self.user_provider_matrix is not None:
+                self.user_provider_matrix.astype(float_dtype)
+            if self.factors is not None:
+                self.factors = MatrixFactorization(
+                    self.factors.user_factors.astype(float_dtype, copy=False),
+                    self.factors.provider_factors.astype(float_dtype, copy=False)
+                )
+            if self.provider_features is not None and (self.provider_features.dtypes != float_dtype).any():
+                self.provider_features = self.provider_features.astype(float_dtype)
+            if self.user_neighbors is not None and self.user_neighbors.scores.dtype != score_dtype:
+                self.user_neighbors = self.user_neighbors.astype(score_dtype)
+            if self.provider_neighbors is not None and self.provider_neighbors.scores.dtype != score_dtype:
+                self.provider_neighbors = self.provider_neighbors.astype(score_dtype)
+            self.precision = precision
+    
+    def record_covisitation(self, provider_id, interaction_type, touched_ids, hired_ids):
+        """Apply an interaction event to the co-visitation index (see CoVisitationIndex.record)"""
+        with self._update_lock:
+            if self.covisitation is None:
+                self.covisitation = CoVisitationIndex()
+            self.covisitation.record(provider_id, interaction_type, touched_ids, hired_ids)
+    
+    def also_hired(self, provider_id, n=10):
+        """(provider_id, count) pairs hired by users who interacted with provider_id"""
+        if self.covisitation is None:
+            return []
+        provider_ids, counts = self.covisitation.lookup(provider_id, n)
+        return list(zip(provider_ids.tolist(), counts.tolist()))
+    
+    def build_provider_features(self, providers, k=20, index='exact', n_probes=2, builder=None):
+        """
+        Build provider feature matrix for content-based filtering
+        
+        index='exact' compares every pair of providers (per service type, with
+        `builder(submatrix, k)` if given); index='lsh' builds the neighbor
+        lists from a RandomProjectionLSH index instead, trading a little
+        recall (raise n_probes to recover it) for a near-linear build.
+        """
+        service_types = sorted(set([p.service_type for p in providers]))
         service_type_map = {st: i for i, st in enumerate(service_types)}
         
         features = []
@@ -87,149 +1431,741 @@ class HybridRecommender:
             provider_ids.append(provider.id)
         
         self.provider_features = pd.DataFrame(features, index=provider_ids)
+        self.provider_service_types = service_types
+        self._provider_partitions = None
         
-        # Calculate provider similarity matrix
-        self.similarity_matrix = cosine_similarity(self.provider_features)
+        # Keep only each provider's top-k most similar providers of the same
+        # service type, indexing one service type at a time
+        partitions = [self.provider_partition(st) for st in service_types]
+        values = self.provider_features.values
+        if index == 'lsh':
+            self.provider_ann = RandomProjectionLSH(values.shape[1], n_probes=n_probes).build(values)
+            self.provider_neighbors = NeighborIndex.build_partitioned(
+                values, partitions, k=k,
+                # Features of one service type are spread far more evenly than
+                # the whole catalog's, so fewer bits keep the buckets populated
+                builder=lambda submatrix, k: RandomProjectionLSH(
+                    values.shape[1], n_probes=n_probes,
+                    n_bits=max(6, int(np.ceil(np.log2(len(submatrix)))) - 3)
+                ).build(submatrix).neighbor_index(k=k)
+            )
+        else:
+            self.provider_ann = None
+            self.provider_neighbors = NeighborIndex.build_partitioned(
+                values, partitions, k=k, builder=builder
+            )
         
         return self.provider_features
     
+    def provider_partition(self, service_type):
+        """Feature rows of one service type's providers (None if the model has no type names)"""
+        if self.provider_service_types is None or self.provider_features is None:
+            return None
+        
+        if self._provider_partitions is None:
+            # The one-hot service type columns come first in the feature rows
+            n_types = len(self.provider_service_types)
+            codes = np.argmax(self.provider_features.values[:, :n_types], axis=1)
+            self._provider_partitions = {
+                st: np.flatnonzero(codes == i) for i, st in enumerate(self.provider_service_types)
+            }
+        return self._provider_partitions.get(service_type, np.array([], dtype=np.int64))
+    
+    def provider_service_type(self, provider_idx):
+        """Service type of a feature row (None if the model has no type names)"""
+        if self.provider_service_types is None:
+            return None
+        n_types = len(self.provider_service_types)
+        return self.provider_service_types[int(np.argmax(self.provider_features.values[provider_idx, :n_types]))]
+    
+    def similar_users(self, user_id, n_neighbors=5):
+        """Matrix rows and cosine scores of the user's most similar users"""
+        matrix = self.user_provider_matrix
+        user_row = matrix.user_index[user_id]
+        
+        if self.user_neighbors is not None and user_row < len(self.user_neighbors):
+            # O(k) lookup in the precomputed neighbor index
+            return self.user_neighbors.lookup(user_row, n_neighbors)
+        
+        # Similarity against the users sharing at least one provider
+        rows, similarities = matrix.user_similarities(user_id)
+        keep = rows != user_row
+        rows, similarities = rows[keep], similarities[keep]
+        if len(rows) > n_neighbors:
+            top = np.argpartition(-similarities, n_neighbors - 1)[:n_neighbors]
+            rows, similarities = rows[top], similarities[top]
+        return rows, similarities
+    
     def collaborative_filtering(self, user_id, n_recommendations=10):
         """Recommend providers based on similar users' preferences"""
         if self.user_provider_matrix is None:
             return []
         
-        if user_id not in self.user_provider_matrix.index:
+        if not self.user_provider_matrix.has_user(user_id):
             return []
         
-        # Calculate user similarity
-        user_similarity = cosine_similarity(self.user_provider_matrix)
-        user_similarity_df = pd.DataFrame(
-            user_similarity,
-            index=self.user_provider_matrix.index,
-            columns=self.user_provider_matrix.index
-        )
+        matrix = self.user_provider_matrix
         
-        # Get similar users
-        similar_users = user_similarity_df[user_id].sort_values(ascending=False)[1:6]
+        if self.uses_factors:
+            # One dot product of the user factors against all provider factors
+            scores = self.factors.user_scores(matrix.user_index[user_id])
+            candidates = np.flatnonzero(scores > 0)
+            order = np.argsort(-scores[candidates], kind='stable')[:n_recommendations]
+            return matrix.provider_ids[candidates[order]].tolist()
         
-        # Get providers liked by similar users
-        recommendations = {}
-        for similar_user_id, similarity_score in similar_users.items():
-            user_interactions = self.user_provider_matrix.loc[similar_user_id]
-            for provider_id, score in user_interactions.items():
-                if score > 0:
-                    if provider_id not in recommendations:
-                        recommendations[provider_id] = 0
-                    recommendations[provider_id] += score * similarity_score
+        # Get 5 most similar users
+        similar_rows, similarity_scores = self.similar_users(user_id, 5)
+        if len(similar_rows) == 0:
+            return []
+        
+        # Weight providers liked by similar users by their similarity
+        similar_interactions = matrix.rows(similar_rows)
+        scores = similar_interactions.T @ similarity_scores
+        candidates = np.flatnonzero(similar_interactions.getnnz(axis=0))
         
         # Sort and return top N
-        sorted_recs = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)
-        return [provider_id for provider_id, _ in sorted_recs[:n_recommendations]]
+        order = np.argsort(-scores[candidates], kind='stable')[:n_recommendations]
+        return matrix.provider_ids[candidates[order]].tolist()
     
     def content_based_filtering(self, provider_id, n_recommendations=10):
         """Recommend similar providers based on features"""
-        if self.similarity_matrix is None or provider_id not in self.provider_features.index:
+        if self.provider_neighbors is None or provider_id not in self.provider_features.index:
             return []
         
         provider_idx = self.provider_features.index.get_loc(provider_id)
-        similarities = self.similarity_matrix[provider_idx]
+        if self.provider_ann is not None and n_recommendations > self.provider_neighbors.k:
+            # Longer lists than were precomputed come straight from the ANN
+            # index, kept to the provider's service type like the lists
+            partition = self.provider_partition(self.provider_service_type(provider_idx))
+            vector = self.provider_ann.vectors[provider_idx]
+            similar_indices, _ = self.provider_ann.query(
+                vector, n_recommendations, exclude=provider_idx, allowed=partition
+            )
+            if partition is not None and len(similar_indices) < min(n_recommendations, len(partition) - 1):
+                # The catalog-wide buckets hold few providers of a small
+                # service type, so score its providers exactly instead
+                others = partition[partition != provider_idx]
+                similarities = self.provider_ann.vectors[others] @ vector
+                similar_indices = others[np.argsort(-similarities, kind='stable')[:n_recommendations]]
+        else:
+            # Direct lookup in the precomputed top-k neighbor lists
+            similar_indices, _ = self.provider_neighbors.lookup(provider_idx, n_recommendations)
+        
+        return self.provider_features.index.values[similar_indices].tolist()
+    
+    def _scatter(self, catalog, provider_ids, values):
+        """Spread values keyed by provider id onto catalog positions"""
+        component = np.zeros(len(catalog))
+        positions = catalog.positions(provider_ids)
+        found = positions >= 0
+        np.add.at(component, positions[found], values[found])
+        return component
+    
+    def collaborative_scores(self, user_id, catalog, n_neighbors=5):
+        """Similarity-weighted interaction scores of the user's neighbors per catalog provider"""
+        matrix = self.user_provider_matrix
+        if matrix is None or not matrix.has_user(user_id):
+            return np.zeros(len(catalog))
         
-        # Get most similar providers
-        similar_indices = np.argsort(similarities)[::-1][1:n_recommendations+1]
-        similar_provider_ids = [self.provider_features.index[i] for i in similar_indices]
+        if self.uses_factors:
+            # Only the catalog's own provider columns are scored
+            columns = matrix.columns_of(catalog.provider_ids)
+            known = (columns >= 0) & (columns < len(self.factors.provider_factors))
+            component = np.zeros(len(catalog))
+            component[known] = np.maximum(
+                self.factors.user_scores(matrix.user_index[user_id], columns[known]), 0
+            )
+            return component
         
-        return similar_provider_ids
+        return self._scatter(catalog, *self.collaborative_entries(user_id, n_neighbors))
     
-    def hybrid_recommend(self, user_id, providers, user_location=None, 
-                        service_type=None, n_recommendations=5):
+    def collaborative_entries(self, user_id, n_neighbors=5):
         """
-        Hybrid recommendation combining collaborative, content-based, 
-        and location-based filtering
+        (provider ids, weighted scores) of the user's neighbors' interactions
+        
+        Ids repeat when several neighbors used a provider; their scores add
+        up. Costs O(k x neighbor row length), independent of the catalog.
         """
-        scores = {}
+        matrix = self.user_provider_matrix
+        empty = np.array([], dtype=np.int64), np.array([])
+        if matrix is None or not matrix.has_user(user_id):
+            return empty
         
-        # Collaborative filtering (40% weight)
-        collab_recs = self.collaborative_filtering(user_id, n_recommendations * 3)
-        for i, provider_id in enumerate(collab_recs):
-            scores[provider_id] = scores.get(provider_id, 0) + (0.4 * (len(collab_recs) - i))
+        similar_rows, similarity_scores = self.similar_users(user_id, n_neighbors)
+        if len(similar_rows) == 0:
+            return empty
         
-        # Content-based filtering (30% weight)
-        # Find providers user has interacted with
-        if (self.user_provider_matrix is not None and 
-            user_id in self.user_provider_matrix.index):
-            user_history = self.user_provider_matrix.loc[user_id]
-            top_providers = user_history.nlargest(3).index.tolist()
-            
-            for provider_id in top_providers:
-                similar_providers = self.content_based_filtering(provider_id, n_recommendations * 2)
-                for i, similar_id in enumerate(similar_providers):
-                    scores[similar_id] = scores.get(similar_id, 0) + (0.3 * (len(similar_providers) - i))
+        similar_interactions = matrix.rows(similar_rows).tocoo()
+        weighted = similar_interactions.data * similarity_scores[similar_interactions.row]
+        return matrix.provider_ids[similar_interactions.col], weighted
+    
+    def content_scores(self, user_id, catalog, n_history=3):
+        """Summed feature similarity to the providers the user interacted with most"""
+        return self._scatter(catalog, *self.content_entries(user_id, n_history))
+    
+    def content_entries(self, user_id, n_history=3):
+        """
+        (provider ids, similarities) from the precomputed neighbor lists of
+        the providers the user interacted with most (ids may repeat)
+        """
+        matrix = self.user_provider_matrix
+        empty = np.array([], dtype=np.int64), np.array([])
+        if (self.provider_neighbors is None or matrix is None
+                or not matrix.has_user(user_id)):
+            return empty
         
-        # Rating-based scoring (20% weight)
-        for provider in providers:
-            if service_type and provider.service_type != service_type:
-                continue
-            scores[provider.id] = scores.get(provider.id, 0) + (0.2 * provider.rating * 20)
+        feature_ids = self.provider_features.index.values
+        history_rows = self.provider_features.index.get_indexer(
+            matrix.top_providers(user_id, n_history)
+        )
+        similar_rows, similarities = [], []
+        for row in history_rows[history_rows >= 0]:
+            neighbors, scores = self.provider_neighbors.lookup(row)
+            similar_rows.append(neighbors)
+            similarities.append(scores)
+        if not similar_rows:
+            return empty
+        return feature_ids[np.concatenate(similar_rows)], np.concatenate(similarities)
+    
+    def score_catalog(self, user_id, part, user_location=None,
+                      service_type=None, weights=None, spatial_index=None):
+        """Hybrid scores of every provider in a catalog partition or candidate subset
+        
+        With a spatial_index only providers inside MAX_SCORING_DISTANCE_KM
+        are measured.
+        """
+        weights = dict(DEFAULT_SCORE_WEIGHTS, **(weights or {}))
+        scores = np.zeros(len(part))
+        if len(part) == 0:
+            return scores
+        
+        def add_component(name, component):
+            peak = component.max()
+            if weights[name] and peak > 0:
+                scores[:] += weights[name] * component / peak
+        
+        if user_id is not None:
+            add_component('collaborative', self.collaborative_scores(user_id, part))
+            add_component('content', self.content_scores(user_id, part))
+        
+        add_component('rating', np.clip(part.ratings, 0, 5) / 5.0)
         
-        # Location-based scoring (10% weight)
         if user_location:
-            user_lat, user_lon = user_location
-            for provider in providers:
-                if provider.latitude and provider.longitude:
-                    distance = self.calculate_distance(
-                        user_lat, user_lon,
-                        provider.latitude, provider.longitude
-                    )
-                    # Closer is better (inverse distance, max 10km)
-                    location_score = max(0, 10 - distance) / 10
-                    scores[provider.id] = scores.get(provider.id, 0) + (0.1 * location_score * 100)
-        
-        # Sort by score
-        sorted_providers = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        recommended_ids = [provider_id for provider_id, _ in sorted_providers[:n_recommendations]]
+            if spatial_index is not None:
+                nearby = spatial_index.query(
+                    user_location[0], user_location[1], MAX_SCORING_DISTANCE_KM, service_type
+                )
+                nearby_ids = np.array([pid for pid, _ in nearby], dtype=np.int64)
+                distances = np.array([distance for _, distance in nearby])
+            else:
+                nearby_ids, distances = part.provider_ids, part.distances_km(*user_location)
+            # Closer is better (linear falloff, providers without coordinates get 0)
+            location = np.nan_to_num(
+                np.maximum(0, MAX_SCORING_DISTANCE_KM - distances) / MAX_SCORING_DISTANCE_KM
+            )
+            add_component('distance', self._scatter(part, nearby_ids, location))
+        
+        return scores
+    
+    def recommend_ids(self, user_id, catalog, user_location=None, service_type=None,
+                      n_recommendations=5, weights=None, spatial_index=None):
+        """Top-N provider ids for a user, selected with argpartition"""
+        part = catalog.partition(service_type)
+        scores = self.score_catalog(
+            user_id, part, user_location, service_type, weights, spatial_index
+        )
+        
+        n = min(n_recommendations, len(part))
+        if n <= 0:
+            return []
+        
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.lexsort((part.provider_ids[top], -scores[top]))]
+        return part.provider_ids[top].tolist()
+    
+    def _partition_similarities(self, service_type, part):
+        """Sparse (feature providers x partition providers) neighbor similarities
+        
+        Neighbor lists only hold providers of the same service type, so only
+        the service type's own feature rows are read.
+        """
+        rows = self.provider_partition(service_type) if service_type else None
+        if rows is None:
+            rows = np.arange(len(self.provider_neighbors))
+        
+        neighbors = self.provider_neighbors.neighbors[rows]
+        scores = self.provider_neighbors.score_values(rows)
+        source_rows = np.repeat(rows, neighbors.shape[1]).reshape(neighbors.shape)
+        valid = neighbors >= 0
+        
+        targets = part.positions(self.provider_features.index.values[neighbors[valid]])
+        found = targets >= 0
+        return sparse.csr_matrix(
+            (scores[valid][found], (source_rows[valid][found], targets[found])),
+            shape=(len(self.provider_features), len(part))
+        )
+    
+    def _neighbor_matrix(self, rows, n_neighbors=5):
+        """Sparse (len(rows) x users) matrix of each row's neighbor similarities"""
+        matrix = self.user_provider_matrix
+        if self.user_neighbors is not None and len(self.user_neighbors) >= matrix.shape[0]:
+            # Straight slice of the precomputed neighbor index
+            known = np.flatnonzero(rows >= 0)
+            neighbor_rows = self.user_neighbors.neighbors[rows[known], :n_neighbors]
+            similarities = self.user_neighbors.score_values((rows[known], slice(None, n_neighbors)))
+            batch_rows = np.repeat(known, neighbor_rows.shape[1]).reshape(neighbor_rows.shape)
+            valid = neighbor_rows >= 0
+            return sparse.csr_matrix(
+                (similarities[valid], (batch_rows[valid], neighbor_rows[valid])),
+                shape=(len(rows), matrix.shape[0])
+            )
+        
+        batch_rows, neighbor_rows, similarities = [], [], []
+        for i, row in enumerate(rows):
+            if row < 0:
+                continue
+            similar_rows, scores = self.similar_users(matrix.user_ids[row], n_neighbors)
+            batch_rows.extend([i] * len(similar_rows))
+            neighbor_rows.extend(similar_rows)
+            similarities.extend(scores)
+        
+        return sparse.csr_matrix(
+            (similarities, (batch_rows, neighbor_rows)), shape=(len(rows), matrix.shape[0])
+        )
+    
+    def _history_matrix(self, rows, n_history=3):
+        """Sparse (len(rows) x feature providers) indicator of each user's top providers"""
+        matrix = self.user_provider_matrix
+        feature_index = self.provider_features.index
+        batch_rows, feature_rows = [], []
+        for i, row in enumerate(rows):
+            if row < 0:
+                continue
+            history = feature_index.get_indexer(
+                matrix.top_providers(matrix.user_ids[row], n_history)
+            )
+            history = history[history >= 0]
+            batch_rows.extend([i] * len(history))
+            feature_rows.extend(history)
+        
+        return sparse.csr_matrix(
+            (np.ones(len(batch_rows)), (batch_rows, feature_rows)),
+            shape=(len(rows), len(feature_index))
+        )
+    
+    @staticmethod
+    def _normalize_component(component):
+        """Scale every row of a (users x providers) component to a peak of 1"""
+        peaks = component.max(axis=1, keepdims=True)
+        peaks[peaks <= 0] = 1.0
+        return component / peaks
+    
+    def recommend_many(self, user_ids, catalog, user_locations=None, service_type=None,
+                       n_recommendations=5, weights=None, max_block_cells=2 ** 24):
+        """
+        Recommendations for many users at once
+        
+        Users are scored in blocks: the collaborative component is one sparse
+        (users x neighbors) @ (neighbors x providers) product and the content
+        component one (users x history) @ (history x providers) product, so
+        the catalog and model are walked once per block instead of once per
+        user. `user_locations` maps user id to (lat, lon). Yields
+        (user_id, [provider_ids]) pairs in the order of user_ids.
+        """
+        weights = dict(DEFAULT_SCORE_WEIGHTS, **(weights or {}))
+        user_locations = user_locations or {}
+        matrix = self.user_provider_matrix
+        
+        # Only the requested type's catalog partition is ever scored
+        part = catalog.partition(service_type)
+        n = min(n_recommendations, len(part))
+        if n <= 0:
+            for user_id in user_ids:
+                yield user_id, []
+            return
+        
+        column_ids = part.provider_ids
+        ratings = np.clip(part.ratings, 0, 5) / 5.0
+        base_scores = weights['rating'] * self._normalize_component(ratings[None, :])[0]
+        
+        interactions = None
+        catalog_factors = None
+        if matrix is not None and weights['collaborative']:
+            # Matrix columns of the partition's providers; others have no interactions
+            matrix_columns = matrix.columns_of(column_ids)
+            if self.uses_factors:
+                known = (matrix_columns >= 0) & (matrix_columns < len(self.factors.provider_factors))
+                catalog_factors = np.zeros((self.factors.n_factors, len(part)))
+                catalog_factors[:, known] = self.factors.provider_factors[matrix_columns[known]].T
+            else:
+                known = np.flatnonzero(matrix_columns >= 0)
+                placement = sparse.csr_matrix(
+                    (np.ones(len(known)), (np.arange(len(known)), known)),
+                    shape=(len(known), len(part))
+                )
+                interactions = matrix.column_block(matrix_columns[known]) @ placement
+        similarities = None
+        if self.provider_neighbors is not None and matrix is not None and weights['content']:
+            similarities = self._partition_similarities(service_type, part)
+        
+        block_size = max(1, max_block_cells // len(part))
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), block_size):
+            block = user_ids[start:start + block_size]
+            rows = np.array([
+                matrix.user_index.get(uid, -1) if matrix is not None else -1 for uid in block
+            ])
+            scores = np.tile(base_scores, (len(block), 1))
+            
+            if interactions is not None and (rows >= 0).any():
+                collaborative = (self._neighbor_matrix(rows) @ interactions).toarray()
+                scores += weights['collaborative'] * self._normalize_component(collaborative)
+            elif catalog_factors is not None and (rows >= 0).any():
+                block_factors = np.zeros((len(rows), self.factors.n_factors))
+                known = (rows >= 0) & (rows < len(self.factors.user_factors))
+                block_factors[known] = self.factors.user_factors[rows[known]]
+                collaborative = np.maximum(block_factors @ catalog_factors, 0)
+                scores += weights['collaborative'] * self._normalize_component(collaborative)
+            
+            if similarities is not None and (rows >= 0).any():
+                content = (self._history_matrix(rows) @ similarities).toarray()
+                scores += weights['content'] * self._normalize_component(content)
+            
+            located = [i for i, uid in enumerate(block) if user_locations.get(uid)]
+            if weights['distance'] and located:
+                points = np.radians(np.array([user_locations[block[i]] for i in located]))
+                distances = haversine_km_radians(
+                    points[:, :1], points[:, 1:],
+                    part.lat_rad[None, :], part.lon_rad[None, :]
+                )
+                location = np.nan_to_num(
+                    np.maximum(0, MAX_SCORING_DISTANCE_KM - distances) / MAX_SCORING_DISTANCE_KM
+                )
+                scores[located] += weights['distance'] * self._normalize_component(location)
+            
+            top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+            for i, user_id in enumerate(block):
+                order = np.lexsort((column_ids[top[i]], -scores[i, top[i]]))
+                yield user_id, column_ids[top[i][order]].tolist()
+    
+    def hybrid_recommend(self, user_id, providers, user_location=None, 
+                        service_type=None, n_recommendations=5, weights=None):
+        """
+        Hybrid recommendation combining collaborative, content-based, 
+        rating and location-based filtering
+        """
+        catalog = ProviderCatalog.from_providers(providers)
+        recommended_ids = self.recommend_ids(
+            user_id, catalog, user_location, service_type, n_recommendations, weights
+        )
         
         # Return provider objects
         provider_dict = {p.id: p for p in providers}
         return [provider_dict[pid] for pid in recommended_ids if pid in provider_dict]
     
-    def save_model(self, directory='models'):
-        """Save recommendation model"""
-        os.makedirs(directory, exist_ok=True)
+    def _model_arrays(self):
+        """Every model array by artifact name"""
+        arrays = {}
+        if self.user_provider_matrix is not None:
+            matrix = self.user_provider_matrix.full_matrix()
+            csc = self.user_provider_matrix.column_major()
+            arrays.update({
+                'matrix_data': matrix.data,
+                'matrix_indices': matrix.indices,
+                'matrix_indptr': matrix.indptr,
+                'matrix_csc_data': csc.data,
+                'matrix_csc_indices': csc.indices,
+                'matrix_csc_indptr': csc.indptr,
+                'user_ids': self.user_provider_matrix.user_ids,
+                'provider_ids': self.user_provider_matrix.provider_ids
+            })
+        if self.user_neighbors is not None:
+            arrays['user_neighbors'] = self.user_neighbors.neighbors
+            arrays['user_neighbor_scores'] = self.user_neighbors.scores
+        if self.factors is not None:
+            arrays['user_factors'] = self.factors.user_factors
+            arrays['provider_factors'] = self.factors.provider_factors
+        if self.provider_features is not None:
+            arrays['provider_features'] = self.provider_features.values
+            arrays['provider_feature_ids'] = self.provider_features.index.values
+        if self.provider_neighbors is not None:
+            arrays['provider_neighbors'] = self.provider_neighbors.neighbors
+            arrays['provider_neighbor_scores'] = self.provider_neighbors.scores
+        if self.provider_ann is not None:
+            arrays['provider_ann_planes'] = self.provider_ann.planes
+            arrays['provider_ann_offset'] = self.provider_ann.offset
+            (arrays['provider_ann_vectors'], arrays['provider_ann_signatures'],
+             arrays['provider_ann_order']) = self.provider_ann.table_arrays()
+        if self.covisitation is not None:
+            arrays['covisitation_provider_ids'] = self.covisitation.provider_ids
+            arrays['covisitation_neighbors'] = self.covisitation.neighbors
+            arrays['covisitation_counts'] = self.covisitation.counts
+        return arrays
+    
+    def save_model(self, directory='models', keep_versions=3):
+        """
+        Save recommendation model as a versioned artifact directory
+        
+        Each array goes to its own .npy file next to a manifest.json holding
+        the format version, shapes and dtypes, so load_model can memory-map
+        them. The version directory is written under a temporary name and
+        renamed into place before the LATEST pointer is switched, so readers
+        never see a half-written model.
+        """
+        root = os.path.join(directory, 'recommender')
+        os.makedirs(root, exist_ok=True)
+        
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        staging = os.path.join(root, f'.{version}.tmp')
+        os.makedirs(staging)
         
-        model_data = {
-            'user_provider_matrix': self.user_provider_matrix,
-            'provider_features': self.provider_features,
-            'similarity_matrix': self.similarity_matrix
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'version': version,
+            'engine': self.engine,
+            'precision': self.precision,
+            'matrix_shape': list(self.user_provider_matrix.shape) if self.user_provider_matrix is not None else None,
+            'provider_ann_probes': self.provider_ann.n_probes if self.provider_ann is not None else None,
+            'provider_service_types': self.provider_service_types,
+            'covisitation_k': self.covisitation.k if self.covisitation is not None else None,
+            'half_life_days': self.half_life_days,
+            'decay_epoch': self.decay_epoch.isoformat() if self.decay_epoch is not None else None,
+            'arrays': {}
         }
+        for name, array in self._model_arrays().items():
+            array = np.ascontiguousarray(array)
+            np.save(os.path.join(staging, f'{name}.npy'), array)
+            manifest['arrays'][name] = {
+                'file': f'{name}.npy',
+                'shape': list(array.shape),
+                'dtype': array.dtype.str
+            }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
         
-        joblib.dump(model_data, os.path.join(directory, 'recommender.pkl'))
-        print(f"✓ Recommender model saved to {directory}/recommender.pkl")
+        os.rename(staging, os.path.join(root, version))
+        pointer = os.path.join(root, 'LATEST.tmp')
+        with open(pointer, 'w') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(root, 'LATEST'))
+        
+        # Older versions stay readable by processes that still map them
+        versions = sorted(name for name in os.listdir(root) if not name.startswith('.') and name not in ('LATEST', 'LATEST.tmp'))
+        for old in versions[:-keep_versions]:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+        
+        print(f"✓ Recommender model saved to {root}/{version}")
+    
+    def load_model(self, directory='models', mmap_mode='r', precision=None):
+        """
+        Load recommendation model
+        
+        Versioned artifacts are memory-mapped (mmap_mode='r'), so worker
+        processes share one page-cached copy and only touch the pages they
+        use. Models saved before the artifact format fall back to
+        recommender.pkl. Arrays keep the precision they were saved with
+        unless `precision` asks for a conversion (which copies them).
+        """
+        latest = os.path.join(directory, 'recommender', 'LATEST')
+        if os.path.exists(latest):
+            with open(latest) as f:
+                version = f.read().strip()
+            path = os.path.join(directory, 'recommender', version)
+            self._restore(self._read_artifact(path, mmap_mode))
+            print(f"✓ Recommender model {version} loaded from {path}")
+        else:
+            self._restore(joblib.load(os.path.join(directory, 'recommender.pkl')))
+            print(f"✓ Recommender model loaded from {directory}/recommender.pkl")
+        if precision is not None and precision != self.precision:
+            self.set_precision(precision)
     
-    def load_model(self, directory='models'):
-        """Load recommendation model"""
-        model_data = joblib.load(os.path.join(directory, 'recommender.pkl'))
+    @staticmethod
+    def _read_artifact(path, mmap_mode='r'):
+        """Map an artifact directory back to the model_data layout used by _restore"""
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['format_version'] > ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported recommender artifact format {manifest['format_version']}")
+        
+        arrays = {}
+        for name, spec in manifest['arrays'].items():
+            array = np.load(os.path.join(path, spec['file']), mmap_mode=mmap_mode, allow_pickle=False)
+            if list(array.shape) != spec['shape'] or array.dtype.str != spec['dtype']:
+                raise ValueError(f"Recommender artifact {spec['file']} does not match its manifest")
+            arrays[name] = array
+        
+        model_data = dict(
+            arrays,
+            engine=manifest['engine'],
+            precision=manifest.get('precision', 'float64'),
+            provider_ann_probes=manifest['provider_ann_probes'],
+            provider_service_types=manifest.get('provider_service_types'),
+            covisitation_k=manifest.get('covisitation_k'),
+            half_life_days=manifest.get('half_life_days'),
+            decay_epoch=datetime.fromisoformat(manifest['decay_epoch']) if manifest.get('decay_epoch') else None
+        )
+        if 'matrix_data' in arrays:
+            model_data['user_provider_matrix'] = sparse.csr_matrix(
+                (arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']),
+                shape=tuple(manifest['matrix_shape']), copy=False
+            )
+        if 'matrix_csc_data' in arrays:
+            model_data['user_provider_matrix_csc'] = sparse.csc_matrix(
+                (arrays['matrix_csc_data'], arrays['matrix_csc_indices'], arrays['matrix_csc_indptr']),
+                shape=tuple(manifest['matrix_shape']), copy=False
+            )
+        if 'provider_features' in arrays:
+            model_data['provider_features'] = pd.DataFrame(
+                arrays['provider_features'], index=arrays['provider_feature_ids'], copy=False
+            )
+        return model_data
+    
+    def _restore(self, model_data):
+        """Rebuild the model objects from loaded components"""
+        matrix = model_data.get('user_provider_matrix')
+        if isinstance(matrix, pd.DataFrame):
+            # Models saved before the sparse backend stored a dense pivot table
+            self.user_provider_matrix = SparseInteractionMatrix.from_dataframe(matrix)
+        elif matrix is not None:
+            # Older artifacts have no CSC arrays; they are built on first column read
+            self.user_provider_matrix = SparseInteractionMatrix(
+                matrix, model_data['user_ids'], model_data['provider_ids'],
+                csc=model_data.get('user_provider_matrix_csc')
+            )
+        else:
+            self.user_provider_matrix = None
+        
+        if model_data.get('user_neighbors') is not None:
+            self.user_neighbors = NeighborIndex(
+                model_data['user_neighbors'], model_data['user_neighbor_scores']
+            )
+        else:
+            self.user_neighbors = None
         
-        self.user_provider_matrix = model_data['user_provider_matrix']
-        self.provider_features = model_data['provider_features']
-        self.similarity_matrix = model_data['similarity_matrix']
+        self.engine = model_data.get('engine', 'neighborhood')
+        self.precision = model_data.get('precision', 'float64')
+        self.half_life_days = model_data.get('half_life_days')
+        self.decay_epoch = model_data.get('decay_epoch')
+        if model_data.get('user_factors') is not None:
+            self.factors = MatrixFactorization(
+                model_data['user_factors'], model_data['provider_factors']
+            )
+        else:
+            self.factors = None
         
-        print(f"✓ Recommender model loaded from {directory}/recommender.pkl")
+        if model_data.get('covisitation_neighbors') is not None:
+            self.covisitation = CoVisitationIndex(
+                model_data['covisitation_provider_ids'], model_data['covisitation_neighbors'],
+                model_data['covisitation_counts'], k=model_data['covisitation_k']
+            )
+        else:
+            # Models saved before the co-visitation index start with an empty one
+            self.covisitation = None
+        
+        self.provider_features = model_data.get('provider_features')
+        self.provider_service_types = model_data.get('provider_service_types')
+        self._provider_partitions = None
+        if model_data.get('provider_neighbors') is not None:
+            self.provider_neighbors = NeighborIndex(
+                model_data['provider_neighbors'], model_data['provider_neighbor_scores']
+            )
+        elif self.provider_features is not None:
+            # Older models stored the full similarity matrix; rebuild top-k lists
+            self.provider_neighbors = NeighborIndex.build(self.provider_features.values)
+        else:
+            self.provider_neighbors = None
+        
+        if model_data.get('provider_ann_signatures') is not None:
+            self.provider_ann = RandomProjectionLSH.from_arrays(
+                model_data['provider_ann_planes'], model_data['provider_ann_offset'],
+                model_data['provider_ann_vectors'], model_data['provider_ann_signatures'],
+                model_data['provider_ann_order'], n_probes=model_data['provider_ann_probes']
+            )
+        elif model_data.get('provider_ann_planes') is not None:
+            # Older artifacts stored only the hyperplanes; rehash the features
+            planes = model_data['provider_ann_planes']
+            self.provider_ann = RandomProjectionLSH(
+                planes.shape[2], n_probes=model_data['provider_ann_probes'],
+                planes=planes, offset=model_data['provider_ann_offset']
+            ).build(self.provider_features.values)
+        else:
+            self.provider_ann = None
+
 
+@contextmanager
+def announce_stage(name):
+    """Default train_recommender stage: just print its name"""
+    print(f"{name}...")
+    yield
 
-def train_recommender(interactions, providers):
-    """Train and save recommender system"""
-    print("Building recommendation system...")
+
+def train_recommender(interactions, providers, n_neighbors=20, n_provider_neighbors=20,
+                      engine='neighborhood', n_factors=32, provider_index='exact', lsh_probes=2,
+                      half_life_days=None, interaction_chunks=None, n_interactions=0,
+                      n_covisited=20, precision='float64', decay_epoch=None,
+                      stage=announce_stage, neighbor_builder=None):
+    """
+    Train and save recommender system
+    
+    Interactions come either as a list of objects or, for large tables, as
+    `interaction_chunks` of row tuples (see build_user_provider_matrix_from_chunks)
+    with `n_interactions` as the expected row count; `interactions` is then
+    ignored. The model is stored and served at `precision` (see
+    HybridRecommender.set_precision).
     
-    recommender = HybridRecommender()
+    training_pipeline.TrainingPipeline runs these same stages with its own
+    `stage(name)` context manager (timing each one), a
+    `neighbor_builder(matrix, k, name)` for the neighbor indexes and a
+    pinned `decay_epoch` (the build time by default).
+    """
+    if engine not in RECOMMENDER_ENGINES:
+        raise ValueError(f"Unknown recommender engine '{engine}', expected one of {RECOMMENDER_ENGINES}")
+    if provider_index not in PROVIDER_INDEXES:
+        raise ValueError(f"Unknown provider index '{provider_index}', expected one of {PROVIDER_INDEXES}")
+    if precision not in RECOMMENDER_PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {tuple(RECOMMENDER_PRECISIONS)}")
     
-    print("Building user-provider interaction matrix...")
-    recommender.build_user_provider_matrix(interactions)
-    print(f"Matrix shape: {recommender.user_provider_matrix.shape}")
+    def builder(name):
+        if neighbor_builder is None:
+            return None
+        return lambda matrix, k: neighbor_builder(matrix, k, name)
     
-    print("Building provider feature matrix...")
-    recommender.build_provider_features(providers)
+    print(f"Building recommendation system ({engine} engine)...")
+    recommender = HybridRecommender(engine=engine, half_life_days=half_life_days)
+    
+    with stage("Interaction matrix and co-visitation"):
+        if half_life_days:
+            print(f"  interactions decay with a {half_life_days}-day half-life")
+        if interaction_chunks is not None:
+            recommender.build_user_provider_matrix_from_chunks(
+                interaction_chunks, n_interactions, now=decay_epoch, covisitation_k=n_covisited
+            )
+        else:
+            recommender.build_user_provider_matrix(
+                interactions, now=decay_epoch, covisitation_k=n_covisited
+            )
+    matrix = recommender.user_provider_matrix
+    print(f"Matrix shape: {matrix.shape} ({matrix.nnz} non-zero interactions)")
+    
+    if engine == 'svd':
+        with stage(f"Factorization ({n_factors} factors)"):
+            recommender.build_factors(n_factors=n_factors)
+    else:
+        with stage(f"User neighbors (top-{n_neighbors})"):
+            recommender.build_user_neighbors(k=n_neighbors, builder=builder('user_neighbors'))
+    
+    with stage(f"Provider neighbors (top-{n_provider_neighbors}, {provider_index})"):
+        recommender.build_provider_features(
+            providers, k=n_provider_neighbors, index=provider_index, n_probes=lsh_probes,
+            builder=builder('provider_neighbors')
+        )
     print(f"Feature matrix shape: {recommender.provider_features.shape}")
     
-    recommender.save_model()
+    if precision != 'float64':
+        with stage(f"Convert to {precision}"):
+            recommender.set_precision(precision)
+    
+    with stage("Save model"):
+        recommender.save_model()
     
     return recommender
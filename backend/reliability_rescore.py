@@ -0,0 +1,114 @@
+import json
+import os
+import time
+import numpy as np
+from sqlalchemy import select, update
+from models import db, ServiceProvider
+
+# Providers read, classified and written back per chunk
+RESCORE_CHUNK_SIZE = 5000
+
+
+def _provider_chunks(after_id, chunk_size):
+    """(id, *classifier features) rows in id order after `after_id`, paged by keyset"""
+    columns = [ServiceProvider.id] + [
+        getattr(ServiceProvider, name) for name in (
+            'experience_years', 'rating', 'total_jobs',
+            'completion_rate', 'response_time', 'verified'
+        )
+    ]
+    last_id = after_id
+    while True:
+        chunk = db.session.execute(
+            select(*columns).where(ServiceProvider.id > last_id)
+            .order_by(ServiceProvider.id).limit(chunk_size)
+        ).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path, checkpoint):
+    """Atomically replace the checkpoint file"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+
+def _write_chunk(provider_ids, labels):
+    """One bulk UPDATE ... WHERE id IN (...) per reliability label"""
+    for label in np.unique(labels):
+        db.session.execute(
+            update(ServiceProvider)
+            .where(ServiceProvider.id.in_(provider_ids[labels == label].tolist()))
+            .values(reliability_score=label)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def rescore_reliability(classifier, model_type='rf', chunk_size=RESCORE_CHUNK_SIZE,
+                        checkpoint_path=None, restart=False, progress=None):
+    """
+    Recompute ServiceProvider.reliability_score with the trained classifier
+    
+    Providers are read in id-ordered keyset chunks of plain column rows,
+    classified with one predict_batch call per chunk and written back with
+    one UPDATE per label, so at most one chunk is held in memory. After
+    each chunk is committed its last id is saved to `checkpoint_path`; a
+    rerun with the same model resumes after it, unless `restart` is set.
+    The checkpoint is removed when the job completes. `progress`, if
+    given, is called with the checkpoint dict after every chunk.
+    Must run inside an application context.
+    """
+    start = time.perf_counter()
+    checkpoint = None if restart else _read_checkpoint(checkpoint_path)
+    if checkpoint and (checkpoint.get('model_version') != classifier.model_version
+                       or checkpoint.get('model_type') != model_type):
+        print("⚠ Checkpoint is from a different model, starting over")
+        checkpoint = None
+    if checkpoint:
+        print(f"Resuming after provider {checkpoint['last_id']} ({checkpoint['rescored']} already rescored)")
+    else:
+        checkpoint = {
+            'model_version': classifier.model_version,
+            'model_type': model_type,
+            'last_id': 0,
+            'rescored': 0
+        }
+    
+    resumed_from = checkpoint['rescored']
+    for chunk in _provider_chunks(checkpoint['last_id'], chunk_size):
+        rows = np.array([row[1:] for row in chunk], dtype=float)
+        # Missing features count as 0, as in ReliabilityClassifier.predict
+        features = np.nan_to_num(rows, nan=0.0)
+        labels, _ = classifier.predict_batch(features, model_type=model_type)
+        labels = np.array([classifier.label_map[label] for label in labels])
+        
+        _write_chunk(np.array([row[0] for row in chunk]), labels)
+        checkpoint['last_id'] = chunk[-1][0]
+        checkpoint['rescored'] += len(chunk)
+        _write_checkpoint(checkpoint_path, checkpoint)
+        if progress:
+            progress(dict(checkpoint))
+        
+        elapsed = time.perf_counter() - start
+        rate = (checkpoint['rescored'] - resumed_from) / elapsed if elapsed else 0
+        print(f"  {checkpoint['rescored']} providers rescored ({elapsed:.1f}s, {rate:.0f}/s)")
+    
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"✓ Reliability rescored for {checkpoint['rescored']} providers in {time.perf_counter() - start:.1f}s")
+    return checkpoint['rescored']
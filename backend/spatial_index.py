@@ -0,0 +1,161 @@
+import math
+import numpy as np
+from utils.geo_utils import EARTH_RADIUS_KM, haversine_km_radians
+
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+
+class ProviderSpatialIndex:
+    """In-memory grid (geohash-style) index over provider coordinates
+    
+    Providers are bucketed into square lat/lon cells, once in a grid for all
+    providers and once in a grid per service type. A radius query scans rings
+    of cells outward from the query point and stops as soon as the closest
+    `limit` providers are known, so its cost depends on the number of
+    providers near the point rather than the size of the catalog.
+    
+    Longitude cells wrap around at the antimeridian (the cell size is
+    rounded so that a whole number of cells spans 360 degrees). Queries
+    whose circle reaches a pole check every populated cell.
+    """
+    
+    def __init__(self, cell_size_deg=0.01):
+        self.n_columns = max(1, round(360 / cell_size_deg))
+        self.cell_size_deg = 360 / self.n_columns
+        self._grids = {None: {}}
+        self._locations = {}
+    
+    @classmethod
+    def from_rows(cls, rows, cell_size_deg=0.01):
+        """Build from (id, latitude, longitude, service_type) tuples"""
+        index = cls(cell_size_deg)
+        for provider_id, latitude, longitude, service_type in rows:
+            index.add(provider_id, latitude, longitude, service_type)
+        return index
+    
+    def __len__(self):
+        return len(self._locations)
+    
+    def __contains__(self, provider_id):
+        return provider_id in self._locations
+    
+    def _cell(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_size_deg),
+                math.floor(longitude / self.cell_size_deg) % self.n_columns)
+    
+    def add(self, provider_id, latitude, longitude, service_type=None):
+        """Insert or move a provider; providers without coordinates are skipped"""
+        self.remove(provider_id)
+        if latitude is None or longitude is None:
+            return
+        
+        cell = self._cell(latitude, longitude)
+        entry = (math.radians(latitude), math.radians(longitude))
+        for key in (None, service_type):
+            self._grids.setdefault(key, {}).setdefault(cell, {})[provider_id] = entry
+        self._locations[provider_id] = (cell, service_type)
+    
+    def remove(self, provider_id):
+        """Drop a provider from the index (no-op if absent)"""
+        location = self._locations.pop(provider_id, None)
+        if location is None:
+            return
+        
+        cell, service_type = location
+        for key in (None, service_type):
+            grid = self._grids.get(key, {})
+            bucket = grid.get(cell)
+            if bucket is not None:
+                bucket.pop(provider_id, None)
+                if not bucket:
+                    del grid[cell]
+    
+    def _ring(self, center, radius):
+        """Cells at Chebyshev distance `radius` from the center cell, longitudes wrapped"""
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        n = self.n_columns
+        for dj in range(-radius, radius + 1):
+            yield (ci - radius, (cj + dj) % n)
+            yield (ci + radius, (cj + dj) % n)
+        for di in range(-radius + 1, radius):
+            yield (ci + di, (cj - radius) % n)
+            yield (ci + di, (cj + radius) % n)
+    
+    def _distances(self, grid, cells, lat_rad, lon_rad):
+        """Provider ids and distances for every provider in the given cells"""
+        provider_ids = []
+        coordinates = []
+        for cell in cells:
+            bucket = grid.get(cell)
+            if bucket:
+                provider_ids.extend(bucket.keys())
+                coordinates.extend(bucket.values())
+        
+        if not provider_ids:
+            return np.array([], dtype=np.int64), np.array([])
+        
+        coordinates = np.array(coordinates)
+        distances = haversine_km_radians(lat_rad, lon_rad, coordinates[:, 0], coordinates[:, 1])
+        return np.array(provider_ids, dtype=np.int64), distances
+    
+    def query(self, latitude, longitude, radius_km, service_type=None, limit=None):
+        """
+        Providers within radius_km of a point, closest first
+        
+        Returns a list of (provider_id, distance_km) tuples, at most `limit`
+        long when a limit is given.
+        """
+        grid = self._grids.get(service_type or None)
+        if not grid or radius_km < 0:
+            return []
+        
+        lat_rad, lon_rad = math.radians(latitude), math.radians(longitude)
+        center = self._cell(latitude, longitude)
+        
+        # Narrowest cell width (km) within the radius; once rings 0..r are
+        # scanned, every unvisited provider is at least r widths away
+        max_lat = abs(latitude) + radius_km / KM_PER_DEGREE
+        cell_km = self.cell_size_deg * KM_PER_DEGREE * math.cos(math.radians(min(max_lat, 90.0)))
+        max_ring = int(math.ceil(radius_km / cell_km)) + 1 if max_lat < 90.0 else None
+        
+        if max_ring is None or (2 * max_ring + 1) ** 2 > len(grid):
+            # Around a pole (where rings would miss providers across it), in
+            # a sparse grid or with a huge radius, checking every populated
+            # cell is cheaper
+            rings = [list(grid.keys())]
+        else:
+            # Wide rings wrap around and would revisit cells
+            seen = set()
+            rings = (
+                [cell for cell in self._ring(center, r) if not (cell in seen or seen.add(cell))]
+                for r in range(max_ring + 1)
+            )
+        
+        found_ids = []
+        found_distances = []
+        n_found = 0
+        for r, cells in enumerate(rings):
+            provider_ids, distances = self._distances(grid, cells, lat_rad, lon_rad)
+            within = distances <= radius_km
+            found_ids.append(provider_ids[within])
+            found_distances.append(distances[within])
+            n_found += int(within.sum())
+            
+            # Stop once `limit` providers are closer than anything unvisited
+            if limit and n_found >= limit:
+                closest = np.partition(np.concatenate(found_distances), limit - 1)[limit - 1]
+                if closest <= r * cell_km:
+                    break
+        
+        if not n_found:
+            return []
+        
+        provider_ids = np.concatenate(found_ids)
+        distances = np.concatenate(found_distances)
+        order = np.lexsort((provider_ids, distances))
+        if limit:
+            order = order[:limit]
+        return [(int(provider_ids[i]), float(distances[i])) for i in order]
@@ -0,0 +1,133 @@
+"""
+Co-visitation counts ("users who interacted with X also hired Y")
+
+Compares CoVisitationIndex after a build and after online record() events
+with the brute-force product touched.T @ hired, checks the Space-Saving
+bounds of rows that evicted entries, and round-trips the index through
+HybridRecommender.save_model / load_model.
+"""
+import tempfile
+from collections import defaultdict
+from recommender import CoVisitationIndex, HybridRecommender, HIRE_INTERACTION_TYPES
+
+N_USERS = 150
+N_PROVIDERS = 40
+
+
+def event_tuples(interactions):
+    """(user_id, provider_id, interaction_type) rows"""
+    return [(i.user_id, i.provider_id, i.interaction_type) for i in interactions]
+
+
+def brute_force_counts(events):
+    """{(X, Y): number of users who touched X and hired Y}, X != Y"""
+    touched, hired = defaultdict(set), defaultdict(set)
+    for user_id, provider_id, interaction_type in events:
+        touched[user_id].add(provider_id)
+        if interaction_type in HIRE_INTERACTION_TYPES:
+            hired[user_id].add(provider_id)
+    counts = defaultdict(int)
+    for user_id, providers in touched.items():
+        for x in providers:
+            for y in hired[user_id] - {x}:
+                counts[x, y] += 1
+    return counts
+
+
+def build(events, k):
+    user_ids, provider_ids, types = zip(*events)
+    return CoVisitationIndex.build(user_ids, provider_ids, [t in HIRE_INTERACTION_TYPES for t in types], k=k)
+
+
+def record_all(index, history, events):
+    """Apply events through record(), passing each user's history before the event"""
+    touched, hired = defaultdict(set), defaultdict(set)
+    for user_id, provider_id, interaction_type in history:
+        touched[user_id].add(provider_id)
+        if interaction_type in HIRE_INTERACTION_TYPES:
+            hired[user_id].add(provider_id)
+    for user_id, provider_id, interaction_type in events:
+        index.record(provider_id, interaction_type, touched[user_id], hired[user_id])
+        touched[user_id].add(provider_id)
+        if interaction_type in HIRE_INTERACTION_TYPES:
+            hired[user_id].add(provider_id)
+    return index
+
+
+def stored_counts(index):
+    """{(X, Y): count} of every stored entry"""
+    return {
+        (x, y): count
+        for x, row_neighbors, row_counts in zip(index.provider_ids.tolist(), index.neighbors.tolist(),
+                                                index.counts.tolist())
+        for y, count in zip(row_neighbors, row_counts) if y >= 0
+    }
+
+
+def test_build_matches_brute_force(make_interactions):
+    events = event_tuples(make_interactions(2000, N_USERS, N_PROVIDERS, seed=0))
+    # Capacity 2k covers every provider, so nothing is dropped
+    assert stored_counts(build(events, k=N_PROVIDERS)) == brute_force_counts(events)
+    
+    # With a small k each row keeps its best counts
+    expected = brute_force_counts(events)
+    index = build(events, k=3)
+    for x in index.provider_ids.tolist():
+        provider_ids, counts = index.lookup(x, 3)
+        best = sorted((c for (a, _), c in expected.items() if a == x), reverse=True)[:len(counts)]
+        assert counts.tolist() == best
+        assert all(expected[x, y] == c for y, c in zip(provider_ids.tolist(), counts.tolist()))
+
+
+def test_record_matches_brute_force(make_interactions):
+    events = event_tuples(make_interactions(3000, N_USERS, N_PROVIDERS, seed=1))
+    history, stream = events[:2000], events[2000:]
+    index = record_all(build(history, k=N_PROVIDERS), history, stream)
+    assert stored_counts(index) == brute_force_counts(events)
+    
+    # From an empty index, including providers first seen online
+    assert stored_counts(record_all(CoVisitationIndex(k=N_PROVIDERS), [], events)) == brute_force_counts(events)
+
+
+def test_space_saving_bounds(make_interactions):
+    events = event_tuples(make_interactions(3000, N_USERS, N_PROVIDERS, seed=2))
+    history, stream = events[:500], events[500:]
+    index = record_all(build(history, k=2), history, stream)
+    expected = brute_force_counts(events)
+    
+    evicted = 0
+    for row, x in enumerate(index.provider_ids.tolist()):
+        # Rows are full and sorted, so the last count is the row's minimum
+        floor = index.counts[row, -1]
+        stored = {y: c for y, c in zip(index.neighbors[row].tolist(), index.counts[row].tolist()) if y >= 0}
+        for y, count in stored.items():
+            # Never an underestimate, overestimated by at most the row minimum
+            assert expected[x, y] <= count <= expected[x, y] + floor, (x, y)
+        for (a, y), count in expected.items():
+            if a == x and y not in stored:
+                # Anything left out is no more frequent than the weakest entry kept
+                assert count <= floor, (x, y)
+                evicted += 1
+    assert evicted
+
+
+def test_save_load_round_trip(make_interactions):
+    recommender = HybridRecommender()
+    recommender.build_user_provider_matrix(make_interactions(2000, N_USERS, N_PROVIDERS, seed=3), covisitation_k=5)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        recommender.save_model(directory)
+        loaded = HybridRecommender()
+        loaded.load_model(directory)
+        
+        assert loaded.covisitation.k == 5
+        for provider_id in range(1, N_PROVIDERS + 2):
+            assert loaded.also_hired(provider_id) == recommender.also_hired(provider_id)
+        
+        # Memory-mapped arrays still take online events
+        for model in (recommender, loaded):
+            model.record_covisitation(1, 'hire', {2, 3}, set())
+            model.record_covisitation(N_PROVIDERS + 1, 'view', set(), {1})
+        assert loaded.also_hired(2) == recommender.also_hired(2)
+        assert loaded.also_hired(N_PROVIDERS + 1) == [(1, 1)]
+
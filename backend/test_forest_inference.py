@@ -0,0 +1,131 @@
+"""
+Parity and latency of the flattened random forest (forest_inference.FlatForest)
+
+Fits a forest with ReliabilityClassifier's settings behind a StandardScaler
+and checks that FlatForest on raw features gives sklearn's probabilities
+for the scaled features, including rows placed exactly on split thresholds.
+
+Run with pytest, or directly for the latency benchmark:
+python test_forest_inference.py
+"""
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from forest_inference import FlatForest
+from ml_classifier import ReliabilityClassifier, round_features
+
+N_TRAIN = 5000
+BENCHMARK_ROWS = (1, 8, 32, 128, 512, 2048)
+
+
+def provider_features(n, seed):
+    """Random rows in ReliabilityClassifier.feature_names order"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, 30, n),         # experience_years
+        rng.uniform(1, 5, n),           # rating
+        rng.integers(0, 500, n),        # total_jobs
+        rng.uniform(0.3, 1, n),         # completion_rate
+        rng.uniform(0.5, 48, n),        # response_time
+        rng.integers(0, 2, n)           # verified
+    ]).astype(float)
+
+
+def fitted_forest(seed=0):
+    """Forest and scaler fitted as in ReliabilityClassifier.train_models"""
+    X = provider_features(N_TRAIN, seed)
+    noise = np.random.default_rng(seed).normal(0, 0.2, N_TRAIN)
+    y = np.digitize(X[:, 1] / 5 + X[:, 3] - X[:, 4] / 48 + noise, [0.9, 1.4])
+    
+    scaler = StandardScaler().fit(X)
+    forest = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        min_samples_split=5,
+        random_state=42,
+        class_weight='balanced'
+    ).fit(scaler.transform(X), y)
+    return forest, scaler, X
+
+
+def test_probabilities_match_sklearn():
+    forest, scaler, X_train = fitted_forest()
+    flat = FlatForest.from_sklearn(forest, scaler)
+    
+    X = np.vstack([X_train, provider_features(20000, seed=1)])
+    expected = forest.predict_proba(scaler.transform(X))
+    np.testing.assert_allclose(flat.predict_proba(X), expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(flat.predict(X), forest.predict(scaler.transform(X)))
+
+
+def test_rows_on_split_thresholds():
+    forest, scaler, X_train = fitted_forest()
+    flat = FlatForest.from_sklearn(forest, scaler)
+    
+    # Move one feature of a training row onto each (folded) split threshold
+    splits = np.flatnonzero(np.isfinite(flat.threshold))
+    rng = np.random.default_rng(2)
+    X = X_train[rng.integers(0, len(X_train), len(splits))].copy()
+    X[np.arange(len(splits)), flat.feature[splits]] = flat.threshold[splits]
+    
+    expected = forest.predict_proba(scaler.transform(X))
+    np.testing.assert_allclose(flat.predict_proba(X), expected, rtol=0, atol=1e-12)
+
+
+def test_classifier_small_and_large_batches_agree():
+    forest, scaler, _ = fitted_forest()
+    classifier = ReliabilityClassifier()
+    classifier.rf_model, classifier.scaler = forest, scaler
+    classifier.rf_flat = FlatForest.from_sklearn(forest, scaler)
+    
+    X = provider_features(1000, seed=3)
+    labels, probabilities = classifier.predict_batch(X)          # sklearn path
+    for start in range(0, len(X), 100):                           # flattened path
+        small_labels, small_probabilities = classifier.predict_batch(X[start:start + 100])
+        np.testing.assert_array_equal(small_labels, labels[start:start + 100])
+        np.testing.assert_allclose(small_probabilities, probabilities[start:start + 100], atol=1e-12)
+    
+    # Every path scores the features at FEATURE_DECIMALS precision
+    rounded = round_features(X)
+    np.testing.assert_array_equal(classifier.predict_batch(rounded)[1], probabilities)
+    for row in X[:50]:
+        provider = dict(zip(classifier.feature_names, row))
+        label, probability = (values[0] for values in classifier.predict_batch(np.array([row])))
+        assert classifier.predict_batch(pd.DataFrame([provider]))[0][0] == label
+        assert classifier.predict(provider) == classifier.format_prediction(label, probability)
+    assert classifier.predict(provider) == classifier.predict(provider)
+    assert classifier.prediction_cache.stats()['hits'] == 2
+
+
+def benchmark(repeat=200):
+    forest, scaler, _ = fitted_forest()
+    flat = FlatForest.from_sklearn(forest, scaler)
+    X = provider_features(max(BENCHMARK_ROWS), seed=4)
+    
+    print(f"{flat.n_nodes} nodes in {len(flat.roots)} trees, max depth {flat.max_depth}")
+    print(f"{'rows':>6}{'sklearn ms':>14}{'flat ms':>12}{'speedup':>10}")
+    for n in BENCHMARK_ROWS:
+        rows = X[:n]
+        reps = max(5, repeat // n)
+        
+        start = time.perf_counter()
+        for _ in range(reps):
+            forest.predict_proba(scaler.transform(rows))
+        sklearn_ms = (time.perf_counter() - start) / reps * 1000
+        
+        start = time.perf_counter()
+        for _ in range(reps):
+            flat.predict_proba(rows)
+        flat_ms = (time.perf_counter() - start) / reps * 1000
+        
+        print(f"{n:>6}{sklearn_ms:>14.3f}{flat_ms:>12.3f}{sklearn_ms / flat_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    test_probabilities_match_sklearn()
+    test_rows_on_split_thresholds()
+    test_classifier_small_and_large_batches_agree()
+    print("✓ Flattened forest matches sklearn\n")
+    benchmark()
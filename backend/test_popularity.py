@@ -0,0 +1,114 @@
+"""
+Incrementally maintained popularity lists (popularity.PopularityIndex)
+
+Applies random provider edits, hires and removals and checks every
+top() answer against a brute-force ranking of all providers, and that an
+index rebuilt from the final rows lists the same providers.
+"""
+import math
+import numpy as np
+from popularity import PopularityIndex, RATING_WEIGHT, HIRE_WEIGHT
+
+SERVICE_TYPES = ['Plumber', 'Electrician', 'Cleaner']
+CELL_SIZE = 0.05
+LIST_SIZE = 8
+LOCATIONS = [(13.01, 80.21), (13.06, 80.21), (13.01, 80.26)]
+
+
+def random_provider(rng):
+    """(service_type, latitude, longitude, rating); some without a location or rating"""
+    latitude, longitude = LOCATIONS[rng.integers(len(LOCATIONS))]
+    if rng.random() < 0.1:
+        latitude = longitude = None
+    rating = None if rng.random() < 0.05 else round(float(rng.uniform(1, 5)), 1)
+    return SERVICE_TYPES[rng.integers(len(SERVICE_TYPES))], latitude, longitude, rating
+
+
+class BruteForce:
+    """Scores every provider from scratch for each query"""
+    
+    def __init__(self):
+        self.providers = {}
+        self.hires = {}
+    
+    def score(self, provider_id):
+        rating = self.providers[provider_id][3] or 0.0
+        return RATING_WEIGHT * rating / 5.0 + HIRE_WEIGHT * math.log1p(self.hires.get(provider_id, 0))
+    
+    def cell(self, latitude, longitude):
+        if latitude is None:
+            return None
+        return (math.floor(latitude / CELL_SIZE), math.floor(longitude / CELL_SIZE))
+    
+    def ranking(self, service_type, cell):
+        return [
+            provider_id for _, provider_id in sorted(
+                (-self.score(provider_id), provider_id)
+                for provider_id, (st, latitude, longitude, _) in self.providers.items()
+                if service_type in (None, st) and (cell is None or self.cell(latitude, longitude) == cell)
+            )
+        ]
+    
+    def top(self, service_type, location, n):
+        provider_ids = self.ranking(service_type, self.cell(*location))[:n] if location else []
+        for provider_id in self.ranking(service_type, None)[:n]:
+            if len(provider_ids) >= n:
+                break
+            if provider_id not in provider_ids:
+                provider_ids.append(provider_id)
+        return provider_ids
+
+
+def check_queries(index, expected):
+    for service_type in [None] + SERVICE_TYPES:
+        for location in [None] + LOCATIONS:
+            for n in (1, 5, LIST_SIZE):
+                assert index.top(service_type, location, n) == expected.top(service_type, location, n), \
+                    (service_type, location, n)
+
+
+def test_random_updates_match_brute_force():
+    rng = np.random.default_rng(0)
+    expected = BruteForce()
+    for provider_id in range(1, 61):
+        expected.providers[provider_id] = random_provider(rng)
+    index = PopularityIndex.from_rows(
+        [(provider_id, st, lat, lon, rating) for provider_id, (st, lat, lon, rating) in expected.providers.items()],
+        cell_size_deg=CELL_SIZE, list_size=LIST_SIZE, half_life_days=None
+    )
+    check_queries(index, expected)
+    
+    next_id = 61
+    for step in range(600):
+        op = rng.random()
+        provider_ids = list(expected.providers)
+        if op < 0.45:
+            provider_id = provider_ids[rng.integers(len(provider_ids))]
+            count = int(rng.integers(1, 4))
+            index.record_hire(provider_id, count)
+            expected.hires[provider_id] = expected.hires.get(provider_id, 0) + count
+        elif op < 0.8:
+            # Edit an existing provider (which may lower its score) or add one
+            if rng.random() < 0.8:
+                provider_id = provider_ids[rng.integers(len(provider_ids))]
+            else:
+                provider_id, next_id = next_id, next_id + 1
+            expected.providers[provider_id] = random_provider(rng)
+            index.set_provider(provider_id, *expected.providers[provider_id])
+        elif len(provider_ids) > 20:
+            provider_id = provider_ids[rng.integers(len(provider_ids))]
+            index.remove_provider(provider_id)
+            del expected.providers[provider_id]
+            expected.hires.pop(provider_id, None)
+        if step % 20 == 0:
+            check_queries(index, expected)
+    check_queries(index, expected)
+    
+    rebuilt = PopularityIndex.from_rows(
+        [(provider_id, st, lat, lon, rating) for provider_id, (st, lat, lon, rating) in expected.providers.items()],
+        [(provider_id, count, None) for provider_id, count in expected.hires.items()],
+        cell_size_deg=CELL_SIZE, list_size=LIST_SIZE, half_life_days=None
+    )
+    check_queries(rebuilt, expected)
+    assert len(rebuilt) == len(index)
+
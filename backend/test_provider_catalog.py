@@ -0,0 +1,51 @@
+"""
+In-place provider edits of recommender.ProviderCatalog
+
+Applies random rating, location and service type edits with
+update_provider and checks the catalog and its cached partitions against
+a catalog rebuilt from the edited rows.
+"""
+import numpy as np
+from recommender import ProviderCatalog
+
+SERVICE_TYPES = ['Plumber', 'Electrician', 'Cleaner']
+
+
+def random_row(rng, provider_id):
+    rating = None if rng.random() < 0.1 else round(float(rng.uniform(1, 5)), 2)
+    latitude, longitude = (None, None) if rng.random() < 0.1 else (float(13 + rng.uniform(0, 0.3)),
+                                                                     float(80.1 + rng.uniform(0, 0.3)))
+    return (provider_id, rating, latitude, longitude, SERVICE_TYPES[rng.integers(len(SERVICE_TYPES))])
+
+
+def assert_same(catalog, expected):
+    order, expected_order = np.argsort(catalog.provider_ids), np.argsort(expected.provider_ids)
+    np.testing.assert_array_equal(catalog.provider_ids[order], expected.provider_ids[expected_order])
+    for name in ('ratings', 'lat_rad', 'lon_rad', 'service_type_codes'):
+        np.testing.assert_array_equal(getattr(catalog, name)[order], getattr(expected, name)[expected_order], name)
+    np.testing.assert_array_equal(catalog.top_rated(10), expected.top_rated(10))
+
+
+def test_updates_match_rebuild():
+    rng = np.random.default_rng(0)
+    rows = {provider_id: random_row(rng, provider_id) for provider_id in rng.permutation(np.arange(1, 301)).tolist()}
+    catalog = ProviderCatalog.from_rows(rows.values())
+    for service_type in SERVICE_TYPES:
+        catalog.partition(service_type)
+    
+    for step in range(200):
+        provider_id = int(rng.integers(1, 301))
+        rows[provider_id] = random_row(rng, provider_id)
+        assert catalog.update_provider(*rows[provider_id])
+        if step % 25 == 0:
+            # Partitions dropped by a type change are rebuilt from the patched rows
+            expected = ProviderCatalog.from_rows(rows.values())
+            assert_same(catalog, expected)
+            for service_type in SERVICE_TYPES:
+                assert_same(catalog.partition(service_type), expected.partition(service_type))
+    
+    # Unknown providers and service types are left to a rebuild
+    assert not catalog.update_provider(301, 4.0, 13.0, 80.2, 'Plumber')
+    assert not catalog.update_provider(1, 4.0, 13.0, 80.2, 'Gardener')
+    assert_same(catalog, ProviderCatalog.from_rows(rows.values()))
+
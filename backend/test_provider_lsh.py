@@ -0,0 +1,68 @@
+"""
+Saving and loading the provider LSH index (recommender.RandomProjectionLSH)
+
+Saves a recommender built with index='lsh' and checks that loading maps the
+saved hyperplanes and bucket tables instead of rehashing the providers,
+that the loaded index answers queries exactly like the original, and that
+lists longer than the precomputed ones stay within the service type.
+"""
+import tempfile
+import numpy as np
+from recommender import HybridRecommender, RandomProjectionLSH
+
+N_PROVIDERS = 2000
+
+
+def refuse_build(self, vectors):
+    raise AssertionError("LSH index rebuilt on load")
+
+
+def test_load_maps_saved_tables(make_providers):
+    recommender = HybridRecommender()
+    recommender.build_provider_features(make_providers(N_PROVIDERS), k=10, index='lsh', n_probes=3)
+    ann = recommender.provider_ann
+    
+    with tempfile.TemporaryDirectory() as directory:
+        recommender.save_model(directory)
+        
+        build = RandomProjectionLSH.build
+        RandomProjectionLSH.build = refuse_build
+        try:
+            loaded = HybridRecommender()
+            loaded.load_model(directory)
+        finally:
+            RandomProjectionLSH.build = build
+        loaded_ann = loaded.provider_ann
+        
+        assert isinstance(loaded_ann.vectors, np.memmap)
+        assert all(isinstance(order, np.memmap) for _, order in loaded_ann._tables)
+        assert loaded_ann.n_probes == 3 and len(loaded_ann) == N_PROVIDERS
+        for item in range(0, N_PROVIDERS, 37):
+            expected = ann.query(ann.vectors[item], k=15, exclude=item)
+            actual = loaded_ann.query(loaded_ann.vectors[item], k=15, exclude=item)
+            np.testing.assert_array_equal(actual[0], expected[0])
+            np.testing.assert_allclose(actual[1], expected[1], rtol=0, atol=1e-12)
+        for provider_id in (1, 2, 500):
+            assert loaded.content_based_filtering(provider_id, 30) == recommender.content_based_filtering(provider_id, 30)
+        
+        # Items added after loading land in the overflow buckets as before
+        item = loaded_ann.add(ann.vectors[5])
+        assert item in loaded_ann.query(ann.vectors[5], k=5)[0]
+
+
+def test_long_lists_keep_to_service_type(make_providers):
+    providers = make_providers(N_PROVIDERS)
+    # A rare service type has fewer providers than the list asks for
+    for provider in providers[-12:]:
+        provider.service_type = 'Locksmith'
+    recommender = HybridRecommender()
+    recommender.build_provider_features(providers, k=5, index='lsh', n_probes=3)
+    
+    service_types = {provider.id: provider.service_type for provider in providers}
+    for provider in providers[:50] + providers[-12:]:
+        similar = recommender.content_based_filtering(provider.id, 30)
+        # Every other locksmith, or a full list for the common types
+        assert len(similar) == (11 if provider.service_type == 'Locksmith' else 30), provider.id
+        assert provider.id not in similar
+        assert all(service_types[other] == provider.service_type for other in similar), provider.id
+
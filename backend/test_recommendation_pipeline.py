@@ -0,0 +1,87 @@
+"""
+Budgets of the two-stage recommendation pipeline (recommendation_pipeline)
+
+Checks that the bounded candidate generators propose the same providers
+as scoring the whole partition, that time spent waiting for a pool worker
+does not count against a stage's budget, and that a generator running
+past its budget stops and frees its worker.
+"""
+import threading
+import time
+import numpy as np
+from recommendation_pipeline import RecommendationPipeline, StageCancelled
+
+N_CANDIDATES = 50
+
+
+def request_for(pipeline, user_id, catalog, service_type):
+    return {
+        'user_id': user_id, 'part': catalog.partition(service_type), 'user_location': None,
+        'service_type': service_type, 'spatial_index': None, 'cancelled': threading.Event()
+    }
+
+
+def check_generators_match_partition_scores(recommender, catalog, user_ids):
+    pipeline = RecommendationPipeline(recommender, candidates_per_source=N_CANDIDATES)
+    deadline = time.perf_counter() + 60
+    for service_type in (None, 'Plumber'):
+        for user_id in user_ids[:50]:
+            request = request_for(pipeline, user_id, catalog, service_type)
+            part = request['part']
+            for name, scores in (('neighbors', recommender.collaborative_scores(user_id, part)),
+                                 ('content', recommender.content_scores(user_id, part))):
+                expected = pipeline._top_positive(part, scores, N_CANDIDATES)
+                actual = pipeline.generators[name](request, N_CANDIDATES, deadline)
+                # Same providers; ties at the cut may fall either way
+                assert len(actual) == len(expected)
+                kept = scores[part.positions(actual)]
+                assert np.allclose(np.sort(kept), np.sort(scores[part.positions(expected)])), (name, user_id)
+    pipeline.executor.shutdown()
+
+
+def test_generators_match_partition_scores(make_model):
+    check_generators_match_partition_scores(*make_model('neighborhood'))
+    check_generators_match_partition_scores(*make_model('svd'))
+
+
+def test_queue_wait_does_not_count_against_budget(make_model):
+    recommender, catalog, user_ids = make_model()
+    pipeline = RecommendationPipeline(recommender, workers=1,
+                                      budgets_ms={'queue': 2000, 'candidates': 200, 'rerank': 200})
+    # The only worker is busy for longer than the candidates budget
+    pipeline.executor.submit(time.sleep, 0.3)
+    result = pipeline.recommend(user_ids[0], catalog, n_recommendations=10)
+    assert not result.degraded, result.to_dict()
+    assert len(result.provider_ids) == 10
+    pipeline.executor.shutdown()
+
+
+def test_slow_generator_stops_at_deadline(make_model):
+    recommender, catalog, user_ids = make_model('svd')
+    pipeline = RecommendationPipeline(recommender, workers=2, budgets_ms={'queue': 50, 'candidates': 20})
+    stopped = threading.Event()
+    
+    def slow(request, n, deadline):
+        try:
+            while True:
+                pipeline._check(request, deadline)
+                time.sleep(0.001)
+        except StageCancelled:
+            stopped.set()
+            raise
+    
+    pipeline.generators['content'] = slow
+    result = pipeline.recommend(user_ids[0], catalog, n_recommendations=10)
+    assert result.skipped == ['content'] and len(result.provider_ids) == 10
+    assert stopped.wait(1)
+    
+    # A generator already past its deadline stops before scoring a block
+    request = request_for(pipeline, user_ids[0], catalog, None)
+    try:
+        pipeline._factor_candidates(request, N_CANDIDATES, time.perf_counter() - 1)
+    except StageCancelled:
+        pass
+    else:
+        raise AssertionError("expired generator kept running")
+    pipeline.executor.shutdown()
+
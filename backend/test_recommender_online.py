@@ -0,0 +1,213 @@
+"""
+Online updates of the recommender (HybridRecommender.update_interaction)
+
+Checks that interaction events applied one by one give the same matrix and
+the same neighbor lists for the updated users as a rebuild from all
+events, that recommendations can be read while updates are merged, and
+that a loaded model reads and updates its memory-mapped column arrays
+instead of converting the matrix.
+"""
+import sys
+import tempfile
+import threading
+from types import SimpleNamespace
+import numpy as np
+from scipy import sparse
+from recommender import HybridRecommender, ProviderCatalog, SparseInteractionMatrix
+
+N_USERS = 300
+N_PROVIDERS = 200
+
+
+def trained_model(interactions, k=10):
+    recommender = HybridRecommender()
+    recommender.build_user_provider_matrix(interactions)
+    recommender.build_user_neighbors(k=k)
+    return recommender
+
+
+def dense_by_id(matrix):
+    """{(user_id, provider_id): score} of a SparseInteractionMatrix's nonzero cells"""
+    coo = matrix.full_matrix().tocoo()
+    return {
+        (matrix.user_ids[row], matrix.provider_ids[col]): score
+        for row, col, score in zip(coo.row, coo.col, coo.data) if score
+    }
+
+
+def neighbors_by_id(recommender, user_id, n=10):
+    """{neighbor user_id: similarity} of a user's neighbor list"""
+    rows, scores = recommender.similar_users(user_id, n)
+    user_ids = recommender.user_provider_matrix.user_ids
+    return {user_ids[row]: score for row, score in zip(rows.tolist(), scores.tolist())}
+
+
+def test_updates_match_rebuild(make_interactions):
+    base = make_interactions(3000, N_USERS, N_PROVIDERS, seed=0)
+    # New users and providers as well as cells already in the matrix
+    updates = make_interactions(400, N_USERS, N_PROVIDERS, seed=1) + [
+        SimpleNamespace(user_id=N_USERS + 1, provider_id=1, interaction_type='hire', interaction_count=1),
+        SimpleNamespace(user_id=2, provider_id=N_PROVIDERS + 1, interaction_type='view', interaction_count=1)
+    ]
+    
+    online = trained_model(base)
+    for event in updates:
+        online.update_interaction(event.user_id, event.provider_id, event.interaction_type)
+    rebuilt = trained_model(base + updates)
+    
+    expected = dense_by_id(rebuilt.user_provider_matrix)
+    actual = dense_by_id(online.user_provider_matrix)
+    assert actual.keys() == expected.keys()
+    for cell, score in expected.items():
+        assert np.isclose(actual[cell], score), cell
+    
+    # An updated user's own list is recomputed exactly
+    expected = neighbors_by_id(rebuilt, updates[-1].user_id)
+    actual = neighbors_by_id(online, updates[-1].user_id)
+    assert actual.keys() == expected.keys()
+    for user_id, score in expected.items():
+        assert np.isclose(actual[user_id], score), user_id
+
+
+def mapped(array):
+    """Whether the array is a view of a memory-mapped file"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def refuse_tocsc(self, copy=False):
+    raise AssertionError("interaction matrix converted to CSC")
+
+
+def test_loaded_matrix_keeps_mapped_columns(make_interactions):
+    base = make_interactions(3000, N_USERS, N_PROVIDERS, seed=6)
+    # Enough new cells, users and providers to be merged more than once
+    updates = make_interactions(4000, N_USERS + 30, N_PROVIDERS + 30, seed=7)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        trained_model(base).save_model(directory)
+        loaded = HybridRecommender()
+        loaded.load_model(directory)
+        matrix = loaded.user_provider_matrix
+        assert mapped(matrix.column_major().indices) and mapped(matrix.column_major().data)
+        
+        tocsc = sparse.csr_matrix.tocsc
+        sparse.csr_matrix.tocsc = refuse_tocsc
+        try:
+            stored_nnz = matrix.matrix.nnz
+            for i, event in enumerate(updates):
+                loaded.update_interaction(event.user_id, event.provider_id, event.interaction_type)
+                if i % 400 == 0:
+                    # Column reads (stored cells plus the overlay) agree with row reads
+                    everyone = np.arange(matrix.shape[0])
+                    columns = matrix.column_block(np.arange(matrix.shape[1]))
+                    assert (columns != matrix.rows(everyone)).nnz == 0, i
+                    loaded.similar_users(event.user_id)
+            assert matrix.matrix.nnz > stored_nnz
+            compacted = matrix.full_matrix()
+        finally:
+            sparse.csr_matrix.tocsc = tocsc
+        # Compaction merged the overlay into the column arrays too
+        assert (matrix.column_major().tocsr() != compacted).nnz == 0
+        assert matrix.column_major().has_sorted_indices
+    
+    expected = dense_by_id(trained_model(base + updates).user_provider_matrix)
+    actual = dense_by_id(matrix)
+    assert actual.keys() == expected.keys()
+    for cell, score in expected.items():
+        assert np.isclose(actual[cell], score), cell
+
+
+def test_pending_cells_visible_before_compact():
+    matrix = SparseInteractionMatrix.from_triplets([1, 1, 2], [10, 11, 10], [1.0, 2.0, 3.0])
+    matrix.add(1, 12, 5.0)
+    matrix.add(3, 10, 1.0)
+    assert matrix._n_pending
+    cols, scores = matrix.row_entries(matrix.user_index[1])
+    assert dict(zip(matrix.provider_ids[cols].tolist(), scores.tolist())) == {10: 1.0, 11: 2.0, 12: 5.0}
+    assert matrix.full_matrix().shape == (3, 3)
+    assert not matrix._n_pending
+
+
+def test_reads_during_concurrent_updates(make_interactions):
+    recommender = trained_model(make_interactions(3000, N_USERS, N_PROVIDERS, seed=2))
+    rng = np.random.default_rng(3)
+    catalog = ProviderCatalog.from_rows([
+        (i, float(rng.uniform(2, 5)), 13.0, 80.2, 'Plumber') for i in range(1, N_PROVIDERS + 50)
+    ])
+    errors = []
+    done = threading.Event()
+    
+    def write(seed):
+        try:
+            for event in make_interactions(1500, N_USERS, N_PROVIDERS, seed):
+                # Fresh users and providers keep the pending overlay busy
+                recommender.update_interaction(event.user_id + N_USERS * seed, event.provider_id + seed,
+                                               event.interaction_type)
+        except Exception as e:
+            errors.append(e)
+    
+    def read():
+        try:
+            while not done.is_set():
+                recommender.recommend_ids(int(rng.integers(1, N_USERS + 1)), catalog, n_recommendations=5)
+                recommender.user_provider_matrix.column_block(np.arange(N_PROVIDERS))
+        except Exception as e:
+            errors.append(e)
+    
+    writers = [threading.Thread(target=write, args=(seed,)) for seed in (4, 5)]
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    # Switch threads often so readers land inside a merge
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    
+    assert not errors, errors
+    matrix = recommender.user_provider_matrix
+    assert matrix.full_matrix().shape == matrix.shape
+
+
+def test_compact_during_adds_loses_no_cells():
+    matrix = SparseInteractionMatrix.from_triplets([1], [1], [1.0])
+    n_adds = 20000
+    errors = []
+    done = threading.Event()
+    
+    def read():
+        try:
+            while not done.is_set():
+                matrix.column_block(np.arange(1))
+                matrix.row_norms()
+        except Exception as e:
+            errors.append(e)
+    
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for thread in readers:
+            thread.start()
+        for i in range(n_adds):
+            # New users and providers always go to the pending overlay
+            matrix.add(i + 2, i % 500 + 2, 1.0)
+        done.set()
+        for thread in readers:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    
+    assert not errors, errors
+    assert matrix.full_matrix().sum() == n_adds + 1
+
@@ -0,0 +1,86 @@
+"""
+Top-10 stability of reduced-precision recommender models
+
+Trains one float64 model on synthetic data and checks that its float32,
+float16 and int8 copies (converted in memory and saved/loaded as
+artifacts) recommend nearly the same top-10 providers per user.
+
+With pytest -s, prints the overlap and model size of each precision.
+"""
+import os
+import tempfile
+import numpy as np
+from recommender import HybridRecommender, RECOMMENDER_PRECISIONS
+
+TOP_N = 10
+
+# Minimum mean overlap of a user's top-10 with the float64 top-10
+MIN_OVERLAP = {
+    'float32': 0.99,
+    'float16': 0.97,
+    'int8': 0.93
+}
+
+
+def top_10(recommender, catalog, user_ids):
+    location = (13.15, 80.25)
+    return [set(recommender.recommend_ids(user_id, catalog, location, None, TOP_N)) for user_id in user_ids]
+
+
+def mean_overlap(expected, actual):
+    return np.mean([len(a & b) / TOP_N for a, b in zip(expected, actual)])
+
+
+def model_bytes(recommender):
+    return sum(array.nbytes for array in recommender._model_arrays().values())
+
+
+def check_precisions(make_model, engine):
+    recommender, catalog, user_ids = make_model(engine)
+    expected = top_10(recommender, catalog, user_ids)
+    full_bytes = model_bytes(recommender)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        recommender.save_model(directory)
+        results = {}
+        for precision in MIN_OVERLAP:
+            loaded = HybridRecommender()
+            loaded.load_model(directory, precision=precision)
+            assert loaded.precision == precision
+            
+            # A model saved at reduced precision loads back with the same dtypes
+            loaded.save_model(os.path.join(directory, precision))
+            reloaded = HybridRecommender()
+            reloaded.load_model(os.path.join(directory, precision))
+            float_dtype, score_dtype = RECOMMENDER_PRECISIONS[precision]
+            assert reloaded.user_provider_matrix.matrix.dtype == float_dtype
+            assert reloaded.provider_neighbors.scores.dtype == score_dtype
+            
+            overlap = mean_overlap(expected, top_10(reloaded, catalog, user_ids))
+            results[precision] = (overlap, full_bytes / model_bytes(reloaded))
+            assert overlap >= MIN_OVERLAP[precision], (precision, overlap)
+    
+    print(f"\n{engine} engine")
+    print(f"  {'precision':<10}{'top-10 overlap':>16}{'size vs float64':>18}")
+    for precision, (overlap, ratio) in results.items():
+        print(f"  {precision:<10}{overlap:>16.3f}{ratio:>17.2f}x")
+
+
+def test_neighborhood_top_10_stable(make_model):
+    check_precisions(make_model, 'neighborhood')
+
+
+def test_svd_top_10_stable(make_model):
+    check_precisions(make_model, 'svd')
+
+
+def test_online_update_on_reduced_precision(make_model):
+    recommender, catalog, user_ids = make_model()
+    recommender.set_precision('int8')
+    recommender.update_interaction(user_ids[0], 1, 'hire')
+    # A user the model has not seen
+    recommender.update_interaction(max(recommender.user_provider_matrix.user_ids) + 1, 2, 'view')
+    assert recommender.user_neighbors.scores.dtype == np.int8
+    assert recommender.user_provider_matrix.matrix.dtype == np.float32
+    assert len(recommender.recommend_ids(user_ids[0], catalog, n_recommendations=TOP_N)) == TOP_N
+
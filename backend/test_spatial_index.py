@@ -0,0 +1,90 @@
+"""
+Radius search of the provider location index (spatial_index.ProviderSpatialIndex)
+
+Adds, moves and removes random providers clustered around Chennai, both
+poles and the antimeridian, and checks every query() answer, with and
+without a service type and a limit, against a brute-force haversine scan
+of all providers.
+"""
+import numpy as np
+from spatial_index import ProviderSpatialIndex
+from utils.geo_utils import haversine_km
+
+SERVICE_TYPES = ['Plumber', 'Electrician', 'Cleaner']
+CENTERS = [(13.05, 80.25), (89.995, 0.0), (-89.99, 120.0), (10.0, 179.995), (-45.0, -179.99)]
+RADII_KM = [0.5, 2.0, 10.0, 50.0]
+
+
+def random_location(rng):
+    latitude, longitude = CENTERS[rng.integers(len(CENTERS))]
+    latitude = float(np.clip(latitude + rng.normal(0, 0.03), -90, 90))
+    longitude = float((longitude + rng.normal(0, 0.03) + 180) % 360 - 180)
+    return latitude, longitude
+
+
+def brute_force(locations, latitude, longitude, radius_km, service_type, limit):
+    provider_ids = [provider_id for provider_id, (_, _, st) in locations.items() if service_type in (None, st)]
+    if not provider_ids:
+        return []
+    latitudes, longitudes = np.array([locations[provider_id][:2] for provider_id in provider_ids]).T
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    found = sorted((d, provider_id) for provider_id, d in zip(provider_ids, distances.tolist()) if d <= radius_km)
+    return [(provider_id, d) for d, provider_id in found][:limit]
+
+
+def check_queries(index, locations, rng):
+    for latitude, longitude in [random_location(rng) for _ in range(15)]:
+        for radius_km in RADII_KM:
+            for service_type in (None, SERVICE_TYPES[0]):
+                for limit in (None, 1, 5):
+                    actual = index.query(latitude, longitude, radius_km, service_type=service_type, limit=limit)
+                    expected = brute_force(locations, latitude, longitude, radius_km, service_type, limit)
+                    assert [p for p, _ in actual] == [p for p, _ in expected], \
+                        (latitude, longitude, radius_km, service_type, limit)
+                    assert np.allclose([d for _, d in actual], [d for _, d in expected])
+
+
+def test_queries_match_brute_force():
+    rng = np.random.default_rng(0)
+    locations = {}
+    index = ProviderSpatialIndex()
+    for provider_id in range(1, 1501):
+        locations[provider_id] = random_location(rng) + (SERVICE_TYPES[rng.integers(len(SERVICE_TYPES))],)
+        index.add(provider_id, *locations[provider_id])
+    assert len(index) == len(locations)
+    check_queries(index, locations, rng)
+    
+    next_id = 1501
+    for step in range(6):
+        for _ in range(200):
+            provider_ids = list(locations)
+            op = rng.random()
+            if op < 0.4:
+                # Move an existing provider, possibly to another service type
+                provider_id = provider_ids[rng.integers(len(provider_ids))]
+            elif op < 0.6:
+                provider_id, next_id = next_id, next_id + 1
+            elif op < 0.7:
+                # Providers without coordinates are dropped from the index
+                provider_id = provider_ids[rng.integers(len(provider_ids))]
+                index.add(provider_id, None, None, SERVICE_TYPES[0])
+                del locations[provider_id]
+                continue
+            else:
+                provider_id = provider_ids[rng.integers(len(provider_ids))]
+                index.remove(provider_id)
+                del locations[provider_id]
+                continue
+            locations[provider_id] = random_location(rng) + (SERVICE_TYPES[rng.integers(len(SERVICE_TYPES))],)
+            index.add(provider_id, *locations[provider_id])
+        assert len(index) == len(locations) and all(provider_id in index for provider_id in locations)
+        check_queries(index, locations, rng)
+
+
+def test_query_across_antimeridian():
+    index = ProviderSpatialIndex.from_rows([(1, 0.0, 179.999, 'Plumber'), (2, 0.0, -179.999, 'Plumber')])
+    # Neighbors across the antimeridian are about 220 m apart
+    assert [p for p, _ in index.query(0.0, 179.999, 1.0)] == [1, 2]
+    assert [p for p, _ in index.query(0.0, -179.999, 1.0, limit=1)] == [2]
+    assert sorted(p for p, _ in index.query(0.0, 180.0, 0.2, service_type='Plumber')) == [1, 2]
+
@@ -0,0 +1,101 @@
+"""
+Resuming an interrupted TrainingPipeline run
+
+Interrupts a training run with time decay after the user neighbor blocks
+are checkpointed, reruns it later and checks that the rerun reuses every
+checkpointed block, builds the same model as an uninterrupted run and
+leaves no checkpoints behind, and that each stage reports its own peak
+RSS rather than the process's high-water mark.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+from recommender import NeighborIndex
+from training_pipeline import TrainingPipeline, rss_mb
+
+N_USERS = 400
+N_PROVIDERS = 120
+BLOCK_SIZE = 64
+
+
+@contextmanager
+def counted_blocks():
+    """Rows of the matrix of every neighbor block computed (in-process, workers=1)"""
+    block_top_k = NeighborIndex.block_top_k
+    calls = []
+    
+    def counting(normalized, transposed, start, end, k):
+        calls.append(normalized.shape[0])
+        return block_top_k(normalized, transposed, start, end, k)
+    
+    NeighborIndex.block_top_k = counting
+    try:
+        yield calls
+    finally:
+        NeighborIndex.block_top_k = block_top_k
+
+
+@contextmanager
+def working_directory(path):
+    """train() saves to models/ under the current directory"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def train(checkpoint_dir, interactions, providers):
+    pipeline = TrainingPipeline(workers=1, checkpoint_dir=checkpoint_dir, block_size=BLOCK_SIZE)
+    return pipeline.train(interactions, providers, n_neighbors=10, n_provider_neighbors=5, half_life_days=90)
+
+
+def test_resume_with_decay(make_interactions, make_providers):
+    interactions = make_interactions(4000, N_USERS, N_PROVIDERS, interaction_types=['view'], max_count=3, days=365)
+    providers = make_providers(N_PROVIDERS)
+    
+    with tempfile.TemporaryDirectory() as directory, working_directory(directory):
+        checkpoint_dir = os.path.join(directory, 'checkpoints')
+        # Left behind by a run on other data
+        os.makedirs(os.path.join(checkpoint_dir, 'user_neighbors-0123456789abcdef'))
+        
+        # Interrupted in the provider stage, after the user blocks were saved
+        try:
+            train(checkpoint_dir, interactions, None)
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("training without providers should fail")
+        assert os.path.exists(os.path.join(checkpoint_dir, 'decay_epoch'))
+        
+        # The rerun happens later, but weights interactions from the first attempt's epoch
+        with counted_blocks() as calls:
+            resumed = train(checkpoint_dir, interactions, providers)
+        # Only the per-service-type provider blocks are computed again
+        assert calls and max(calls) < N_PROVIDERS, calls
+        assert os.listdir(checkpoint_dir) == []
+        
+        fresh = train(None, interactions, providers)
+    
+    np.testing.assert_array_equal(resumed.user_neighbors.neighbors, fresh.user_neighbors.neighbors)
+    np.testing.assert_allclose(resumed.user_neighbors.scores, fresh.user_neighbors.scores, atol=1e-12)
+
+
+def test_stage_peak_rss_is_per_stage():
+    if rss_mb() is None:
+        return  # no /proc to sample
+    pipeline = TrainingPipeline(workers=1)
+    with pipeline.stage('heavy'):
+        block = np.ones(64 * 2**20 // 8)
+        time.sleep(0.05)  # long enough to be sampled
+        del block
+    with pipeline.stage('light'):
+        pass
+    heavy, light = pipeline.stages
+    # The lifetime high-water mark would report the heavy stage's peak again
+    assert heavy['rss_growth_mb'] >= 50, heavy
+    assert light['peak_rss_mb'] < heavy['peak_rss_mb'] - 50 and light['rss_growth_mb'] < 10, (heavy, light)
+
@@ -0,0 +1,51 @@
+from sqlalchemy import select, func
+from models import db, ServiceProvider, UserProviderInteraction
+
+# Rows fetched per round trip when streaming the interactions table
+INTERACTION_CHUNK_SIZE = 50000
+
+
+def count_interactions():
+    """Number of interaction rows (used to preallocate the streaming build)"""
+    return db.session.execute(select(func.count(UserProviderInteraction.id))).scalar() or 0
+
+
+def iter_interaction_chunks(chunk_size=INTERACTION_CHUNK_SIZE):
+    """
+    Stream (user_id, provider_id, interaction_type, interaction_count,
+    last_interaction) rows in chunks of chunk_size
+    
+    Only these columns are selected, through SQLAlchemy Core with a
+    server-side cursor (yield_per), so no ORM objects are created and at
+    most one chunk of rows is held at a time.
+    """
+    statement = select(
+        UserProviderInteraction.user_id,
+        UserProviderInteraction.provider_id,
+        UserProviderInteraction.interaction_type,
+        UserProviderInteraction.interaction_count,
+        UserProviderInteraction.last_interaction
+    ).execution_options(yield_per=chunk_size)
+    
+    result = db.session.execute(statement)
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def provider_rows():
+    """Provider columns needed for recommender features and classifier training data"""
+    statement = select(
+        ServiceProvider.id,
+        ServiceProvider.service_type,
+        ServiceProvider.rating,
+        ServiceProvider.experience_years,
+        ServiceProvider.total_jobs,
+        ServiceProvider.completion_rate,
+        ServiceProvider.response_time,
+        ServiceProvider.verified,
+        ServiceProvider.reliability_score
+    ).order_by(ServiceProvider.id)
+    return db.session.execute(statement).all()
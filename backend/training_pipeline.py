@@ -0,0 +1,307 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+from scipy import sparse
+from recommender import NeighborIndex, train_recommender
+
+try:
+    import resource
+except ImportError:  # Windows: worker peak RSS is not reported
+    resource = None
+
+# Per-process state of the neighbor block workers, set up once by _init_worker
+_worker_segments = []
+_worker_normalized = None
+_worker_transposed = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_mb():
+    """Current resident set size in MB of this process (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * PAGE_SIZE / 2**20, 1)
+
+
+def lifetime_peak_rss_mb():
+    """Highest RSS in MB this process has reached since it started"""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # ru_maxrss is in KB on Linux
+
+
+class RSSSampler:
+    """Highest RSS of this process while the block runs, sampled every `interval` seconds
+    
+    ru_maxrss only ever grows over the life of the process, so it can't tell
+    one stage's peak from an earlier, heavier one. Spikes shorter than the
+    interval can be missed.
+    """
+    
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def _sample(self):
+        rss = rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+    
+    def __enter__(self):
+        self.start_mb = self.peak_mb = rss_mb()
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        return False
+
+
+def _share_arrays(arrays):
+    """Copy arrays into new shared memory segments; returns (segments, specs for _attach)"""
+    segments = []
+    specs = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        segments.append(segment)
+        specs[name] = (segment.name, array.shape, array.dtype.str)
+    return segments, specs
+
+
+def _attach(specs):
+    """Zero-copy array views of segments created by _share_arrays"""
+    arrays = {}
+    for name, (segment_name, shape, dtype) in specs.items():
+        # Workers share the parent's resource tracker, which unlinks the
+        # segment only when the parent does
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _worker_segments.append(segment)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    return arrays
+
+
+def _init_worker(specs, shape):
+    """Rebuild the normalized matrix and its transpose on top of shared memory"""
+    global _worker_normalized, _worker_transposed
+    arrays = _attach(specs)
+    if 'dense' in arrays:
+        _worker_normalized = arrays['dense']
+        _worker_transposed = _worker_normalized.T
+    else:
+        _worker_normalized = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False
+        )
+        _worker_transposed = sparse.csr_matrix(
+            (arrays['t_data'], arrays['t_indices'], arrays['t_indptr']),
+            shape=(shape[1], shape[0]), copy=False
+        )
+
+
+def _compute_block(start, end, k):
+    neighbors, scores = NeighborIndex.block_top_k(
+        _worker_normalized, _worker_transposed, start, end, k
+    )
+    # Workers live for one index build, so their lifetime peak is this stage's
+    return start, end, neighbors, scores, lifetime_peak_rss_mb()
+
+
+class TrainingPipeline:
+    """Parallel, resumable recommender training
+    
+    Runs train_recommender's stages, but neighbor indexes (users,
+    and providers per service type with the exact index) are computed as
+    row blocks across a process pool. The normalized matrix is placed in
+    shared memory once, so workers read it without copies or pickling, and
+    each finished block is written to `checkpoint_dir`. A rerun on the same
+    data and parameters only computes the blocks that are missing; the
+    checkpoints (and those left by earlier runs on other data) are removed
+    once the model is saved. With time decay the first attempt's decay
+    epoch is kept next to the blocks, so a rerun weights the interactions
+    exactly as before and finds its checkpoints again. Wall time, the
+    peak RSS reached during the stage, its growth over the RSS the stage
+    started with, and the largest worker's peak RSS are recorded per stage.
+    """
+    
+    def __init__(self, workers=None, checkpoint_dir=None, block_size=1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_dir = checkpoint_dir
+        self.block_size = block_size
+        self.stages = []
+        self._checkpoint_names = set()
+        self._worker_peak_mb = None
+    
+    @contextmanager
+    def stage(self, name):
+        """Record wall time and peak RSS of the enclosed work"""
+        print(f"{name}...")
+        self._worker_peak_mb = None
+        start = time.perf_counter()
+        with RSSSampler() as sampler:
+            yield
+        record = {
+            'stage': name,
+            'seconds': round(time.perf_counter() - start, 2),
+            'peak_rss_mb': sampler.peak_mb,
+            'rss_growth_mb': (round(sampler.peak_mb - sampler.start_mb, 1)
+                              if sampler.start_mb is not None else None),
+            'worker_peak_rss_mb': self._worker_peak_mb
+        }
+        self.stages.append(record)
+        print(f"  ✓ {record['seconds']}s, peak RSS {record['peak_rss_mb']} MB "
+              f"(+{record['rss_growth_mb']} MB)")
+    
+    def report(self):
+        """Print the per-stage table and return it"""
+        print(f"\n{'stage':<36}{'seconds':>10}{'peak RSS MB':>14}{'growth MB':>12}{'workers MB':>12}")
+        for record in self.stages:
+            print(f"{record['stage']:<36}{record['seconds']:>10}{str(record['peak_rss_mb']):>14}"
+                  f"{str(record['rss_growth_mb']):>12}{str(record['worker_peak_rss_mb']):>12}")
+        print(f"{'total':<36}{round(sum(r['seconds'] for r in self.stages), 2):>10}")
+        return self.stages
+    
+    def _checkpoint_path(self, name, normalized, k, blocks):
+        """Directory for one index build, keyed on its input and parameters"""
+        if self.checkpoint_dir is None:
+            return None
+        
+        digest = hashlib.sha1(repr((normalized.shape, k, blocks[0] if blocks else None)).encode())
+        arrays = ((normalized.data, normalized.indices, normalized.indptr)
+                  if sparse.issparse(normalized) else (normalized,))
+        for array in arrays:
+            digest.update(memoryview(np.ascontiguousarray(array)).cast('B'))
+        
+        path = os.path.join(self.checkpoint_dir, f"{name}-{digest.hexdigest()[:16]}")
+        os.makedirs(path, exist_ok=True)
+        self._checkpoint_names.add(name)
+        return path
+    
+    def _decay_epoch(self):
+        """Decay epoch of the interrupted run being resumed, else now (kept for a later resume)"""
+        now = datetime.utcnow()
+        if self.checkpoint_dir is None:
+            return now
+        
+        path = os.path.join(self.checkpoint_dir, 'decay_epoch')
+        if os.path.exists(path):
+            with open(path) as f:
+                return datetime.fromisoformat(f.read().strip())
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(now.isoformat())
+        return now
+    
+    def _remove_checkpoints(self):
+        """Delete the block checkpoints of every index built, including stale ones from other data"""
+        if self.checkpoint_dir is None or not os.path.isdir(self.checkpoint_dir):
+            return
+        for entry in os.listdir(self.checkpoint_dir):
+            if entry.rpartition('-')[0] in self._checkpoint_names:
+                shutil.rmtree(os.path.join(self.checkpoint_dir, entry), ignore_errors=True)
+        epoch_path = os.path.join(self.checkpoint_dir, 'decay_epoch')
+        if os.path.exists(epoch_path):
+            os.remove(epoch_path)
+        self._checkpoint_names = set()
+    
+    @staticmethod
+    def _save_block(path, start, neighbors, scores):
+        temp_path = os.path.join(path, f"{start}.npz.tmp")
+        with open(temp_path, 'wb') as f:
+            np.savez(f, neighbors=neighbors, scores=scores)
+        os.replace(temp_path, os.path.join(path, f"{start}.npz"))
+    
+    def neighbor_index(self, matrix, k=20, name='neighbors'):
+        """NeighborIndex.build, with row blocks computed in parallel and checkpointed"""
+        normalized, transposed = NeighborIndex.prepare(matrix)
+        n_rows = normalized.shape[0]
+        neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+        scores = np.zeros((n_rows, k))
+        blocks = NeighborIndex.blocks(normalized, self.block_size)
+        
+        checkpoint_path = self._checkpoint_path(name, normalized, k, blocks)
+        pending = []
+        for start, end in blocks:
+            block_file = checkpoint_path and os.path.join(checkpoint_path, f"{start}.npz")
+            if block_file and os.path.exists(block_file):
+                with np.load(block_file) as saved:
+                    neighbors[start:end], scores[start:end] = saved['neighbors'], saved['scores']
+            else:
+                pending.append((start, end))
+        if len(pending) < len(blocks):
+            print(f"  resuming {name}: {len(blocks) - len(pending)}/{len(blocks)} blocks checkpointed")
+        
+        def finish(start, end, block_neighbors, block_scores):
+            neighbors[start:end], scores[start:end] = block_neighbors, block_scores
+            if checkpoint_path:
+                self._save_block(checkpoint_path, start, block_neighbors, block_scores)
+        
+        if self.workers <= 1 or len(pending) <= 1:
+            for start, end in pending:
+                finish(start, end, *NeighborIndex.block_top_k(normalized, transposed, start, end, k))
+            return NeighborIndex(neighbors, scores)
+        
+        if sparse.issparse(normalized):
+            arrays = {
+                'data': normalized.data, 'indices': normalized.indices, 'indptr': normalized.indptr,
+                't_data': transposed.data, 't_indices': transposed.indices, 't_indptr': transposed.indptr
+            }
+        else:
+            arrays = {'dense': normalized}
+        segments, specs = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                     initializer=_init_worker,
+                                     initargs=(specs, normalized.shape)) as executor:
+                futures = [executor.submit(_compute_block, start, end, k) for start, end in pending]
+                for future in as_completed(futures):
+                    *block, worker_peak_mb = future.result()
+                    finish(*block)
+                    if worker_peak_mb is not None:
+                        self._worker_peak_mb = max(self._worker_peak_mb or 0, worker_peak_mb)
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        
+        return NeighborIndex(neighbors, scores)
+    
+    def train(self, interactions, providers, **kwargs):
+        """Train and save a recommender (same arguments as train_recommender)"""
+        print(f"Training with {self.workers} workers...")
+        recommender = train_recommender(
+            interactions, providers,
+            decay_epoch=self._decay_epoch() if kwargs.get('half_life_days') else None,
+            stage=self.stage,
+            neighbor_builder=self.neighbor_index,
+            **kwargs
+        )
+        
+        # The model is complete, the block checkpoints are no longer needed
+        self._remove_checkpoints()
+        
+        self.report()
+        return recommender
@@ -0,0 +1,24 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Earth's radius in kilometers
+
+
+def haversine_km_radians(lat1, lon1, lat2, lon2):
+    """Vectorized Haversine distance (in km) between points given in radians
+    
+    Any argument may be a scalar or a NumPy array; arrays broadcast against
+    each other. NaN coordinates produce NaN distances.
+    """
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized Haversine distance (in km) between points given in degrees"""
+    return haversine_km_radians(
+        np.radians(lat1), np.radians(lon1),
+        np.radians(lat2), np.radians(lon2)
+    )